@@ -17,6 +17,47 @@ from avoplot.gui import widgets
 
 plugin_is_GPL_compatible = True
 
+#number of lines at the start of a spectrum file before the data, and the
+#index of the line that contains the column names
+N_HEADER_LINES = 5
+COLUMN_NAMES_LINE = 2
+
+
+def read_uvvis_csv(spectrum_file):
+    """
+    Reads the spectrum file in a single pass and returns a tuple of 
+    (col_data, col_name), where col_data is a 2D array of floats with one row 
+    per column of the file (so col_data[0] is the wavelength and col_data[i] 
+    is a view of the data in the i'th column) and col_name is a list of the 
+    names of the spectra (i.e. of all the columns apart from the first). 
+    Raises ValueError if the file cannot be parsed.
+    """
+    with open(spectrum_file, 'rU') as csvfile:
+        dialect = csv.Sniffer().sniff(csvfile.read(1024))
+        csvfile.seek(0)
+        reader = csv.reader(csvfile, dialect)
+        
+        header = [next(reader, []) for i in range(N_HEADER_LINES)]
+        
+        #the last header line defines the number of columns
+        ncols = len(header[-1])
+        col_name = header[COLUMN_NAMES_LINE][1:ncols]
+        
+        try:
+            rows = [[float(x) for x in row[:ncols]] for row in reader if row]
+        except ValueError, e:
+            raise ValueError("Line %d: %s"%(reader.line_num, e.args[0]))
+    
+    if not rows or min([len(row) for row in rows]) != ncols:
+        raise ValueError("Expecting %d columns of data"%ncols)
+    
+    #store the data transposed, so that each column is contiguous in memory
+    col_data = numpy.ascontiguousarray(numpy.array(rows, dtype=float).T)
+    
+    return col_data, col_name
+
+
+
 class UVVISSpectrumSubplot(AvoPlotXYSubplot):
 #This is the "subplot" where the spectrum will appear
     def my_init(self):
@@ -98,63 +139,24 @@ class UVVISPlugin(plugins.AvoPlotPluginSimple):
         spectrum_file = wx.FileSelector("Choose spectrum file to open", 
                                         default_path=last_path_used)
         if spectrum_file == "":
-            return None, None
+            return None, None, None
         
         persist.set_value("uvvis_spectra_dir", os.path.dirname(spectrum_file))
         
-        with open(spectrum_file, 'rU') as csvfile:
-            dialect = csv.Sniffer().sniff(csvfile.read(1024))
-            csvfile.seek(0)
-            reader = csv.reader(csvfile, dialect)
-            
-        #reader = csv.reader(open(spectrum_file, "rU"), dialect=csv.excel) 
-      
-            col_data = []
-            col_name = []
-            col_name_and_data = []
-        
-            next(reader)
-            next(reader)
-            next(reader)
-            next(reader)
-            #Skip the first 4 lines, which are header
-        
-            ncols = len(next(reader))
-            #This reads the 5th line, assigns its length to ncols & moves to the 6th line.
-        
-            for i in range(ncols):
-                col_data.append(([float(x[i]) for x in reader]))
-                csvfile.seek(0)
-                next(reader)
-                next(reader)
-                next(reader)
-                next(reader)
-                next(reader)
-            #now col_data is a list of lists of column data  
-            
-            #TODO - NAME EACH SUBPLOT WITH ITS COLUMN HEADING
-            for i in range(ncols):
-                csvfile.seek(0)
-                next(reader)
-                next(reader)
-                col_name_and_data.append(([str(x[i]) for x in reader]))
-                col_name.append(col_name_and_data[i][0])
-                
-            col_name.pop(0)
-            
-            #Make col_data and col_name accessible to the rest of the class without needing to call the load_uvvis_file method
-            self.col_data = col_data
-            self.col_name = col_name
-        
-        try:        
-            return col_data, col_name, spectrum_file
-
+        try:
+            col_data, col_name = read_uvvis_csv(spectrum_file)
         except Exception,e:
             print e.args
             wx.MessageBox("Unable to load spectrum file \'%s\'. "
                           "Unrecognised file format."%spectrum_file, 
                           "AvoPlot", wx.ICON_ERROR)
-            return None
+            return None, None, None
+        
+        #Make col_data and col_name accessible to the rest of the class without needing to call the load_uvvis_file method
+        self.col_data = col_data
+        self.col_name = col_name
+        
+        return col_data, col_name, spectrum_file
 
 
 #Start Extra Control Panel Functions -- created after adv_sine_wave example in AvoPlot documentation
@@ -21,10 +21,11 @@
 This module contains the main script for running AvoPlot.
 """
 
+import sys
 import optparse
+import multiprocessing
 
 import avoplot
-from avoplot.gui import  main
 
 def __parse_cmd_line():
     """
@@ -34,6 +35,16 @@ def __parse_cmd_line():
     usage = ("Usage: %prog [options]")
         
     parser = optparse.OptionParser(usage, version=avoplot.VERSION)
+    
+    parser.add_option("-b", "--batch", dest="job_file", metavar="JOB_FILE",
+                      help=("render the plots listed in JOB_FILE to image "
+                            "files without starting the GUI (see "
+                            "avoplot.batch for the format of the file)"))
+    parser.add_option("-p", "--processes", dest="processes", type="int",
+                      help=("number of processes to use in batch mode "
+                            "(default is one per CPU)"))
+    parser.add_option("--dpi", dest="dpi", type="int", default=100,
+                      help="resolution of the images produced in batch mode")
 
     (options, args) = parser.parse_args()
 
@@ -42,10 +53,23 @@ def __parse_cmd_line():
 
 if __name__ == '__main__':
     
+    #on Windows, multiprocessing workers (see avoplot.batch) are started by 
+    #running this script again - this makes that work for frozen executables
+    multiprocessing.freeze_support()
+    
     #parse any command line args
     options, args = __parse_cmd_line()
     
-    #create and run the wx app    
+    if options.job_file:
+        #render the plots without creating a wx app
+        from avoplot import batch
+        n_failed = batch.run_job_file(options.job_file, 
+                                      processes=options.processes, 
+                                      dpi=options.dpi)
+        sys.exit(1 if n_failed else 0)
+    
+    #create and run the wx app
+    from avoplot.gui import main
     app = main.AvoPlotApp(options, args)
     app.MainLoop()
 
@@ -21,9 +21,6 @@ import warnings
 import sys
 import collections
 
-import matplotlib
-matplotlib.use('WXAgg')
-
 ####################################################################
 #                     Program Information
 ####################################################################
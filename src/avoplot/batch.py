@@ -0,0 +1,258 @@
+#Copyright (C) Nial Peters 2013
+#
+#This file is part of AvoPlot.
+#
+#AvoPlot is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#AvoPlot is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with AvoPlot.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Headless rendering of plots of data files to image files, for use in scripts
+(see the --batch option of AvoPlot.py). Files are loaded using the same
+loaders as the GUI, and the plots are drawn using the Agg backend, so neither
+wx nor a display is needed.
+
+The jobs to run are read from a job file, with one plot per line in the form:
+
+    data_file  x_selection  y_selection  output_file
+
+where the selections are column selections as entered in the "From file"
+plotting dialog (e.g. "A[:]" or "B[1:20], B[23:25]"), or '-' to plot against
+the row numbers. Fields containing spaces must be quoted. Blank lines and
+lines starting with '#' are ignored. The format of the output file is
+determined by its extension.
+
+The module also provides functions for loading the same selections from many
+files concurrently (see imap_series_data()), which are used by the GUI when
+several files are opened at once.
+"""
+import sys
+import shlex
+import collections
+import multiprocessing
+import multiprocessing.dummy
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from avoplot import storage
+from avoplot.plugins.avoplot_fromfile_plugin import loader
+from avoplot.plugins.avoplot_fromfile_plugin import selection
+
+#size (in inches) and resolution of the images produced
+DEFAULT_FIGSIZE = (8, 6)
+DEFAULT_DPI = 100
+
+BatchJob = collections.namedtuple('BatchJob', ['filename', 'x_selection',
+                                               'y_selection', 'output'])
+
+
+class JobFileError(ValueError):
+    pass
+
+
+def read_job_file(filename):
+    """
+    Reads the job file filename (see the module docstring for its format)
+    and returns a list of BatchJob objects. Raises JobFileError if the file
+    contains invalid lines.
+    """
+    jobs = []
+    with open(filename, 'r') as ifp:
+        for line_no, line in enumerate(ifp):
+            if not line.strip() or line.lstrip().startswith('#'):
+                continue
+
+            try:
+                fields = shlex.split(line)
+            except ValueError, e:
+                raise JobFileError("Line %d of %s: %s"%(line_no + 1, filename,
+                                                        e.args[0]))
+            if len(fields) != 4:
+                raise JobFileError("Line %d of %s: expecting 4 fields, got %d"
+                                   ""%(line_no + 1, filename, len(fields)))
+
+            fields = [f if f != '-' else '' for f in fields]
+            jobs.append(BatchJob(*fields))
+    return jobs
+
+
+def get_series_data(file_contents, x_selection, y_selection):
+    """
+    Returns a tuple of (xdata, ydata, selections) of the data selected by the
+    selection strings from file_contents (a loader.FileContents object), 
+    where selections are the compiled selections (see 
+    selection.compile_selection_str()). Raises selection.InvalidSelectionError
+    if the selections are not valid.
+    """
+    selections = [selection.compile_selection_str(s, file_contents)
+                  for s in (x_selection, y_selection)]
+    data = selection.get_series_data(*selections)
+    if data is None:
+        raise selection.InvalidSelectionError("No data series selected!")
+    return data[0], data[1], selections
+
+
+def render(file_contents, job, figsize=DEFAULT_FIGSIZE, dpi=DEFAULT_DPI):
+    """
+    Plots the data selected by job (a BatchJob object) from file_contents (a
+    loader.FileContents object) and saves the plot to job.output. Raises
+    selection.InvalidSelectionError if the selections are not valid.
+    """
+    xdata, ydata, selections = get_series_data(file_contents, job.x_selection,
+                                               job.y_selection)
+
+    fig = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(fig)
+    axes = fig.add_subplot(111)
+    axes.plot(*storage.remove_masked(xdata, ydata))
+
+    for compiled, set_label in zip(selections,
+                                   (axes.set_xlabel, axes.set_ylabel)):
+        if compiled is not None and compiled[0].title:
+            set_label(compiled[0].title)
+
+    fig.savefig(job.output, dpi=dpi)
+
+
+def render_file(filename, jobs, figsize=DEFAULT_FIGSIZE, dpi=DEFAULT_DPI):
+    """
+    Loads the file and renders all the jobs for it. Returns a list of
+    (job, error message) tuples, where error message is None for jobs that
+    succeeded.
+    """
+    try:
+        file_contents = loader.load_file(filename)
+    except Exception, e:
+        return [(job, "Failed to load %s: %s"%(filename, e)) for job in jobs]
+
+    results = []
+    try:
+        for job in jobs:
+            try:
+                render(file_contents, job, figsize=figsize, dpi=dpi)
+                results.append((job, None))
+            except Exception, e:
+                results.append((job, "Failed to render %s: %s"%(job.output, 
+                                                                 e)))
+    finally:
+        file_contents.close()
+    return results
+
+
+def _render_file_star(args):
+    #multiprocessing.Pool.imap() only passes a single argument
+    return render_file(*args)
+
+
+def run_jobs(jobs, processes=None, figsize=DEFAULT_FIGSIZE, dpi=DEFAULT_DPI):
+    """
+    Renders all the jobs (a list of BatchJob objects), sharing the files out
+    between processes worker processes (by default, one per CPU). Each file
+    is only loaded once, however many jobs use it. Returns a list of
+    (job, error message) tuples in the same order as jobs, where error
+    message is None for jobs that succeeded.
+    """
+    jobs_by_file = collections.OrderedDict()
+    for job in jobs:
+        jobs_by_file.setdefault(job.filename, []).append(job)
+    tasks = [(f, j, figsize, dpi) for f, j in jobs_by_file.items()]
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+
+    if min(processes, len(tasks)) <= 1:
+        results = map(_render_file_star, tasks)
+    else:
+        pool = create_pool(len(tasks), processes)
+        try:
+            #hand out files one at a time, since they vary in size
+            results = list(pool.imap_unordered(_render_file_star, tasks,
+                                               chunksize=1))
+            pool.close()
+        finally:
+            pool.terminate()
+
+    errors = {}
+    for file_results in results:
+        for job, error in file_results:
+            errors[job] = error
+    return [(job, errors[job]) for job in jobs]
+
+
+def create_pool(n_tasks, processes=None):
+    """
+    Returns a multiprocessing.Pool for running n_tasks tasks, with processes
+    worker processes (by default, one per CPU). There are never more workers 
+    than tasks. If worker processes cannot be started safely from the 
+    current process (see loader.can_start_workers()), e.g. from the GUI while
+    another file is loading, then a pool of worker threads with the same 
+    interface is returned instead.
+    """
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = max(1, min(processes, n_tasks))
+    if not loader.can_start_workers():
+        return multiprocessing.dummy.Pool(processes)
+    return multiprocessing.Pool(processes)
+
+
+def load_series_data(filename, selections):
+    """
+    Loads the file and returns a list of (xdata, ydata) tuples of the data 
+    selected by each of the (x_selection, y_selection) pairs of selection 
+    strings in selections. Raises selection.InvalidSelectionError if 
+    any of the selections are not valid for the file.
+    """
+    file_contents = loader.load_file(filename)
+    try:
+        return [get_series_data(file_contents, x, y)[:2] 
+                for x, y in selections]
+    finally:
+        file_contents.close()
+
+
+def _load_series_data_star(args):
+    #multiprocessing.Pool.imap() only passes a single argument, and exceptions
+    #are returned as error messages so that one bad file doesn't stop the rest
+    filename, selections = args
+    try:
+        return load_series_data(filename, selections), None
+    except Exception, e:
+        return None, "Failed to load %s: %s"%(filename, e)
+
+
+def imap_series_data(filenames, selections, pool):
+    """
+    Loads the data selected by selections (as for load_series_data()) from
+    each of the files, sharing the files out between the worker processes of 
+    pool (see create_pool()). Returns an iterator over (data, error message) 
+    tuples in the same order as filenames, where data is as returned by 
+    load_series_data() (or None if the file could not be loaded) and error 
+    message is None for files that were loaded successfully.
+    """
+    #hand out files one at a time, since they vary in size
+    return pool.imap(_load_series_data_star, 
+                     [(f, selections) for f in filenames], chunksize=1)
+
+
+def run_job_file(filename, processes=None, dpi=DEFAULT_DPI):
+    """
+    Runs all the jobs in the job file, printing any errors to stderr. Returns
+    the number of jobs that failed.
+    """
+    n_failed = 0
+    for job, error in run_jobs(read_job_file(filename), processes=processes,
+                               dpi=dpi):
+        if error is not None:
+            print >> sys.stderr, error
+            n_failed += 1
+    return n_failed
@@ -0,0 +1,58 @@
+#Copyright (C) Nial Peters 2013
+#
+#This file is part of AvoPlot.
+#
+#AvoPlot is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#AvoPlot is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with AvoPlot.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Growable (and optionally fixed-length) array buffers, used for storing data
+that is appended to a bit at a time, e.g. data series which are plotted live 
+as the data is acquired.
+
+A buffer is a numpy array together with the start and stop indices of the 
+data held in it. Space is reserved after the data for future appends, so 
+that the cost of appending is proportional to the number of values appended
+rather than the amount of data in the buffer. Values that are part of the 
+data are never overwritten, so views of it (e.g. buffer[start:stop]) remain 
+valid after more data has been appended.
+"""
+import numpy
+
+
+def append(buffer, start, stop, values, max_length=None):
+    """
+    Appends values to the data buffer[start:stop], returning a tuple of
+    (buffer, start, stop) for the new data. If max_length is not None, then
+    only the last max_length values of the data are kept (older values are 
+    dropped from the start). The buffer is reallocated when it runs out of 
+    space, or if the values need a different dtype. Multidimensional 
+    buffers are appended to along their first axis.
+    """
+    values = numpy.asarray(values)
+    if max_length is not None:
+        values = values[max(len(values) - max_length, 0):]
+        start = max(start, stop + len(values) - max_length)
+    
+    n = stop - start
+    dtype = numpy.result_type(buffer, values)
+    if stop + len(values) > len(buffer) or dtype != buffer.dtype:
+        #reserve as much space again as there is data, so that the number of 
+        #reallocations (and copies of the data) grows logarithmically (or 
+        #so that the data is only copied once per max_length appended)
+        new_buffer = numpy.empty((2 * (n + len(values)),) + buffer.shape[1:], 
+                                 dtype=dtype)
+        new_buffer[:n] = buffer[start:stop]
+        buffer, start, stop = new_buffer, 0, n
+    
+    buffer[stop:stop + len(values)] = values
+    return buffer, start, stop + len(values)
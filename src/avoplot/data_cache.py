@@ -0,0 +1,253 @@
+#Copyright (C) Nial Peters 2013
+#
+#This file is part of AvoPlot.
+#
+#AvoPlot is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#AvoPlot is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with AvoPlot.  If not, see <http://www.gnu.org/licenses/>.
+"""
+The data_cache module provides an on-disk cache for numpy arrays (for example
+the parsed columns of a data file), so that expensive results can be reused
+the next time the program is run. Each cache entry is stored in its own
+directory within the AvoPlot read/write directory, and consists of a JSON
+manifest along with one .npy file per array. Arrays are memory-mapped when they
+are read back from the cache.
+
+The total size of the cache is bounded - when it grows too large the least
+recently used entries are removed.
+"""
+import os
+import os.path
+import json
+import shutil
+import hashlib
+import tempfile
+import warnings
+
+import numpy
+
+import avoplot
+from avoplot.persist import PersistentStorage
+
+#default maximum size of the cache in bytes - this can be overridden by
+#setting the "data_cache_max_size" persistent setting.
+DEFAULT_MAX_SIZE = 4 * 1024**3
+
+_data_cache = None
+
+_MANIFEST_FILENAME = "manifest.json"
+
+
+class __DataCache:
+    """
+    Class for caching numpy arrays on disk. Entries are identified by a key,
+    which can be any JSON serialisable object (for example a tuple of filename,
+    file size and modification time). You should not instanciate this class
+    directly, instead use the DataCache function which hands out references to
+    a single instance.
+
+    The cache does not keep any state in memory other than its location, so it
+    is safe for several processes to use the same cache at once.
+    """
+    def __init__(self, cache_dir=None):
+        if cache_dir is None:
+            cache_dir = os.path.join(avoplot.get_avoplot_rw_dir(), "data_cache")
+        self.__cache_dir = cache_dir
+
+
+    def get_max_size(self):
+        """
+        Returns the maximum size of the cache in bytes.
+        """
+        try:
+            return PersistentStorage().get_value("data_cache_max_size")
+        except KeyError:
+            return DEFAULT_MAX_SIZE
+
+
+    def set_max_size(self, max_size):
+        """
+        Sets the maximum size of the cache in bytes. Entries are removed from
+        the cache if it is currently larger than this.
+        """
+        PersistentStorage().set_value("data_cache_max_size", max_size)
+        self.evict()
+
+
+    def __get_entry_dir(self, key):
+        key_str = json.dumps(key, sort_keys=True)
+        return os.path.join(self.__cache_dir, hashlib.sha1(key_str).hexdigest())
+
+
+    def get(self, key):
+        """
+        Returns a tuple of (metadata, arrays) for the entry with the specified
+        key, where arrays is a dict of read-only memory-mapped arrays. Raises
+        KeyError if there is no such entry in the cache.
+        """
+        entry_dir = self.__get_entry_dir(key)
+        manifest_file = os.path.join(entry_dir, _MANIFEST_FILENAME)
+
+        try:
+            with open(manifest_file, "rb") as ifp:
+                manifest = json.load(ifp)
+
+            #the manifest stores the full key to guard against hash collisions
+            if manifest['key'] != json.loads(json.dumps(key)):
+                raise KeyError(key)
+
+            arrays = {}
+            for name in manifest['arrays']:
+                arrays[name] = numpy.load(os.path.join(entry_dir, name+'.npy'),
+                                          mmap_mode='r')
+
+            #record that this entry has been used
+            os.utime(manifest_file, None)
+
+        except (IOError, OSError, ValueError):
+            raise KeyError(key)
+
+        return manifest['metadata'], arrays
+
+
+    def put(self, key, metadata, arrays):
+        """
+        Stores the arrays (a dict mapping names to numpy arrays) and metadata
+        (any JSON serialisable object) in the cache under the specified key.
+        Any existing entry with the same key is replaced. Entries that are too
+        large to fit in the cache are not stored. Failures to write to the
+        cache are reported as warnings rather than exceptions.
+        """
+        size = sum([a.nbytes for a in arrays.values()])
+        if size > self.get_max_size():
+            return
+
+        entry_dir = self.__get_entry_dir(key)
+        try:
+            if not os.path.isdir(self.__cache_dir):
+                os.makedirs(self.__cache_dir)
+
+            #write the entry into a temporary directory first so that other
+            #processes never see a partially written entry
+            tmp_dir = tempfile.mkdtemp(dir=self.__cache_dir, prefix='tmp')
+            try:
+                for name, a in arrays.items():
+                    numpy.save(os.path.join(tmp_dir, name+'.npy'), a)
+
+                manifest = {'key':key, 'metadata':metadata,
+                            'arrays':arrays.keys(), 'size':size}
+                with open(os.path.join(tmp_dir, _MANIFEST_FILENAME),"wb") as ofp:
+                    json.dump(manifest, ofp)
+
+                self.__remove_entry(entry_dir)
+                os.rename(tmp_dir, entry_dir)
+            finally:
+                self.__remove_entry(tmp_dir)
+
+        except (IOError, OSError), e:
+            warnings.warn("Failed to write to the data cache. Error was: "
+                          "%s"%e.args)
+            return
+
+        self.evict()
+
+
+    def __remove_entry(self, entry_dir):
+        #if any of the arrays are still in use then this may fail on some
+        #platforms - in which case we just leave the entry where it is.
+        shutil.rmtree(entry_dir, ignore_errors=True)
+
+
+    def __list_entries(self):
+        """
+        Returns a list of (last used time, size, directory) tuples for all the
+        entries in the cache.
+        """
+        entries = []
+        try:
+            entry_dirs = os.listdir(self.__cache_dir)
+        except OSError:
+            return entries
+
+        for d in entry_dirs:
+            entry_dir = os.path.join(self.__cache_dir, d)
+            manifest_file = os.path.join(entry_dir, _MANIFEST_FILENAME)
+            try:
+                with open(manifest_file, "rb") as ifp:
+                    size = json.load(ifp)['size']
+                last_used = os.path.getmtime(manifest_file)
+            except (IOError, OSError, ValueError, KeyError):
+                #temporary directory of a write in progress or a broken entry
+                #- in either case it doesn't count towards the size of the
+                #cache
+                continue
+            entries.append((last_used, size, entry_dir))
+        return entries
+
+
+    def get_size(self):
+        """
+        Returns the current size of the cache in bytes.
+        """
+        return sum([size for last_used, size, d in self.__list_entries()])
+
+
+    def evict(self):
+        """
+        Removes the least recently used entries from the cache until it is
+        smaller than its maximum size.
+        """
+        entries = self.__list_entries()
+        entries.sort()
+        total_size = sum([size for last_used, size, d in entries])
+        max_size = self.get_max_size()
+
+        for last_used, size, entry_dir in entries:
+            if total_size <= max_size:
+                break
+            self.__remove_entry(entry_dir)
+            total_size -= size
+
+
+    def clear(self):
+        """
+        Removes all entries from the cache.
+        """
+        self.__remove_entry(self.__cache_dir)
+
+
+def DataCache():
+    """
+    Returns a reference to the global data cache, which can be used for storing
+    numpy arrays across program restarts.
+    """
+    if globals()['_data_cache'] is None:
+        globals()['_data_cache'] = __DataCache()
+    return globals()['_data_cache']
+
+
+def get_sample_hash(buf, sample_size=65536):
+    """
+    Returns a hash of the contents of buf (a string or mmap object). For speed,
+    only samples from the start, middle and end of the buffer are included in
+    the hash, along with its length.
+    """
+    length = len(buf)
+    h = hashlib.sha1(str(length))
+    if length <= 3 * sample_size:
+        h.update(buf[:])
+    else:
+        middle = (length - sample_size) // 2
+        h.update(buf[:sample_size])
+        h.update(buf[middle:middle + sample_size])
+        h.update(buf[-sample_size:])
+    return h.hexdigest()
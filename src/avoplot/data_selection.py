@@ -18,7 +18,7 @@
 from matplotlib.patches import Rectangle
 from matplotlib.transforms import blended_transform_factory
 from matplotlib.colors import colorConverter
-from matplotlib.pylab import date2num
+from matplotlib.dates import date2num
 
 from wx.lib.buttons import GenBitmapToggleButton as GenBitmapToggleButton
 import wx
@@ -195,7 +195,7 @@ class EntireSeriesSelectionTool(SelectionToolBase):
     Tool for selecting the entire series.
     """
     def get_current_selection(self):
-        return numpy.ones(len(self.series.get_raw_data()[0]))
+        return numpy.ones(len(self.series.get_data()[0]))
     
     
 class SpanSelector:
@@ -374,12 +374,16 @@ class SpanSelector:
         
         #if xdata are datetimes, then need to convert them to numbers
         #first
-        if len(xdata)>0 and type(xdata[0]) is datetime.datetime:
+        if xdata.dtype.kind == 'M':
+            xdata = date2num(xdata)
+        elif len(xdata)>0 and type(xdata[0]) is datetime.datetime:
             xdata = numpy.array([date2num(d) for d in xdata])
         
         #if ydata are datetimes, then need to convert them to numbers
         #first
-        if len(ydata)>0 and type(ydata[0]) is datetime.datetime:
+        if ydata.dtype.kind == 'M':
+            ydata = date2num(ydata)
+        elif len(ydata)>0 and type(ydata[0]) is datetime.datetime:
             ydata = numpy.array([date2num(d) for d in ydata])
         
         if self.direction == 'rectangular':
@@ -0,0 +1,453 @@
+#Copyright (C) Nial Peters 2013
+#
+#This file is part of AvoPlot.
+#
+#AvoPlot is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#AvoPlot is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with AvoPlot.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Level-of-detail decimation of large XY data series for plotting. Drawing a
+line through many more points than there are pixels across the axes is slow,
+and most of the segments drawn are hidden by the others. The line drawn 
+within each pixel column only depends on the first, last, minimum and 
+maximum points in that column, so plotting just those points (in their 
+original order) gives the same picture from a tiny fraction of the points.
+
+The MinMaxPyramid class precomputes the indices of the minimum and maximum 
+points of blocks of the data at a range of block sizes, so that the points 
+to plot for an x range can be found without looking at every point in it.
+"""
+import math
+import datetime
+import numpy
+from matplotlib.artist import Artist
+from matplotlib.dates import date2num
+
+from avoplot import buffers
+from avoplot import storage
+
+#series with fewer points than this are plotted in full
+DECIMATION_THRESHOLD = 100000
+
+#number of points in each block of the finest level of the pyramid, and the
+#number of blocks of each level that are combined into a block of the next
+BASE_BLOCK_SIZE = 32
+LEVEL_FACTOR = 4
+
+#number of columns that the data either side of the visible x range is 
+#reduced to (the data off the screen is still plotted so that autoscaling 
+#of the axes works as normal)
+OFFSCREEN_COLUMNS = 256
+
+#matplotlib date number of the numpy datetime64 epoch (datetime64 x data is
+#plotted against date numbers)
+_EPOCH_DATE_NUM = date2num(datetime.datetime(1970, 1, 1))
+
+
+def can_decimate(xdata, ydata):
+    """
+    Returns True if the data can be decimated, i.e. it is numeric (the xdata
+    may also be datetime64 values), the xdata are in ascending order and the 
+    ydata do not contain NaNs (which break the line when it is plotted in 
+    full).
+    """
+    return len(xdata) >= 2 and _is_decimatable(xdata, ydata)
+
+
+def _is_decimatable(xdata, ydata):
+    #as for can_decimate(), but for any length of data
+    if numpy.ma.isMaskedArray(xdata) or numpy.ma.isMaskedArray(ydata):
+        return False
+    
+    if xdata.dtype.kind not in 'iufM' or ydata.dtype.kind not in 'iuf':
+        return False
+    
+    if ydata.dtype.kind == 'f' and numpy.isnan(ydata).any():
+        return False
+    
+    if isinstance(xdata, storage.RegularSamples):
+        #always in ascending order
+        return True
+    
+    if xdata.dtype.kind == 'M':
+        if numpy.isnat(xdata).any():
+            return False
+        xdata = xdata.view(numpy.int64)
+    
+    return bool(numpy.all(xdata[1:] >= xdata[:-1]))
+
+
+def _as_numbers(xdata):
+    #returns xdata (an array or a storage.RegularSamples object), with 
+    #datetime64 values replaced by their underlying integers
+    if xdata.dtype.kind != 'M':
+        return xdata
+    if isinstance(xdata, storage.RegularSamples):
+        return storage.RegularSamples.from_array(xdata, numpy.int64)
+    return xdata.view(numpy.int64)
+
+
+def _searchsorted(xdata, v, side='left'):
+    #as for xdata.searchsorted(), but without converting integer xdata to 
+    #floats to compare them with float values (which copies all of it)
+    if (xdata.dtype.kind in 'iu' and 
+        not isinstance(xdata, storage.RegularSamples)):
+        if side == 'left':
+            v = numpy.ceil(v)
+        else:
+            v = numpy.floor(v)
+        info = numpy.iinfo(xdata.dtype)
+        v = numpy.clip(v, max(info.min, -2**62), min(info.max, 2**62))
+        v = numpy.asarray(v).astype(xdata.dtype)
+    return xdata.searchsorted(v, side)
+
+
+def _get_ticks_per_day(dtype):
+    #returns the number of units of the datetime64 dtype in a day
+    unit, count = numpy.datetime_data(dtype)
+    return numpy.timedelta64(1, 'D') / numpy.timedelta64(count, unit)
+
+
+class DrawHook(Artist):
+    """
+    Invisible artist which calls callback() (with no arguments) each time 
+    that the axes it is added to are drawn, before any of the lines in them
+    are drawn. This allows the data of the lines to be updated for the 
+    current x limits and size of the axes.
+    """
+    def __init__(self, callback):
+        super(DrawHook, self).__init__()
+        self.__callback = callback
+        self.set_zorder(-numpy.inf)
+    
+    
+    def draw(self, renderer):
+        self.__callback()
+
+
+def _group_args(values, group_size, arg_func):
+    #returns the positions of the arg_func (numpy.argmin or numpy.argmax) 
+    #value in each group of group_size consecutive values (the last group 
+    #may be smaller)
+    n_full = (len(values) // group_size) * group_size
+    if not n_full:
+        args = numpy.array([], dtype=numpy.intp)
+    else:
+        args = arg_func(values[:n_full].reshape(-1, group_size), axis=1)
+    args += numpy.arange(0, n_full, group_size)
+    
+    if n_full < len(values):
+        args = numpy.append(args, arg_func(values[n_full:]) + n_full)
+    return args
+
+
+def _aligned_group_args(values, first, group_size, arg_func):
+    #as for _group_args(), but for values which are items first, first + 1...
+    #of a sequence which is split into groups at multiples of group_size (so
+    #the first group may be smaller)
+    n_head = min(-first % group_size, len(values))
+    args = [_group_args(values[n_head:], group_size, arg_func) + n_head]
+    if n_head:
+        args.insert(0, [arg_func(values[:n_head])])
+    return numpy.concatenate(args).astype(numpy.intp)
+
+
+def _ranges(starts, stops):
+    #returns the concatenation of numpy.arange(start, stop) for each of the
+    #start, stop pairs
+    lengths = stops - starts
+    keep = lengths > 0
+    starts, lengths = starts[keep], lengths[keep]
+    if not len(starts):
+        return numpy.array([], dtype=numpy.intp)
+    
+    steps = numpy.ones(lengths.sum(), dtype=numpy.intp)
+    steps[0] = starts[0]
+    range_starts = numpy.cumsum(lengths)[:-1]
+    steps[range_starts] = starts[1:] - (starts[:-1] + lengths[:-1] - 1)
+    return numpy.cumsum(steps)
+
+
+def _segment_args(idxs, values, seg_starts, reduce_func):
+    #returns the index (from idxs) of the reduce_func (numpy.minimum or 
+    #numpy.maximum) value in each segment of values, where the segments 
+    #start at the positions seg_starts
+    extremes = reduce_func.reduceat(values, seg_starts)
+    seg_lengths = numpy.diff(numpy.append(seg_starts, len(values)))
+    matches = numpy.flatnonzero(values == numpy.repeat(extremes, seg_lengths))
+    
+    #use the first match in each segment
+    segs = numpy.searchsorted(seg_starts, matches, 'right') - 1
+    first = numpy.flatnonzero(numpy.diff(numpy.append(-1, segs)))
+    return idxs[matches[first]]
+
+
+
+class _PyramidLevel(object):
+    #the positions of the minimum and maximum points of the blocks of 
+    #block_size points of a stream of data, where block b is made up of the
+    #points at positions b * block_size to (b + 1) * block_size - 1
+    def __init__(self, block_size):
+        self.block_size = block_size
+        self.first_block = 0
+        
+        #buffer of (min position, max position) rows (see buffers.append())
+        self.__idxs = numpy.zeros((0, 2), dtype=numpy.intp)
+        self.__start = 0
+        self.__stop = 0
+    
+    
+    def get_min_idxs(self):
+        #returns the min positions of the blocks from first_block onwards
+        return self.__idxs[self.__start:self.__stop, 0]
+    
+    
+    def get_max_idxs(self):
+        return self.__idxs[self.__start:self.__stop, 1]
+    
+    
+    def get_nbytes(self):
+        return self.__idxs.nbytes
+    
+    
+    def update(self, first_block, changed_block, min_idxs, max_idxs):
+        #drops the blocks before first_block, and replaces the blocks from 
+        #changed_block onwards with the ones given
+        self.__start += min(first_block - self.first_block, 
+                            self.__stop - self.__start)
+        self.first_block = first_block
+        self.__stop = self.__start + changed_block - first_block
+        
+        self.__idxs, self.__start, self.__stop = buffers.append(
+                                    self.__idxs, self.__start, self.__stop,
+                                    numpy.column_stack((min_idxs, max_idxs)))
+
+
+
+class MinMaxPyramid(object):
+    """
+    Precomputed minimum and maximum points of blocks of the data xdata, ydata
+    which are used to decimate it for plotting (see get_indices()). The data
+    must be decimatable (see can_decimate()), and xdata may be a 
+    storage.RegularSamples object. The pyramid takes O(n) time to 
+    build, and its size is about len(xdata) / 2 bytes. 
+    
+    The pyramid can be updated for data that has been appended to (and 
+    dropped from the start of) in a time proportional to the number of 
+    points appended (see extend()). offset is the position of xdata[0] in 
+    the stream of all the data that has been appended, i.e. the number of
+    points that have been dropped from the start of the data.
+    """
+    def __init__(self, xdata, ydata, offset=0):
+        self.__offset = offset
+        self.__stop = offset #position of the end of the data in the stream
+        self.__levels = [] #from the finest level to the coarsest
+        self.extend(xdata, ydata, offset)
+    
+    
+    def extend(self, xdata, ydata, offset):
+        """
+        Updates the pyramid for new data xdata, ydata (with xdata[0] at 
+        position offset in the stream of data) which has had points appended 
+        to it and possibly dropped from its start since the pyramid was last 
+        updated. The points that remain from the old data must not have 
+        changed. Raises ValueError if the new data cannot be decimated (see
+        can_decimate()).
+        """
+        stop = offset + len(xdata)
+        if offset < self.__offset or stop < self.__stop:
+            raise ValueError("Data can only be appended to and dropped from "
+                             "the start of")
+        
+        #check the points that were appended (and the point before them, 
+        #which they must not be less than)
+        check = slice(max(self.__stop - offset - 1, 0), None)
+        if not _is_decimatable(xdata[check], ydata[check]):
+            raise ValueError("Data cannot be decimated")
+        
+        old_stop = self.__stop
+        self.__xdata = _as_numbers(xdata)
+        self.__ydata = ydata
+        self.__ticks_per_day = None
+        if xdata.dtype.kind == 'M':
+            self.__ticks_per_day = _get_ticks_per_day(xdata.dtype)
+        self.__offset = offset
+        self.__stop = stop
+        
+        block_size = BASE_BLOCK_SIZE
+        prev_level = None
+        level_num = 0
+        while True:
+            first_block = offset // block_size
+            end_block = -(-stop // block_size)
+            
+            if level_num == len(self.__levels):
+                self.__levels.append(_PyramidLevel(block_size))
+                changed_block = first_block
+            else:
+                changed_block = max(old_stop // block_size, first_block)
+            
+            level = self.__levels[level_num]
+            if prev_level is None:
+                #first level is calculated from the data
+                first = max(changed_block * block_size, offset)
+                min_idxs = first + _aligned_group_args(ydata[first - offset:],
+                                                       first, block_size,
+                                                       numpy.argmin)
+                max_idxs = first + _aligned_group_args(ydata[first - offset:],
+                                                       first, block_size,
+                                                       numpy.argmax)
+            else:
+                #later levels are calculated from the blocks of the previous 
+                #level which do not include any dropped points
+                first = max(changed_block * LEVEL_FACTOR, 
+                            -(-offset // prev_level.block_size))
+                idxs = []
+                for level_idxs, arg_func in (
+                                    (prev_level.get_min_idxs(), numpy.argmin), 
+                                    (prev_level.get_max_idxs(), numpy.argmax)):
+                    level_idxs = level_idxs[first - prev_level.first_block:]
+                    idxs.append(level_idxs[_aligned_group_args(
+                                            ydata[level_idxs - offset], first,
+                                            LEVEL_FACTOR, arg_func)])
+                min_idxs, max_idxs = idxs
+                
+                #the first block is not used if it is only partly made up of
+                #whole blocks (see __get_column_indices()), so its min/max
+                #just need to be valid positions 
+                n_missing = first // LEVEL_FACTOR - changed_block
+                if n_missing > 0:
+                    min_idxs = numpy.append([offset] * n_missing, min_idxs)
+                    max_idxs = numpy.append([offset] * n_missing, max_idxs)
+            
+            level.update(first_block, changed_block, min_idxs, max_idxs)
+            
+            if end_block - first_block <= OFFSCREEN_COLUMNS:
+                #coarser levels would not be used
+                del self.__levels[level_num + 1:]
+                break
+            
+            prev_level = level
+            block_size *= LEVEL_FACTOR
+            level_num += 1
+    
+    
+    def get_nbytes(self):
+        """
+        Returns the number of bytes of memory used by the pyramid (not 
+        including the data).
+        """
+        return sum([l.get_nbytes() for l in self.__levels])
+    
+    
+    def get_indices(self, x_min, x_max, n_pixels, decimate=True):
+        """
+        Returns an array of the indices of the points to plot for an x axis 
+        which goes from x_min to x_max and is n_pixels wide. The visible 
+        points are reduced to the first, last, minimum and maximum points of
+        each pixel column (or not reduced at all if decimate is False), and 
+        the points either side of the visible range are reduced in the same 
+        way to OFFSCREEN_COLUMNS columns each. The indices are in ascending 
+        order. For datetime64 xdata, x_min and x_max are matplotlib date
+        numbers (as for the limits of axes that the data is plotted in).
+        """
+        if self.__ticks_per_day is not None:
+            x_min, x_max = [(x - _EPOCH_DATE_NUM) * self.__ticks_per_day 
+                            for x in (x_min, x_max)]
+        
+        xdata = self.__xdata
+        n = len(xdata)
+        
+        #include one point either side of the visible range so that the line
+        #continues off the edges of the axes
+        start = max(_searchsorted(xdata, x_min, 'left') - 1, 0)
+        stop = min(_searchsorted(xdata, x_max, 'right') + 1, n)
+        
+        if decimate and x_max > x_min:
+            edges = numpy.linspace(x_min, x_max, max(n_pixels, 1) + 1)
+            idxs = [self.__get_column_indices(_searchsorted(xdata, edges),
+                                              start, stop)]
+        else:
+            idxs = [numpy.arange(start, stop)]
+        
+        if start > 0:
+            edges = numpy.linspace(xdata[0], xdata[start], 
+                                   OFFSCREEN_COLUMNS + 1)
+            idxs.insert(0, self.__get_column_indices(
+                                    _searchsorted(xdata, edges), 0, start))
+        if stop < n:
+            edges = numpy.linspace(xdata[stop], xdata[-1], 
+                                   OFFSCREEN_COLUMNS + 1)
+            idxs.append(self.__get_column_indices(
+                                    _searchsorted(xdata, edges), stop, n))
+        
+        return numpy.concatenate(idxs)
+    
+    
+    def __get_column_indices(self, col_edges, start, stop):
+        #returns the indices of the first, last, minimum and maximum points in
+        #each of the columns of points from start to stop, where col_edges 
+        #are the indices of the first point in each column
+        col_edges = numpy.unique(numpy.clip(
+                            numpy.concatenate(([start], col_edges, [stop])), 
+                            start, stop))
+        col_starts = col_edges[:-1]
+        n_points = stop - start
+        n_cols = len(col_starts)
+        if n_points <= 4 * n_cols:
+            return numpy.arange(start, stop)
+        
+        #choose the block size that balances the work of searching the 
+        #blocks against searching the partial blocks at the ends of columns
+        target_block_size = math.sqrt(n_points / (2.0 * n_cols))
+        level = None
+        for l in self.__levels:
+            if l.block_size > target_block_size:
+                break
+            level = l
+        
+        if level is None:
+            #search the raw data
+            idxs = numpy.arange(start, stop)
+            min_idxs = max_idxs = idxs
+            min_starts = max_starts = col_starts - start
+        else:
+            #each column is made up of the whole blocks within it and the 
+            #partial blocks at either end, which are searched point by point
+            #(note that blocks are numbered by position in the stream)
+            block_size = level.block_size
+            offset = self.__offset
+            col_stops = col_edges[1:]
+            first_blocks = -(-(col_starts + offset) // block_size)
+            last_blocks = numpy.maximum((col_stops + offset) // block_size, 
+                                        first_blocks)
+            raw_idxs = numpy.concatenate((
+                    _ranges(col_starts, numpy.minimum(
+                                    first_blocks * block_size - offset, 
+                                    col_stops)),
+                    _ranges(numpy.maximum(last_blocks * block_size - offset, 
+                                          col_starts), col_stops)))
+            blocks = _ranges(first_blocks, last_blocks) - level.first_block
+            
+            min_idxs = numpy.sort(numpy.concatenate((
+                    raw_idxs, level.get_min_idxs()[blocks] - offset)))
+            max_idxs = numpy.sort(numpy.concatenate((
+                    raw_idxs, level.get_max_idxs()[blocks] - offset)))
+            min_starts = numpy.searchsorted(min_idxs, col_starts)
+            max_starts = numpy.searchsorted(max_idxs, col_starts)
+        
+        return numpy.unique(numpy.concatenate((
+                col_starts, col_edges[1:] - 1,
+                _segment_args(min_idxs, self.__ydata[min_idxs], min_starts, 
+                              numpy.minimum),
+                _segment_args(max_idxs, self.__ydata[max_idxs], max_starts, 
+                              numpy.maximum))))
@@ -17,4 +17,9 @@
 """
 As the name suggests, the gui module contains a collection of modules that 
 make up the AvoPlot GUI.
-"""
\ No newline at end of file
+"""
+import matplotlib
+
+#the GUI draws figures using wx - this is done here rather than when avoplot 
+#is imported so that batch mode (see avoplot.batch) does not need wx
+matplotlib.use('WXAgg')
\ No newline at end of file
@@ -20,6 +20,7 @@ import avoplot
 import avoplot.plugins
 from avoplot import core
 from avoplot import figure
+from avoplot import data_cache
 
 #define some new events to be used when panes are hidden/restored
 AvoPlotCtrlPanelChangeState, EVT_AVOPLOT_CTRL_PANEL_STATE = wx.lib.newevent.NewEvent()
@@ -175,11 +176,18 @@ class MainMenu(wx.MenuBar):
         self.save_data_entry.Enable(enable=False)
         self.save_plot_entry.Enable(enable=False)
         
+        file_menu.AppendSeparator()
+        clear_cache = file_menu.Append(-1, "&Clear Data Cache", "Delete the "
+                                       "cached copies of previously loaded "
+                                       "data files.")
+        file_menu.AppendSeparator()
+        
         exit = file_menu.Append(wx.ID_EXIT, "&Exit", "Exit AvoPlot.")
         
         #register the event handlers
         wx.EVT_MENU(self.parent,exit.GetId(), self.parent.on_close)
         wx.EVT_MENU(self.parent,self.save_plot_entry.GetId(), self.on_save_plot)
+        wx.EVT_MENU(self.parent,clear_cache.GetId(), self.on_clear_cache)
                 
         #add the menu item to the MenuBar (self)
         self.Append(file_menu, "&File")
@@ -192,6 +200,20 @@ class MainMenu(wx.MenuBar):
         """
         if self.__current_figure is not None:
             self.__current_figure.save_figure_as_image()
+    
+    
+    def on_clear_cache(self, evnt):
+        """
+        Event handler for File->Clear Data Cache menu events. Deletes all the
+        entries in the data cache.
+        """
+        cache = data_cache.DataCache()
+        size_mb = cache.get_size() / 1024.0**2
+        
+        if wx.MessageBox("Delete %.1f MB of cached data?"%size_mb, 
+                         "Clear Data Cache", wx.YES_NO | wx.ICON_QUESTION,
+                         self.parent) == wx.YES:
+            cache.clear()
         
         
     def create_help_menu(self):
@@ -15,7 +15,6 @@
 #You should have received a copy of the GNU General Public License
 #along with AvoPlot.  If not, see <http://www.gnu.org/licenses/>.
 
-import wx
 import os
 import inspect
 import os.path
@@ -24,7 +23,6 @@ from distutils.command.install import install
 from distutils.core import setup as dist_utils_setup
 
 import avoplot
-from avoplot.figure import AvoPlotFigure
 
 #dictionary to hold all plugins that get registered. Dict keys 
 #are the names of the plugins
@@ -224,6 +222,9 @@ class AvoPlotPluginBase(object):
         Do not use this method to get the parent for Figure objects - see 
         get_figure_parent() instead.
         """
+        #wx is only imported when needed, so that the loaders provided by
+        #plugins can be used without it (see avoplot.batch)
+        import wx
         return wx.GetApp().GetTopWindow()
     
     
@@ -284,6 +285,7 @@ class AvoPlotPluginSimple(AvoPlotPluginBase):
         show_figure() to add the new figure to the main window.
         """
         #create the new figure object
+        from avoplot.figure import AvoPlotFigure
         fig = AvoPlotFigure(self.get_figure_parent(), "New Figure")
                 
         #figure out what type of subplot we need, based on what data
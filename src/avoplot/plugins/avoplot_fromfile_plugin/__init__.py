@@ -14,7 +14,19 @@
 #
 #You should have received a copy of the GNU General Public License
 #along with AvoPlot.  If not, see <http://www.gnu.org/licenses/>.
-from avoplot.plugins import register
-from txt_file_loader import TextFilePlugin
+import binary_file_loader
+import txt_file_loader
 
-register(TextFilePlugin())
\ No newline at end of file
+try:
+    import wx
+    have_wx = True
+except ImportError:
+    #the loaders don't need wx, so they can still be used without the GUI 
+    #(e.g. by avoplot.batch)
+    have_wx = False
+
+if have_wx:
+    from avoplot.plugins import register
+    from txt_file_plugin import TextFilePlugin
+    
+    register(TextFilePlugin())
\ No newline at end of file
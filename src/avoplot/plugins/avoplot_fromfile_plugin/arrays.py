@@ -0,0 +1,292 @@
+#Copyright (C) Nial Peters 2013
+#
+#This file is part of AvoPlot.
+#
+#AvoPlot is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#AvoPlot is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with AvoPlot.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Array classes used for storing column data while files are being loaded.
+"""
+import tempfile
+import numpy
+
+#arrays larger than this (in bytes) are moved out of memory into a temporary
+#file on disk
+DEFAULT_SPILL_SIZE = 16 * 1024**2
+
+
+class GrowableArray:
+    """
+    A 1D numpy array that can be appended to. The data is held in memory until
+    it is larger than spill_size bytes, after which it is moved to a temporary
+    file and memory-mapped, so that the amount of memory used stays bounded
+    however large the array grows. If spill_size is None then the data is 
+    always kept in memory.
+    """
+    def __init__(self, dtype, spill_size=DEFAULT_SPILL_SIZE):
+        self.__dtype = numpy.dtype(dtype)
+        self.__spill_size = spill_size
+        self.__length = 0
+        self.__file = None
+        self.__array = numpy.empty(0, dtype=self.__dtype)
+
+
+    def __len__(self):
+        return self.__length
+
+
+    def is_spilled(self):
+        """
+        Returns True if the array data has been moved to disk.
+        """
+        return self.__file is not None
+
+
+    def get_array(self):
+        """
+        Returns a numpy array (a view of the data, not a copy) of the current
+        contents of the array. The view is not affected by subsequent appends.
+        """
+        return self.__array[:self.__length]
+
+
+    def append(self, values):
+        """
+        Appends the values (a sequence or numpy array) to the end of the array.
+        """
+        values = numpy.asarray(values)
+        if len(values) == 0:
+            return
+
+        new_length = self.__length + len(values)
+        self.__reserve(new_length)
+        self.__array[self.__length:new_length] = values
+        self.__length = new_length
+
+
+    def trim(self):
+        """
+        Frees any space reserved for future appends. Arrays that have been 
+        moved to disk are left unchanged.
+        """
+        if self.__file is None and len(self.__array) > self.__length:
+            self.__array = self.__array[:self.__length].copy()
+
+
+    def __reserve(self, n):
+        #make sure that there is space for at least n elements
+        capacity = len(self.__array)
+        if n <= capacity:
+            return
+        capacity = max(n, 2 * capacity)
+
+        if (self.__file is None and (self.__spill_size is None or
+            capacity * self.__dtype.itemsize <= self.__spill_size)):
+            new_array = numpy.empty(capacity, dtype=self.__dtype)
+            new_array[:self.__length] = self.__array[:self.__length]
+            self.__array = new_array
+            return
+
+        if self.__file is None:
+            old_array = self.__array[:self.__length]
+            self.__file = tempfile.TemporaryFile()
+        else:
+            #the existing contents of the file are unchanged by resizing it
+            old_array = None
+
+        self.__file.truncate(max(capacity * self.__dtype.itemsize, 1))
+        self.__array = numpy.memmap(self.__file, dtype=self.__dtype, mode='r+',
+                                    shape=(capacity,))
+        if old_array is not None:
+            self.__array[:self.__length] = old_array
+
+
+def find_words(chars):
+    """
+    Returns arrays of the start and end (exclusive) positions of the 
+    whitespace separated words in chars (a numpy uint8 array).
+    """
+    is_word = numpy.zeros(len(chars) + 2, dtype=numpy.uint8)
+    
+    #the characters that separate words (as used by str.split()) are ' ' 
+    #and '\t' to '\r' - this is much faster than using a lookup table
+    is_char = is_word[1:-1]
+    numpy.subtract(chars, 9, is_char)
+    numpy.greater(is_char, 4, is_char.view(bool))
+    numpy.logical_and(is_char, chars != 32, is_char.view(bool))
+    
+    #words start and end at alternate changes between words and spaces (nonzero
+    #is much faster for boolean arrays)
+    edges = numpy.flatnonzero(is_word[1:] != is_word[:-1])
+    return edges[::2], edges[1::2]
+
+
+def _gather(chars, starts, ends):
+    #returns the characters from each of the chars[starts[i]:ends[i]] ranges
+    #concatenated into a single array
+    lengths = ends - starts
+    total = lengths.sum()
+    if total == 0:
+        return numpy.empty(0, dtype=numpy.uint8)
+    
+    #index of each output character in chars 
+    out_starts = numpy.cumsum(lengths) - lengths
+    idxs = numpy.repeat(starts - out_starts, lengths)
+    idxs += numpy.arange(total)
+    return chars[idxs]
+
+
+class TokenColumn:
+    """
+    A read-only sequence of string tokens, stored compactly as a single array
+    of characters along with an array of offsets into it (with an extra entry
+    at the end marking the end of the last token). Indexing with an integer 
+    returns a string, and slicing returns another TokenColumn which shares the 
+    same data.
+    """
+    def __init__(self, chars, offsets):
+        self.chars = chars
+        self.offsets = offsets
+    
+    
+    def __len__(self):
+        return len(self.offsets) - 1
+    
+    
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            start, stop, step = idx.indices(len(self))
+            if step != 1:
+                raise ValueError("TokenColumn does not support slice steps")
+            stop = max(start, stop)
+            return TokenColumn(self.chars, self.offsets[start:stop + 1])
+        
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise IndexError("TokenColumn index out of range")
+        return self.chars[self.offsets[idx]:self.offsets[idx + 1]].tostring()
+    
+    
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self[i]
+    
+    
+    @property
+    def nbytes(self):
+        return self.chars.nbytes + self.offsets.nbytes
+    
+    
+    def take(self, idxs):
+        """
+        Returns a numpy string array of the tokens at positions idxs.
+        """
+        idxs = numpy.asarray(idxs, dtype=int)
+        starts = self.offsets[idxs]
+        ends = self.offsets[idxs + 1]
+        return self.__to_array(starts, ends, _gather(self.chars, starts, ends))
+    
+    
+    def to_array(self, start=0, stop=None):
+        """
+        Returns a numpy string array of tokens start to stop-1.
+        """
+        if stop is None:
+            stop = len(self)
+        stop = max(start, stop)
+        
+        #the tokens are stored one after another, so there is no need to 
+        #gather their characters
+        return self.__to_array(self.offsets[start:stop], 
+                               self.offsets[start + 1:stop + 1],
+                               self.chars[self.offsets[start]:self.offsets[stop]])
+    
+    
+    def __to_array(self, starts, ends, token_chars):
+        #returns a string array of the tokens, given the concatenation of their
+        #characters
+        lengths = ends - starts
+        width = max(1, lengths.max() if len(lengths) else 0)
+        if len(lengths) and lengths.min() == width:
+            #tokens all have the same length (e.g. timestamps)
+            out = numpy.array(token_chars).reshape(len(lengths), width)
+        else:
+            out = numpy.zeros((len(starts), width), dtype=numpy.uint8)
+            is_char = numpy.arange(width) < lengths[:, numpy.newaxis]
+            out[is_char] = token_chars
+        return out.view('S%d'%width).reshape(-1)
+    
+    
+    def tolist(self):
+        return list(self)
+
+
+
+class TokenColumnBuilder:
+    """
+    Builds up a TokenColumn by appending tokens to it. The data is stored in 
+    GrowableArray objects, so it is moved to disk if it grows larger than 
+    spill_size bytes (if spill_size is None then it is always kept in memory).
+    """
+    def __init__(self, spill_size=DEFAULT_SPILL_SIZE):
+        self.__chars = GrowableArray(numpy.uint8, spill_size)
+        self.__offsets = GrowableArray(numpy.int64, spill_size)
+        self.__offsets.append([0])
+    
+    
+    def __len__(self):
+        return len(self.__offsets) - 1
+    
+    
+    def get_column(self):
+        """
+        Returns a TokenColumn of the current contents (without copying them).
+        """
+        return TokenColumn(self.__chars.get_array(), self.__offsets.get_array())
+    
+    
+    def trim(self):
+        """
+        Frees any space reserved for future appends.
+        """
+        self.__chars.trim()
+        self.__offsets.trim()
+    
+    
+    def append_words(self, chars, starts, ends):
+        """
+        Appends the tokens chars[starts[i]:ends[i]] to the column, where chars
+        is a numpy uint8 array.
+        """
+        self.__append(_gather(chars, starts, ends), ends - starts)
+    
+    
+    def append(self, tokens):
+        """
+        Appends a sequence of tokens (for example a list of strings or a 
+        TokenColumn) to the column.
+        """
+        if isinstance(tokens, TokenColumn):
+            self.__append(tokens.chars[tokens.offsets[0]:tokens.offsets[-1]], 
+                          numpy.diff(tokens.offsets))
+        else:
+            lengths = numpy.array([len(t) for t in tokens], dtype=numpy.int64)
+            self.__append(numpy.frombuffer(''.join(tokens), dtype=numpy.uint8),
+                          lengths)
+    
+    
+    def __append(self, chars, lengths):
+        end = self.__offsets.get_array()[-1]
+        self.__chars.append(chars)
+        self.__offsets.append(numpy.cumsum(lengths) + end)
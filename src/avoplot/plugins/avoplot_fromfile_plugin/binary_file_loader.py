@@ -0,0 +1,277 @@
+#Copyright (C) Nial Peters 2013
+#
+#This file is part of AvoPlot.
+#
+#AvoPlot is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#AvoPlot is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with AvoPlot.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Loaders for binary array files: numpy .npy and .npz files, and raw files of
+fixed size records. Wherever possible the data is memory-mapped rather than
+read into memory, so that large files open quickly.
+
+Raw files are described by a JSON "sidecar" file with the same name as the
+data file plus RAW_DESCRIPTION_SUFFIX, which can be created using
+write_raw_description(). It contains the fields of the numpy dtype dict
+specification ("names", "formats" and optionally "offsets" and "itemsize"),
+along with the optional "byte_order" ('<', '>' or '=', which overrides the 
+byte order of all the fields) and "header_bytes" (the number of bytes to skip 
+at the start of the file).
+"""
+import os
+import json
+import zipfile
+import struct
+import warnings
+import numpy
+import numpy.lib.format
+
+import loader
+
+NPY_MAGIC = '\x93NUMPY'
+ZIP_MAGIC = 'PK\x03\x04'
+
+RAW_DESCRIPTION_SUFFIX = '.rawinfo'
+
+
+def get_columns(a, title=''):
+    """
+    Returns a list of loader.ColumnData objects for the numpy array a.
+    Structured arrays have a column per field, and the second axis of 2D
+    arrays is split into separate columns. The columns are views of a, so no
+    data is copied.
+    """
+    if a.dtype.names:
+        columns = []
+        for name in a.dtype.names:
+            columns.extend(get_columns(a[name], name))
+        return columns
+
+    if a.ndim == 0:
+        a = a.reshape(1)
+    elif a.ndim > 2:
+        a = a.reshape(len(a), -1)
+
+    if a.ndim == 1:
+        return [_make_column(a, title)]
+    return [_make_column(a[:, i], '%s[%d]'%(title, i))
+            for i in range(a.shape[1])]
+
+
+def _make_column(a, title):
+    col = loader.ColumnData(a, title=title)
+    #no need to guess the type of numerical or time data
+    if a.dtype.kind in 'biuf':
+        col.d_type = 'number'
+    elif a.dtype.kind == 'M':
+        col.d_type = 'time'
+    return col
+
+
+class NpyFileLoader(loader.FileLoaderBase):
+    """
+    Loader for numpy .npy files. The array is memory-mapped from the file.
+    """
+    cache_results = False
+    extensions = ('.npy',)
+    magic_numbers = (NPY_MAGIC,)
+
+    def __init__(self):
+        self.name = "Numpy .npy file loader"
+
+
+    def test(self, filename, buf):
+        return buf[:len(NPY_MAGIC)] == NPY_MAGIC
+
+
+    def load(self, filename, buf, progress=None):
+        try:
+            try:
+                a = numpy.load(filename, mmap_mode='r')
+            except ValueError:
+                #empty arrays cannot be memory-mapped
+                a = numpy.load(filename)
+        except ValueError, e:
+            raise IOError("Failed to load %s. Error was: %s"%(filename, e))
+
+        return loader.FileContents(filename, get_columns(a))
+
+
+
+class NpzFileLoader(loader.FileLoaderBase):
+    """
+    Loader for numpy .npz files. Each array in the file is split into columns
+    titled with its name. Uncompressed arrays (as written by numpy.savez) are
+    memory-mapped from the file, compressed ones have to be read into memory.
+    """
+    cache_results = False
+    extensions = ('.npz',)
+    magic_numbers = (ZIP_MAGIC,)
+
+    def __init__(self):
+        self.name = "Numpy .npz file loader"
+
+
+    def test(self, filename, buf):
+        if buf[:len(ZIP_MAGIC)] != ZIP_MAGIC:
+            return False
+        try:
+            zf = zipfile.ZipFile(filename)
+        except (zipfile.BadZipfile, IOError):
+            return False
+        try:
+            names = zf.namelist()
+        finally:
+            zf.close()
+        return len(names) > 0 and all([n.endswith('.npy') for n in names])
+
+
+    def load(self, filename, buf, progress=None):
+        columns = []
+        try:
+            zf = zipfile.ZipFile(filename)
+            try:
+                for info in zf.infolist():
+                    a = map_npz_member(filename, info)
+                    if a is None:
+                        a = numpy.lib.format.read_array(zf.open(info))
+                    columns.extend(get_columns(a, info.filename[:-4]))
+            finally:
+                zf.close()
+        except (zipfile.BadZipfile, ValueError), e:
+            raise IOError("Failed to load %s. Error was: %s"%(filename, e))
+
+        return loader.FileContents(filename, columns)
+
+
+
+def map_npz_member(filename, info):
+    """
+    Returns a read-only memory-map of the array stored in the .npz file
+    member described by info (a zipfile.ZipInfo object), or None if the
+    array cannot be memory-mapped (because it is compressed, empty, or
+    contains Python objects).
+    """
+    if info.compress_type != zipfile.ZIP_STORED:
+        return None
+
+    with open(filename, 'rb') as ifp:
+        #the size of the local file header is not stored in the central
+        #directory, so it has to be read from the header itself
+        ifp.seek(info.header_offset)
+        header = struct.unpack(zipfile.structFileHeader,
+                               ifp.read(zipfile.sizeFileHeader))
+        ifp.seek(header[zipfile._FH_FILENAME_LENGTH] +
+                 header[zipfile._FH_EXTRA_FIELD_LENGTH], os.SEEK_CUR)
+
+        version = numpy.lib.format.read_magic(ifp)
+        if version == (1, 0):
+            shape, fortran_order, dtype = numpy.lib.format.read_array_header_1_0(ifp)
+        else:
+            shape, fortran_order, dtype = numpy.lib.format.read_array_header_2_0(ifp)
+        offset = ifp.tell()
+
+    if dtype.hasobject or numpy.prod(shape) == 0:
+        return None
+
+    return numpy.memmap(filename, dtype=dtype, mode='r', offset=offset,
+                        shape=shape, order='F' if fortran_order else 'C')
+
+
+
+class RawFileLoader(loader.FileLoaderBase):
+    """
+    Loader for raw binary files of fixed size records, described by a
+    sidecar file (see write_raw_description()). The records are
+    memory-mapped from the file, and each field of the record is a column.
+    """
+    cache_results = False
+
+    def __init__(self):
+        self.name = "Raw binary file loader"
+
+
+    def test(self, filename, buf):
+        return os.path.isfile(filename + RAW_DESCRIPTION_SUFFIX)
+
+
+    def load(self, filename, buf, progress=None):
+        dtype, header_bytes = read_raw_description(filename)
+
+        n_records, n_extra = divmod(max(len(buf) - header_bytes, 0),
+                                    dtype.itemsize)
+        if n_extra:
+            warnings.warn("Ignoring %d bytes of incomplete record at the end "
+                          "of %s"%(n_extra, filename))
+
+        if n_records == 0:
+            a = numpy.zeros(0, dtype=dtype)
+        else:
+            a = numpy.memmap(filename, dtype=dtype, mode='r',
+                             offset=header_bytes, shape=(n_records,))
+
+        return loader.FileContents(filename, get_columns(a))
+
+
+
+def read_raw_description(filename):
+    """
+    Returns a tuple of (dtype, header_bytes) describing the records of the
+    raw binary file filename, read from its sidecar file. Raises IOError if
+    the description cannot be read.
+    """
+    try:
+        with open(filename + RAW_DESCRIPTION_SUFFIX, 'rb') as ifp:
+            description = json.load(ifp)
+
+        spec = {'names':[str(n) for n in description['names']],
+                'formats':[str(f) for f in description['formats']]}
+        for key in ('offsets', 'itemsize'):
+            if description.has_key(key):
+                spec[key] = description[key]
+
+        dtype = numpy.dtype(spec)
+        if description.get('byte_order') is not None:
+            dtype = dtype.newbyteorder(str(description['byte_order']))
+        header_bytes = int(description.get('header_bytes', 0))
+
+    except (ValueError, KeyError, TypeError), e:
+        raise IOError("Invalid raw file description for %s. Error "
+                      "was: %s"%(filename, e))
+
+    return dtype, header_bytes
+
+
+def write_raw_description(filename, names, formats, byte_order=None,
+                          header_bytes=0, offsets=None, itemsize=None):
+    """
+    Writes the sidecar file describing the records of the raw binary file
+    filename, so that it can be opened by the RawFileLoader. The names,
+    formats, offsets and itemsize arguments are as for the dict form of
+    numpy.dtype(). If byte_order is set to one of '<', '>' or '=' (native) then 
+    it overrides the byte order of all the fields. header_bytes is the number 
+    of bytes to skip at the start of the file.
+    """
+    description = {'names':list(names), 'formats':list(formats),
+                   'byte_order':byte_order, 'header_bytes':header_bytes}
+    if offsets is not None:
+        description['offsets'] = list(offsets)
+    if itemsize is not None:
+        description['itemsize'] = itemsize
+
+    with open(filename + RAW_DESCRIPTION_SUFFIX, 'wb') as ofp:
+        json.dump(description, ofp, indent=2)
+
+
+loader.register_loader(NpyFileLoader())
+loader.register_loader(NpzFileLoader())
+loader.register_loader(RawFileLoader())
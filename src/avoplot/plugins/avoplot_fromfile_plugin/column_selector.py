@@ -22,17 +22,76 @@ functionality currently defined!
 """
 
 import wx
-import re
 import wx.lib.buttons
 import wx.grid
-import numpy
 import os
 import avoplot
 from avoplot.series import XYDataSeries
 import loader
+from selection import (InvalidSelectionError, compile_selection, 
+                       intersect_intervals, select_rows, parse_selection_str, 
+                       compile_selection_str, get_selection_data, 
+                       get_series_data)
+
+#number of rows of data shown in the grid before it needs to be scrolled
+GRID_MIN_ROWS = 10
+
+#number of the longest values from the sample of each column that are 
+#measured when setting the column widths
+N_WIDTHS_MEASURED = 10
+
+#interval (in ms) between updates of the display while a file is loading
+LOAD_UPDATE_INTERVAL = 250
+
+
+def wait_for_loader(parent, bg_loader, until_complete=False):
+    """
+    Shows a progress dialog until the contents of the file being loaded by 
+    bg_loader (a loader.BackgroundLoader object) are available, or if 
+    until_complete is True, until the whole file has been loaded (any chunks 
+    read in the background are added to the contents while waiting). Returns
+    False if the user cancelled loading the file, True otherwise (including
+    if loading failed - see bg_loader.get_error()).
+    """
+    def is_done():
+        if bg_loader.get_error() is not None:
+            return True
+        if not until_complete:
+            return bg_loader.get_contents() is not None
+        bg_loader.add_pending_chunks()
+        return bg_loader.is_complete()
+    
+    if is_done():
+        return True
+    
+    dialog = wx.ProgressDialog(avoplot.PROG_SHORT_NAME, 
+                               "Loading %s"%os.path.basename(bg_loader.filename),
+                               maximum=100, parent=parent, 
+                               style=(wx.PD_CAN_ABORT | wx.PD_APP_MODAL | 
+                                      wx.PD_ELAPSED_TIME))
+    try:
+        while not is_done():
+            if until_complete:
+                bg_loader.join(0.05)
+            else:
+                bg_loader.wait(0.05)
+            
+            n_bytes, n_rows = bg_loader.get_progress()
+            percent = int(100.0 * n_bytes / max(bg_loader.file_size, 1))
+            keep_going, skip = dialog.Update(min(percent, 99), 
+                                             "Loading %s\n%.1f of %.1f MB, %d "
+                                             "rows"%(os.path.basename(bg_loader.filename), 
+                                                     n_bytes / 1024.0**2, 
+                                                     bg_loader.file_size / 1024.0**2, 
+                                                     n_rows))
+            if not keep_going:
+                bg_loader.cancel()
+                return False
+    finally:
+        dialog.Destroy()
+    
+    return True
 
-class InvalidSelectionError(ValueError):
-    pass
 
 class FileContentsPanel(wx.Panel):
     def __init__(self, parent, file_contents):
@@ -81,26 +140,47 @@ class FileContentsPanel(wx.Panel):
         vsizer.Add(self.grid_panel, 1, wx.EXPAND)
 
         #add a drop-down panel for displaying the file footer contents (if there is any)
-        if file_contents.footer:
-            self.footer_pane = wx.CollapsiblePane(self, wx.ID_ANY, "File Footer")
-            win = self.footer_pane.GetPane()
-            footer_txt_ctrl = wx.TextCtrl(win, wx.ID_ANY, value=file_contents.footer,
-                                          style=wx.TE_MULTILINE | wx.TE_READONLY | wx.HSCROLL)
-            
-            footer_pane_sizer = wx.BoxSizer(wx.VERTICAL)
-            footer_pane_sizer.Add(footer_txt_ctrl, 1, wx.GROW | wx.ALL, border=5)
-            
-            win.SetSizer(footer_pane_sizer)
-            footer_pane_sizer.SetSizeHints(win)
-            wx.EVT_COLLAPSIBLEPANE_CHANGED(self, self.footer_pane.GetId(), self.on_expand)
-            
-            vsizer.Add(self.footer_pane, 0, wx.GROW)
-        else:
-            self.footer_pane = None
+        self.footer_pane = None
+        self.vsizer = vsizer
+        self.file_contents = file_contents
+        self.create_footer_pane()
         self.SetSizer(vsizer)
         vsizer.Fit(self)
         self.SetAutoLayout(True)
     
+    def create_footer_pane(self):
+        """
+        Adds a drop-down panel for displaying the file footer, if the file has 
+        one and the panel does not exist yet.
+        """
+        if self.footer_pane is not None or not self.file_contents.footer:
+            return
+        
+        self.footer_pane = wx.CollapsiblePane(self, wx.ID_ANY, "File Footer")
+        win = self.footer_pane.GetPane()
+        footer_txt_ctrl = wx.TextCtrl(win, wx.ID_ANY, value=self.file_contents.footer,
+                                      style=wx.TE_MULTILINE | wx.TE_READONLY | wx.HSCROLL)
+        
+        footer_pane_sizer = wx.BoxSizer(wx.VERTICAL)
+        footer_pane_sizer.Add(footer_txt_ctrl, 1, wx.GROW | wx.ALL, border=5)
+        
+        win.SetSizer(footer_pane_sizer)
+        footer_pane_sizer.SetSizeHints(win)
+        wx.EVT_COLLAPSIBLEPANE_CHANGED(self, self.footer_pane.GetId(), self.on_expand)
+        
+        self.vsizer.Add(self.footer_pane, 0, wx.GROW)
+        self.vsizer.Layout()
+    
+    
+    def update(self):
+        """
+        Updates the panel to show any data that has been loaded since it was
+        created (for files that are being loaded in chunks).
+        """
+        self.grid_panel.update_rows()
+        self.create_footer_pane()
+    
+    
     def on_expand(self, evnt):
         self.SendSizeEvent()
     
@@ -132,37 +212,90 @@ class FileContentsPanel(wx.Panel):
                 self.footer_pane.Enable()
 
 
+class FileContentsTable(wx.grid.PyGridTableBase):
+    """
+    Virtual grid table for displaying the columns of a FileContents object. 
+    Cell values are only fetched from the file contents when the grid needs 
+    to display them, so the table can be used for files of any length.
+    """
+    def __init__(self, file_contents):
+        wx.grid.PyGridTableBase.__init__(self)
+        self.file_contents = file_contents
+        self.columns = file_contents.get_columns()
+        self.n_rows = file_contents.get_number_of_rows()
+        self.edited_values = {} #(row, col):value for cells edited by the user
+    
+    
+    def GetNumberRows(self):
+        return self.n_rows
+    
+    
+    def GetNumberCols(self):
+        return len(self.columns)
+    
+    
+    def IsEmptyCell(self, row, col):
+        return False
+    
+    
+    def GetValue(self, row, col):
+        try:
+            return self.edited_values[(row, col)]
+        except KeyError:
+            return self.columns[col].get_raw_values(row, row + 1)[0]
+    
+    
+    def SetValue(self, row, col, value):
+        self.edited_values[(row, col)] = value
+    
+    
+    def GetColLabelValue(self, col):
+        label = self.file_contents.get_col_name(col)
+        title = self.columns[col].title
+        if title and not title.isspace():
+            label = ''.join([label, '\n', title])
+        return label
+    
+    
+    def update_rows(self):
+        """
+        Tells the grid about any rows that have been loaded since the table
+        was last updated (for files that are being loaded in chunks). Returns 
+        the number of new rows.
+        """
+        n_new_rows = self.file_contents.get_number_of_rows() - self.n_rows
+        if n_new_rows <= 0:
+            return 0
+        
+        self.n_rows += n_new_rows
+        msg = wx.grid.GridTableMessage(self, 
+                                       wx.grid.GRIDTABLE_NOTIFY_ROWS_APPENDED,
+                                       n_new_rows)
+        self.GetView().ProcessTableMessage(msg)
+        return n_new_rows
+
+
+
 class ColumnDataPanel(wx.ScrolledWindow):
     def __init__(self, parent, file_contents):
         wx.ScrolledWindow.__init__(self, parent, wx.ID_ANY)
         self.SetScrollRate(5,5)
         self.file_contents = file_contents
         n_cols = file_contents.get_number_of_columns()
-        n_rows = file_contents.get_number_of_rows()
         
         vsizer = wx.BoxSizer(wx.VERTICAL)
      
-        #create cells
+        #create the grid - the cell values are only read from the file 
+        #contents when they are displayed
         self.grid = wx.grid.Grid(self, wx.ID_ANY)
         self.grid.EnableGridLines(False)
-        self.grid.CreateGrid(n_rows, n_cols)
-        self.col_letter_names = []
-                
+        self.table = FileContentsTable(file_contents)
+        self.grid.SetTable(self.table, True)
+        self.col_letter_names = [file_contents.get_col_name(c) 
+                                 for c in range(n_cols)]
+        self.__set_label_sizes()
         for c, col in enumerate(file_contents.get_columns()):
-            self.col_letter_names.append(self.grid.GetColLabelValue(c))
-            if col.title and not col.title.isspace():
-                self.grid.SetColLabelValue(c, ''.join([self.grid.GetColLabelValue(c),'\n',col.title]))
-            
-            for r, data in enumerate(col.raw_data):
-                self.grid.SetCellValue(r, c, data)
-        
-        self.grid.AutoSize()
-        
-        #set the size of the grid to be big enough that the grid's scrollbars are
-        #not enabled
-        self.grid.SetSize(self.grid.GetBestVirtualSize())
-        #self.grid.DisableDragColSize()
-        #self.grid.DisableDragRowSize()
+            self.grid.SetColSize(c, self.__get_col_width(c, col))
         
         #create choice boxes for data types
         self.data_type_sizer = wx.BoxSizer(wx.HORIZONTAL)
@@ -171,7 +304,8 @@ class ColumnDataPanel(wx.ScrolledWindow):
         self.data_type_sizer.AddSpacer(self.grid.GetRowLabelSize()-text.GetSize()[0])
         self.data_type_choices = {}
         self.choices_list = []
-        self.dtypes = ["number", "text"]
+        self.dtypes = ["number", "text", "time"]
+        file_contents.guess_data_types()
         for col in file_contents.get_columns():
             choice = wx.Choice(self, wx.ID_ANY, choices=self.dtypes)
             
@@ -198,6 +332,10 @@ class ColumnDataPanel(wx.ScrolledWindow):
                 self.grid.SetColMinimalWidth(idx,choice_size)
         wx.grid.EVT_GRID_CMD_COL_SIZE(self, self.grid.GetId(), self.on_column_resize)
         
+        #the grid scrolls vertically, but is made wide enough to show all the 
+        #columns so that they stay lined up with the data type choices
+        self.__set_grid_min_size()
+        
         vsizer.Add(self.data_type_sizer, 0, wx.EXPAND)
         vsizer.Add(self.grid, 1, wx.EXPAND)
         
@@ -207,6 +345,60 @@ class ColumnDataPanel(wx.ScrolledWindow):
         #self.grid.EnableGridLines(True)
 
     
+    def __set_label_sizes(self):
+        #size the row labels to fit the largest row number, and the column 
+        #labels to fit the titles
+        dc = wx.ClientDC(self.grid)
+        dc.SetFont(self.grid.GetLabelFont())
+        n_rows = max(self.file_contents.get_number_of_rows(), 1)
+        self.grid.SetRowLabelSize(dc.GetTextExtent(str(n_rows))[0] + 20)
+        
+        label_height = max([dc.GetMultiLineTextExtent(self.table.GetColLabelValue(c))[1]
+                            for c in range(self.table.GetNumberCols())] + [0])
+        self.grid.SetColLabelSize(max(self.grid.GetColLabelSize(), 
+                                      label_height + 8))
+    
+    
+    def __get_col_width(self, c, col):
+        #returns the width needed for column c, based on its label and a 
+        #sample of its values (measuring only the longest ones)
+        sample = [str(v) for v in col.get_type_sample()]
+        sample.sort(key=len)
+        
+        dc = wx.ClientDC(self.grid)
+        dc.SetFont(self.grid.GetDefaultCellFont())
+        width = max([dc.GetTextExtent(v)[0] 
+                     for v in sample[-N_WIDTHS_MEASURED:]] + [0])
+        
+        dc.SetFont(self.grid.GetLabelFont())
+        label_width = dc.GetMultiLineTextExtent(self.table.GetColLabelValue(c))[0]
+        
+        return max(width, label_width) + 10
+    
+    
+    def __set_grid_min_size(self):
+        width = (self.grid.GetRowLabelSize() + 
+                 sum([self.grid.GetColSize(c) 
+                      for c in range(self.grid.GetNumberCols())]) +
+                 wx.SystemSettings.GetMetric(wx.SYS_VSCROLL_X))
+        n_rows = min(self.grid.GetNumberRows(), GRID_MIN_ROWS)
+        height = (self.grid.GetColLabelSize() + 
+                  n_rows * self.grid.GetDefaultRowSize() +
+                  wx.SystemSettings.GetMetric(wx.SYS_HSCROLL_Y))
+        self.grid.SetMinSize((width, height))
+    
+    
+    def update_rows(self):
+        """
+        Adds any rows that have been loaded since the grid was last updated 
+        (for files that are being loaded in chunks).
+        """
+        if self.table.update_rows():
+            self.__set_label_sizes()
+            self.__set_grid_min_size()
+            self.Layout()
+    
+    
     def on_change_col_dtype(self, evnt):
         choice, col = self.data_type_choices[evnt.GetId()]
             
@@ -323,13 +515,15 @@ class ColumnDataPanel(wx.ScrolledWindow):
         for col_num, choice in enumerate(self.choices_list):
             col_size = self.grid.GetColSize(col_num)
             choice.SetMinSize((col_size,-1))
-            
-        self.data_type_sizer.Layout()
+        
+        self.__set_grid_min_size()
+        self.Layout()
      
    
 class XYDataSeriesPanel(wx.Panel):
     def __init__(self, parent, file_contents, main_frame):
         self.__selecting_x = False
+        self.__compiled_selections = {}
         self.file_contents = file_contents        
         wx.Panel.__init__(self, parent, wx.ID_ANY)
         self.hsizer = wx.BoxSizer(wx.HORIZONTAL)
@@ -383,38 +577,32 @@ class XYDataSeriesPanel(wx.Panel):
     
     def plot_into_axes(self, axes):
         
-        xdata = self.get_x_series_data()
-        ydata = self.get_y_series_data()
+        data = self.get_series_data()
         
-        if xdata is None and ydata is None:
+        if data is None:
             return
         
-        if xdata is None:
-            axes.plot(numpy.arange(len(ydata)),ydata)
-        elif ydata is None:
-            axes.plot(xdata,numpy.arange(len(xdata)))
-        else:
-                axes.plot(xdata, ydata)
+        axes.plot(*data)
     
     
     def get_series_data(self):
         """
-        Returns a tuple of (xdata, ydata)
+        Returns a tuple of (xdata, ydata) containing the rows that are in both
+        the x and y selections. If only one of them has been selected, then 
+        the row numbers are used for the other.
         """
-        xdata = self.get_x_series_data()
-        ydata = self.get_y_series_data()
-        
-        if xdata is None and ydata is None:
-            return
-        
-        if xdata is None:
-            return (numpy.arange(len(ydata)),ydata)
-        elif ydata is None:
-            return (xdata,numpy.arange(len(xdata)))
-        else:
-            return (xdata, ydata)
+        return get_series_data(
+                    self.__compile_selection_str(self.xseries_box.GetValue()),
+                    self.__compile_selection_str(self.yseries_box.GetValue()))
         
         
+    def get_selection_strs(self):
+        """
+        Returns a tuple of the (x, y) selection strings entered for the series.
+        """
+        return self.xseries_box.GetValue(), self.yseries_box.GetValue()
+    
+    
     def get_x_series_data(self):
         return self.__get_data_selection(self.xseries_box.GetValue(), False)      
         
@@ -422,100 +610,48 @@ class XYDataSeriesPanel(wx.Panel):
         return self.__get_data_selection(self.yseries_box.GetValue(), False)     
     
     def validate_selection(self, row_selection):
-        self._validate_selection_str(self.xseries_box.GetValue(), row_selection)
-        self._validate_selection_str(self.yseries_box.GetValue(), row_selection)
+        if row_selection:
+            raise NotImplementedError("Selecting rows as data series is not implemented yet!")
+        self.__compile_selection_str(self.xseries_box.GetValue())
+        self.__compile_selection_str(self.yseries_box.GetValue())
       
     def _validate_selection_str(self, selection_str, row_selection=False):
         if row_selection:
             raise NotImplementedError("Selecting rows as data series is not implemented yet!")
         
-        if not selection_str or selection_str.isspace():
-            return []
-        
-        selection_blocks = selection_str.split(',')
-        
-        if row_selection:
-            raise NotImplementedError("Selecting rows as data series is not implemented yet!")
-        else:
-                   
-            regexp = re.compile(r'''
-                                   (?:^\s*(?P<column>[A-Z]+) #matches column name 
-                                   \s*\[\s*(?P<lower_bound>[0-9]*) #matches lower bound number (if there is one)
-                                   \s*:\s*  
-                                   (?P<upper_bound>[0-9]*)\s*\]\s*$) #matches upped bound number (if there is one)''', 
-                                   flags=re.VERBOSE)
-            cols = set()
-            selection_params = []
-            for block in selection_blocks:
-                match = regexp.match(block)
-                
-                if match is None:
-                    #then there is a syntax error in the selection string
-                    raise InvalidSelectionError("Syntax error in selection string. \'%s\' is not a valid selection, expecting something of the form \'A[2:8]\'."%block)
-            
-                params = match.groupdict()
-                selection_params.append(params)
-
-                cols.add(params['column'])
-                n_rows = self.file_contents.get_column_by_name(params['column']).get_number_of_rows()
-                   
-                if not params['lower_bound']:
-                    params['lower_bound'] = '1'
-                if not params['upper_bound']:
-                    params['upper_bound'] = str(n_rows)
-                
-                lower_bound = int(params['lower_bound'])
-                upper_bound = int(params['upper_bound'])
-                
-                if lower_bound < 1:
-                    raise InvalidSelectionError("Value error in selection string. \'%s\' is not a valid selection, lower bound must be greater than zero."%block)
-                
-                if lower_bound > upper_bound:
-                    raise InvalidSelectionError("Value error in selection string. \'%s\' is not a valid selection, upper bound cannot be smaller than lower bound."%block)
-                 
-                if upper_bound > n_rows:
-                    raise InvalidSelectionError("Value error in selection string. \'%s\' is not a valid selection, upper bound is outside data range."%block)
-        
-            if len(cols) != 1:
-                raise InvalidSelectionError("Selection cannot contain data from multiple columns.")
-            
-        return selection_params
+        return parse_selection_str(selection_str, self.file_contents)
                     
+    def __compile_selection_str(self, selection_str):
+        """
+        Returns compile_selection_str() of the selection string. Results are 
+        cached, so strings are only validated once.
+        """
+        #the number of rows changes while files are being loaded in chunks
+        key = (selection_str, self.file_contents.get_number_of_rows())
+        try:
+            return self.__compiled_selections[key]
+        except KeyError:
+            pass
+        
+        self.__compiled_selections[key] = compile_selection_str(selection_str, 
+                                                        self.file_contents)
+        return self.__compiled_selections[key]
+    
+    
     def __get_data_selection(self, selection_str, row_selection=False):
         """
         Given a selection string (of the form "A[1:20], A[23:25]", returns a masked array
-        of the requested data.
+        of the requested rows of data. A selection of a single block of rows 
+        is returned as a view of the column data.
         """
         if row_selection:
             raise NotImplementedError("Selecting rows as data series is not implemented yet!")
         
-        if not selection_str or selection_str.isspace():
-            #empty string - no selection made
+        selection = self.__compile_selection_str(selection_str)
+        if selection is None:
             return None
         
-        selection_params = self._validate_selection_str(selection_str, row_selection)
-        
-        #see if we have any complete column selections - life is easy if we do!
-        blocks = []
-        for s in selection_params:
-            #-1 because array indexing starts at 0 but row indexing starts at 1
-            blocks.append((int(s['lower_bound'])-1,int(s['upper_bound'])-1))
-        
-        #otherwise build a mask for the selection       
-        column = self.file_contents.get_column_by_name(selection_params[0]['column'])
-        data_mask = column.get_data_mask()
-        
-        #sort selection blocks into row order
-        tuple_compare = lambda x1,x2: cmp(x1[0], x2[0])
-        blocks.sort(cmp=tuple_compare)
-
-        selection_mask = numpy.ones_like(data_mask)
-        
-        for start,end in blocks:
-            selection_mask[start:end+1] = False
-        mask = numpy.logical_or(data_mask, selection_mask)
-        
-        return numpy.ma.masked_array(column.get_data(), mask=mask)
+        return get_selection_data(*selection)
         
 
           
@@ -628,12 +764,24 @@ class DataSeriesSelectPanel(wx.ScrolledWindow):
         
            
 class TxtFileDataSeriesSelectFrame(wx.Dialog):
-    def __init__(self, parent, file_contents):
+    def __init__(self, parent, file_contents, bg_loader=None):
+        """
+        If the file is still being loaded in the background, then bg_loader
+        should be the loader.BackgroundLoader object that is loading it, and 
+        the display is updated as the rest of the file is loaded.
+        """
         #set the title to the file name
         frame_title = "%s - Data Select - %s" %(file_contents.filename,avoplot.PROG_SHORT_NAME)     
         wx.Dialog.__init__(self, parent, wx.ID_ANY, frame_title, style=wx.DEFAULT_DIALOG_STYLE|wx.RESIZE_BORDER|wx.MAXIMIZE_BOX|wx.MINIMIZE_BOX)
         self.parent = parent
         self.filename = file_contents.filename
+        self.file_contents = file_contents
+        self.bg_loader = bg_loader
+        self.load_timer = None
+        
+        #list of ((x, y) selection strings, (xdata, ydata)) tuples for the 
+        #series which have data selected - set when the plot button is pressed
+        self.__selected_series = []
         
         #set up the icon for the frame
         self.SetIcon(wx.ArtProvider.GetIcon("avoplot"))
@@ -663,6 +811,12 @@ class TxtFileDataSeriesSelectFrame(wx.Dialog):
             
         #create main buttons
         buttons_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        self.follow_checkbox = wx.CheckBox(top_panel, wx.ID_ANY, "Follow file")
+        self.follow_checkbox.SetToolTipString("Add rows to the plot as they are "
+                                              "appended to the file")
+        buttons_sizer.Add(self.follow_checkbox, 0, wx.ALIGN_CENTER_VERTICAL | wx.RIGHT, border=10)
+        self.load_status = wx.StaticText(top_panel, wx.ID_ANY, "")
+        buttons_sizer.Add(self.load_status, 1, wx.ALIGN_CENTER_VERTICAL | wx.RIGHT, border=10)
         self.plot_button = wx.Button(top_panel, wx.ID_ANY, "Plot")
         self.cancel_button = wx.Button(top_panel, wx.ID_ANY, "Cancel")
         buttons_sizer.Add(self.cancel_button, 1, wx.ALIGN_RIGHT | wx.ALIGN_BOTTOM)
@@ -680,29 +834,116 @@ class TxtFileDataSeriesSelectFrame(wx.Dialog):
         
         self.SendSizeEvent() #force redraw (only needed for windows)
         self.splitter.SetSashGravity(0.5)
+        
+        #if the file is still being loaded then load the rest of it in the 
+        #background
+        if self.bg_loader is not None:
+            self.load_timer = wx.Timer(self)
+            wx.EVT_TIMER(self, self.load_timer.GetId(), self.on_load_timer)
+            self.load_timer.Start(LOAD_UPDATE_INTERVAL)
+            self.__update_load_status()
+        elif not self.__is_loaded():
+            wx.EVT_IDLE(self, self.on_idle)
+        
         self.Show()
+    
+    
+    def __is_loaded(self):
+        return (not isinstance(self.file_contents, loader.StreamingFileContents)
+                or self.file_contents.is_complete())
+    
+    
+    def on_idle(self, evnt):
+        """
+        Event handler for idle events. Loads the next chunk of the file (if it
+        is still being loaded) and adds it to the display.
+        """
+        if self.__is_loaded():
+            return
+        
+        self.file_contents.load_next_chunk()
+        self.file_contents_panel.update()
+        evnt.RequestMore()
+    
+    
+    def on_load_timer(self, evnt):
+        """
+        Event handler for the load timer. Adds any chunks of the file that 
+        have been loaded in the background to the display.
+        """
+        self.bg_loader.add_pending_chunks()
+        self.file_contents_panel.update()
+        self.__update_load_status()
+    
+    
+    def __update_load_status(self):
+        error = self.bg_loader.get_error()
+        if self.bg_loader.is_complete():
+            self.__stop_load_timer()
+            self.load_status.SetLabel("")
+        elif error is not None:
+            self.__stop_load_timer()
+            self.load_status.SetLabel("Only %d rows loaded: %s"%(
+                                self.file_contents.get_number_of_rows(), error))
+        else:
+            n_bytes = self.bg_loader.get_progress()[0]
+            self.load_status.SetLabel("Loading... %d%% (%d rows)"%(
+                                100 * n_bytes / max(self.bg_loader.file_size, 1),
+                                self.file_contents.get_number_of_rows()))
+    
+    
+    def __stop_load_timer(self):
+        if self.load_timer is not None:
+            self.load_timer.Stop()
+            self.load_timer = None
 
 
     def on_plot(self, evnt):
-        data_flag = False
+        if self.bg_loader is not None:
+            #the whole file is needed to plot the selected data. If loading is 
+            #cancelled, then just the rows loaded so far are plotted next time
+            loaded = wait_for_loader(self, self.bg_loader, until_complete=True)
+            self.file_contents_panel.update()
+            self.__update_load_status()
+            if not loaded:
+                return
+        
+        elif not self.__is_loaded():
+            #the whole file is needed to plot the selected data
+            wx.BeginBusyCursor()
+            try:
+                self.file_contents.load_all()
+                self.file_contents_panel.update()
+            finally:
+                wx.EndBusyCursor()
+        
+        #the data of each series is only fetched once, and is then used by 
+        #get_series() and get_selections()
+        selected_series = []
         for series in self.data_series_panel.data_series:
             try:
                 #TODO - read the row data status from the checkbox
                 series.validate_selection(False)
-                if series.get_series_data(): #TODO - this is a hack for now!
-                    data_flag=True
+                data = series.get_series_data()
+                if data:
+                    selected_series.append((series.get_selection_strs(), data))
             except InvalidSelectionError,e:
                 wx.MessageBox(e.args[0], avoplot.PROG_SHORT_NAME, wx.ICON_ERROR)
                 return
-        if not data_flag:
+        if not selected_series:
             wx.MessageBox("No data series selected!", avoplot.PROG_SHORT_NAME, wx.ICON_ERROR)
             return
+        self.__selected_series = selected_series
+        self.__stop_load_timer()
         self.EndModal(wx.ID_OK)
         
     
     def on_cancel(self, evnt):
         wx.SetCursor(wx.NullCursor)
         #self.file_contents_panel.SetCursor(wx.NullCursor)
+        self.__stop_load_timer()
+        if self.bg_loader is not None:
+            self.bg_loader.cancel()
         self.EndModal(wx.ID_CANCEL)
 
     
@@ -721,10 +962,25 @@ class TxtFileDataSeriesSelectFrame(wx.Dialog):
 
     def get_series(self):
         series = []
-        for s in self.data_series_panel.data_series:
-            data = s.get_series_data()
-            if data:
-                series.append(XYDataSeries(os.path.basename(self.filename),xdata=data[0], ydata=data[1]))
+        for selection_strs, data in self.__selected_series:
+            series.append(XYDataSeries(os.path.basename(self.filename),xdata=data[0], ydata=data[1]))
         return series
     
+    
+    def follow_file(self):
+        """
+        Returns True if the user chose to follow the file, i.e. to add rows 
+        to the series as they are appended to the file.
+        """
+        return self.follow_checkbox.GetValue()
+    
+    
+    def get_selections(self):
+        """
+        Returns a list of the (x, y) selection strings of each of the series 
+        returned by get_series(), for applying the same selections to other
+        files.
+        """
+        return [selection_strs for selection_strs, data in self.__selected_series]
+    
 
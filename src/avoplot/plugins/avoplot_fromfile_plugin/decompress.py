@@ -0,0 +1,170 @@
+#Copyright (C) Nial Peters 2013
+#
+#This file is part of AvoPlot.
+#
+#AvoPlot is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#AvoPlot is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with AvoPlot.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Reading of compressed (gzip, bzip2 and xz) files. The files are decompressed
+a block at a time as they are read, so that they never have to be held in
+memory (or on disk) in their decompressed form. Reading xz files requires the
+lzma module (backports.lzma for Python 2).
+"""
+import zlib
+import bz2
+
+try:
+    import lzma
+    have_lzma = True
+except ImportError:
+    try:
+        from backports import lzma
+        have_lzma = True
+    except ImportError:
+        have_lzma = False
+
+#exceptions raised by the decompressors for invalid data
+_DECOMPRESSION_ERRORS = (zlib.error, IOError, ValueError)
+if have_lzma:
+    _DECOMPRESSION_ERRORS += (lzma.LZMAError,)
+
+#number of bytes of compressed data that are decompressed at a time
+READ_SIZE = 32768
+
+#magic numbers and file extensions of the supported compression formats
+COMPRESSION_FORMATS = {'gzip':('\x1f\x8b', '.gz'),
+                       'bzip2':('BZh', '.bz2'),
+                       'xz':('\xfd7zXZ\x00', '.xz')}
+
+#number of bytes needed from the start of a file to identify its compression
+MAGIC_SIZE = max([len(m) for m, ext in COMPRESSION_FORMATS.values()])
+
+
+def get_compression(head):
+    """
+    Returns the compression format ('gzip', 'bzip2' or 'xz') of a file whose
+    contents start with head, or None if it is not compressed.
+    """
+    for compression, (magic_number, ext) in COMPRESSION_FORMATS.items():
+        if head[:len(magic_number)] == magic_number:
+            return compression
+    return None
+
+
+def strip_extension(filename, compression):
+    """
+    Returns the filename with the extension of the compression format removed
+    (if it has it), e.g. "data.txt.gz" -> "data.txt".
+    """
+    ext = COMPRESSION_FORMATS[compression][1]
+    if filename.lower().endswith(ext):
+        return filename[:-len(ext)]
+    return filename
+
+
+def _new_decompressor(compression):
+    if compression == 'gzip':
+        #the extra 16 tells zlib to expect a gzip header
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if compression == 'bzip2':
+        return bz2.BZ2Decompressor()
+    return lzma.LZMADecompressor()
+
+
+
+class DecompressedFile:
+    """
+    Read-only file-like object for reading the decompressed contents of the
+    compressed file filename. Files made up of several compressed streams
+    (e.g. created by concatenating compressed files, or by pbzip2) are read as
+    a single file. Note that tell() returns the number of bytes of the
+    compressed file that have been read so far, so that it can be used for
+    showing the progress of loading the file.
+
+    Raises IOError if the file cannot be decompressed.
+    """
+    def __init__(self, filename, compression):
+        if compression == 'xz' and not have_lzma:
+            raise IOError("Cannot read %s. Reading xz files requires the lzma "
+                          "module (backports.lzma for Python 2)"%filename)
+
+        self.name = filename
+        self.__compression = compression
+        self.__decompressor = _new_decompressor(compression)
+        self.__ifp = open(filename, 'rb')
+        self.__blocks = [] #decompressed data that has not been read yet
+        self.__n_buffered = 0
+        self.__eof = False
+
+
+    def read(self, n_bytes=-1):
+        """
+        Returns the next n_bytes bytes of decompressed data (or all of the rest
+        of it if n_bytes is negative). Fewer bytes are only returned at the end
+        of the file.
+        """
+        while not self.__eof and (n_bytes < 0 or self.__n_buffered < n_bytes):
+            self.__decompress_block()
+
+        data = ''.join(self.__blocks)
+        if n_bytes < 0:
+            n_bytes = len(data)
+
+        self.__blocks = [data[n_bytes:]]
+        self.__n_buffered = len(data) - n_bytes
+        return data[:n_bytes]
+
+
+    def __decompress_block(self):
+        data = self.__ifp.read(READ_SIZE)
+        if not data:
+            self.__eof = True
+            return
+
+        try:
+            while data:
+                try:
+                    block = self.__decompressor.decompress(data)
+                except EOFError:
+                    #the last stream ended exactly at the end of the previous
+                    #block, and another one follows it
+                    self.__decompressor = _new_decompressor(self.__compression)
+                    continue
+
+                self.__blocks.append(block)
+                self.__n_buffered += len(block)
+
+                #anything after the end of a stream is the start of the next
+                data = self.__decompressor.unused_data
+                if data:
+                    self.__decompressor = _new_decompressor(self.__compression)
+
+        except _DECOMPRESSION_ERRORS, e:
+            raise IOError("Failed to decompress %s. Error was: %s"%(self.name,
+                                                                   e))
+
+
+    def tell(self):
+        return self.__ifp.tell()
+
+
+    def close(self):
+        self.__ifp.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,148 @@
+#Copyright (C) Nial Peters 2013
+#
+#This file is part of AvoPlot.
+#
+#AvoPlot is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#AvoPlot is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with AvoPlot.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Following of text files that are still being written to (e.g. log files), so
+that rows appended to the file are added to the series plotted from it.
+"""
+import os
+import re
+import wx
+import numpy
+
+import avoplot
+import column_selector
+
+#interval (in ms) between checks for new rows in followed files
+FOLLOW_INTERVAL = 1000
+
+#matches blocks of selection strings with no upper bound, e.g. "A[10:]"
+_OPEN_ENDED_BLOCK = re.compile(r':\s*\]')
+
+
+def is_open_ended(selection_str):
+    """
+    Returns True if rows appended to the file should be added to the data
+    selected by selection_str, i.e. if one of its blocks has no upper bound
+    (e.g. "A[10:]"), or if it is empty (in which case the row numbers are used
+    as the data).
+    """
+    if not selection_str or selection_str.isspace():
+        return True
+    return _OPEN_ENDED_BLOCK.search(selection_str) is not None
+
+
+
+class FileFollowTimer(wx.Timer):
+    """
+    Timer which periodically reads the rows that have been appended to a file
+    using file_follower (e.g. a txt_file_loader.TextFileFollower object) and
+    adds them to the series that were plotted from file_contents (see
+    add_series()). Each subplot is only redrawn once per check of the file,
+    however many rows or series were added to it. The timer stops once all
+    the series have been deleted.
+    """
+    def __init__(self, file_follower, file_contents, interval=FOLLOW_INTERVAL):
+        wx.Timer.__init__(self)
+        self.__follower = file_follower
+        self.__file_contents = file_contents
+        self.__n_rows = file_contents.get_number_of_rows()
+        self.__interval = interval
+        self.__series = [] #(series, x column index, y column index) tuples
+
+
+    def add_series(self, series, x_selection, y_selection):
+        """
+        Follows the file for series (an XYDataSeries object), which was
+        plotted using the x and y selection strings. Only series whose
+        selections are both open ended (see is_open_ended()) are followed.
+        Returns True if the series will be followed.
+        """
+        if not (is_open_ended(x_selection) and is_open_ended(y_selection)):
+            return False
+
+        columns = self.__file_contents.get_columns()
+        idxs = []
+        for selection_str in (x_selection, y_selection):
+            selection = column_selector.compile_selection_str(selection_str,
+                                                        self.__file_contents)
+            if selection is None:
+                idxs.append(None)
+            else:
+                idxs.append(columns.index(selection[0]))
+
+        self.__series.append((series, idxs[0], idxs[1]))
+        return True
+
+
+    def start(self):
+        """
+        Starts following the file (if any series are being followed).
+        """
+        if self.__series:
+            self.Start(self.__interval)
+
+
+    def Notify(self):
+        #stop following once all the series have been deleted
+        self.__series = [s for s in self.__series
+                         if s[0].get_subplot() is not None]
+        if not self.__series:
+            self.Stop()
+            return
+
+        try:
+            new_rows = self.__follower.read_new_rows()
+        except IOError, e:
+            self.Stop()
+            wx.MessageBox("Stopped following %s. Error was: %s"%(
+                                os.path.basename(self.__follower.filename), e),
+                          avoplot.PROG_SHORT_NAME, wx.ICON_ERROR)
+            return
+
+        if new_rows is not None:
+            self.add_rows(new_rows)
+
+
+    def add_rows(self, new_rows):
+        """
+        Adds new rows (a list of sequences of string tokens, one for each
+        column of the file) to the series and redraws them.
+        """
+        n_new = len(new_rows[0])
+        row_idxs = numpy.arange(self.__n_rows, self.__n_rows + n_new)
+        self.__n_rows += n_new
+
+        #each column is only converted once, however many series use it
+        columns = self.__file_contents.get_columns()
+        converted = {None:row_idxs}
+        def get_values(idx):
+            if not converted.has_key(idx):
+                converted[idx] = columns[idx].convert(new_rows[idx])
+            return converted[idx]
+
+        subplots = []
+        for series, x_idx, y_idx in self.__series:
+            series.append_xy_data(get_values(x_idx), get_values(y_idx))
+            subplot = series.get_subplot()
+            if subplot not in subplots:
+                subplots.append(subplot)
+
+        for subplot in subplots:
+            axes = subplot.get_mpl_axes()
+            axes.relim()
+            axes.autoscale_view()
+            subplot.update()
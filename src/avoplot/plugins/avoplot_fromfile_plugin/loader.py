@@ -14,46 +14,564 @@
 #
 #You should have received a copy of the GNU General Public License
 #along with AvoPlot.  If not, see <http://www.gnu.org/licenses/>.
-import StringIO
+import os
+import sys
+import mmap
+import itertools
+import collections
+import warnings
+import multiprocessing
+import threading
+import Queue
 import string
 import datetime
 import numpy
 
+from avoplot import data_cache
+import arrays
+import decompress
+
+#registered loaders, highest priority first, and indexes of them by file
+#extension and magic number
 __available_loaders = []
+__loaders_by_extension = {}
+__loaders_by_magic = {}
+__magic_number_lengths = set()
+
+#loaders chosen for previously opened files, keyed by path. Values are tuples 
+#of (file signature, loader).
+__chosen_loaders = {}
+
+#the test_samples() method of loaders is passed (at most) this many bytes 
+#from the start and from the end of the file when choosing which loader to use
+DISPATCH_HEADER_SIZE = 65536
+DISPATCH_TAIL_SIZE = 65536
+
+#the parsed contents of files are stored in the data cache using keys starting
+#with these - change the version if the format of cache entries changes
+_CACHE_NAMESPACE = 'avoplot_fromfile_plugin'
+_CACHE_FORMAT_VERSION = 2
+
+#default number of rows read at a time by streaming loaders
+DEFAULT_CHUNK_ROWS = 100000
+
+#number of rows used for guessing the data type of columns
+TYPE_SAMPLE_SIZE = 999
+
+#files with at least this many columns have their data types guessed in 
+#parallel
+PARALLEL_TYPE_GUESS_COLUMNS = 1000
+
+#maximum amount of memory (in bytes) used for the data of lazily loaded 
+#columns (LazyColumnData) of a file - the least recently used columns are 
+#released once this is exceeded
+COLUMN_MEMORY_BUDGET = 512 * 1024**2
 
 class InvalidDataTypeError(TypeError):
     pass
 
+
+class LoadCancelledError(Exception):
+    """
+    Raised by progress callbacks (see load_file()) to cancel loading a file.
+    """
+    pass
+
+
 def register_loader(loader_instance):
+    """
+    Registers a loader (a FileLoaderBase instance) for use by load_file().
+    The loader is indexed by its extensions and magic_numbers attributes.
+    """
+    by_priority = lambda loaders: loaders.sort(key=lambda l: -l.priority)
+    
     __available_loaders.append(loader_instance)
+    by_priority(__available_loaders)
+    
+    for ext in loader_instance.extensions:
+        loaders = __loaders_by_extension.setdefault(ext.lower(), [])
+        loaders.append(loader_instance)
+        by_priority(loaders)
+    
+    for magic_number in loader_instance.magic_numbers:
+        loaders = __loaders_by_magic.setdefault(magic_number, [])
+        loaders.append(loader_instance)
+        by_priority(loaders)
+        __magic_number_lengths.add(len(magic_number))
+    
+    #a new loader may be a better choice for files that have already been 
+    #opened
+    __chosen_loaders.clear()
+
+
+def unregister_loader(loader_instance):
+    """
+    Removes a loader that was registered using register_loader().
+    """
+    __available_loaders.remove(loader_instance)
+    for loaders in (__loaders_by_extension.values() + 
+                    __loaders_by_magic.values()):
+        if loader_instance in loaders:
+            loaders.remove(loader_instance)
+    
+    #files may have been opened using the loader
+    __chosen_loaders.clear()
+
+
+def can_start_workers():
+    """
+    Returns True if it is safe to start multiprocessing worker processes from
+    the current process. Python 2's multiprocessing forks its workers on 
+    POSIX systems (there is no 'spawn' start method), so they inherit the 
+    state of the parent process, including any locks held by its other 
+    threads, which may never be released in the workers. Forking is therefore
+    only done if the calling thread is the only one running (so never from 
+    the GUI while files are loading in the background), and never on Mac OS
+    X, where the system frameworks used by the GUI cannot be used after a 
+    fork. On Windows, workers are started by running the program again (see
+    multiprocessing.freeze_support() in AvoPlot.py) rather than by forking.
+    """
+    if sys.platform == 'win32':
+        return True
+    if sys.platform == 'darwin':
+        return False
+    return threading.active_count() == 1
+
+
+def map_file(ifp):
+    """
+    Returns a read-only memory map of the open file object ifp. Empty files
+    cannot be mapped, in which case an empty string is returned instead. 
+    Either way, the returned object supports slicing, find() and len().
+    """
+    try:
+        return mmap.mmap(ifp.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        #mmap raises ValueError for empty files
+        return ''
+
+
+def get_file_signature(filename):
+    """
+    Returns a (path, size, modification time) tuple identifying the current
+    version of the file, or None if the file cannot be stat'ed. Used as a key
+    for caching results relating to the file.
+    """
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return (os.path.abspath(filename), stat.st_size, stat.st_mtime)
+
+
+def _get_cache_key(filename, buf):
+    #returns the key used for storing the contents of the file in the data 
+    #cache, or None if the file cannot be cached
+    signature = get_file_signature(filename)
+    if signature is None:
+        return None
+    cache_key = (_CACHE_NAMESPACE, _CACHE_FORMAT_VERSION) + signature
+    return cache_key + (data_cache.get_sample_hash(buf),)
+
+
+def get_candidate_loaders(filename, head):
+    """
+    Returns a list of the registered loaders whose magic numbers match the 
+    start of the file contents (head) or whose extensions match the filename,
+    highest priority first. Magic number matches are preferred over extension 
+    matches of the same priority.
+    """
+    candidates = []
+    for length in __magic_number_lengths:
+        candidates.extend(__loaders_by_magic.get(head[:length], []))
+    
+    ext = os.path.splitext(filename)[1].lower()
+    candidates.extend(__loaders_by_extension.get(ext, []))
+    
+    unique_candidates = []
+    for l in candidates:
+        if l not in unique_candidates:
+            unique_candidates.append(l)
+    unique_candidates.sort(key=lambda l: -l.priority)
+    return unique_candidates
+
+
+def _find_loader(filename, buf):
+    #returns the loader to use for the file. The loader that was used last 
+    #time the file was opened is reused if the file has not changed. 
+    #Otherwise loaders that match the extension or magic number of the file 
+    #are tested first, and then all the others. Loaders are only ever tested 
+    #on samples from the start and end of the file, so that the time taken 
+    #does not depend on the size of the file. buf may also be just the start 
+    #of the file (e.g. of the decompressed contents of a compressed file), 
+    #in which case there is no tail sample.
+    path = os.path.abspath(filename)
+    signature = get_file_signature(filename)
+    
+    previous_signature, previous_loader = __chosen_loaders.get(path, 
+                                                               (None, None))
+    if signature is not None and signature == previous_signature:
+        return previous_loader
+    
+    head = buf[:DISPATCH_HEADER_SIZE]
+    if len(buf) > DISPATCH_HEADER_SIZE:
+        tail = buf[-DISPATCH_TAIL_SIZE:]
+    else:
+        tail = ''
+    
+    candidates = get_candidate_loaders(filename, head)
+    if previous_loader is not None:
+        candidates.insert(0, previous_loader)
+    others = (l for l in __available_loaders if l not in candidates)
+    
+    for loader in itertools.chain(candidates, others):
+        if loader.test_samples(filename, head, tail):
+            __chosen_loaders[path] = (signature, loader)
+            return loader
+    raise IOError('Cannot load the file %s'%filename)
 
 
-def load_file(filename):
+def load_file(filename, use_cache=True, progress=None):
+    """
+    Loads the file using the first registered loader that can handle it and
+    returns a FileContents object. If use_cache is True, then the parsed 
+    contents of the file are stored in the data cache, and if the same file is 
+    opened again (and has not changed) they are loaded from the cache instead 
+    of being parsed again.
+    
+    Compressed (gzip, bzip2 or xz) files are decompressed as they are read, 
+    provided that the loader for the decompressed contents supports streaming
+    (see load_file_streaming()).
+    
+    If progress is not None, it is called periodically by the loader as 
+    progress(n_bytes, n_rows) with the number of bytes of the file and rows 
+    of data that have been processed so far. It may raise LoadCancelledError
+    to stop loading the file, in which case the exception is raised by 
+    load_file().
+    """
+    import binary_file_loader
     import txt_file_loader
     
     with open(filename,'rb') as ifp:
-        s = ifp.read()
-    ifp = StringIO.StringIO(s)
-    flag=False
-    for loader in __available_loaders:
-        
-        flag = loader.test(filename, ifp)
-        if flag:
-            break
-    if flag:
-        return loader.load(filename, ifp)
-    raise IOError('Cannot load the file %s'%filename)
+        buf = map_file(ifp)
+    
+    try:
+        cache_key = None
+        if use_cache:
+            cache_key = _get_cache_key(filename, buf)
+        if cache_key is not None:
+            try:
+                contents = load_from_cache(filename, cache_key)
+                contents.n_bytes = len(buf)
+                return contents
+            except KeyError:
+                pass
+        
+        compression = decompress.get_compression(buf[:decompress.MAGIC_SIZE])
+        if compression is not None:
+            contents = _open_compressed(filename, compression, cache_key, 
+                                        DEFAULT_CHUNK_ROWS, 
+                                        arrays.DEFAULT_SPILL_SIZE)
+            contents.load_all(progress)
+            return contents
+        
+        return _load(filename, buf, _find_loader(filename, buf), cache_key, 
+                     progress)
+    finally:
+        if isinstance(buf, mmap.mmap):
+            buf.close()
+
+
+def _load(filename, buf, loader, cache_key, progress):
+    #loads the file all at once and stores the contents in the data cache (if
+    #appropriate)
+    contents = loader.load(filename, buf, progress=progress)
+    contents.n_bytes = len(buf)
+    if cache_key is not None and loader.cache_results:
+        save_to_cache(cache_key, contents)
+    return contents
+
+
+def _open_compressed(filename, compression, cache_key, chunk_rows, spill_size):
+    #returns a StreamingFileContents object for reading the compressed file. 
+    #The loader is chosen based on the start of the decompressed contents and 
+    #the filename without the compression extension.
+    with decompress.DecompressedFile(filename, compression) as ifp:
+        head = ifp.read(DISPATCH_HEADER_SIZE)
+    loader = _find_loader(decompress.strip_extension(filename, compression), 
+                          head)
+    if not loader.supports_streaming:
+        raise IOError("Cannot load %s. Files of this type cannot be read "
+                      "from %s compressed files"%(filename, compression))
+    
+    ifp = decompress.DecompressedFile(filename, compression)
+    try:
+        reader = loader.open_stream(filename, ifp)
+        return StreamingFileContents(filename, reader, chunk_rows=chunk_rows, 
+                                     cache_key=cache_key, spill_size=spill_size)
+    except:
+        ifp.close()
+        raise
+
+
+def load_file_streaming(filename, chunk_rows=DEFAULT_CHUNK_ROWS, use_cache=True,
+                        spill_size=arrays.DEFAULT_SPILL_SIZE, progress=None):
+    """
+    Opens the file for reading in chunks of chunk_rows rows, and returns a
+    StreamingFileContents object with the first chunk loaded. The rest of the
+    file can then be loaded using its load_next_chunk() method. Column data is
+    moved to temporary files once it exceeds spill_size bytes per array, so
+    that files larger than the available memory can be loaded. Note that 
+    every column is split out of the file as it is read, unlike the 
+    LazyColumnData objects returned by load_file().
+    
+    If the contents of the file are already in the data cache, or the file 
+    cannot be read in chunks, then they are returned as a (complete) 
+    FileContents object instead. Otherwise, they are added to the cache once 
+    loading is complete. The progress argument is as for load_file(), and is
+    only used for files which cannot be read in chunks. Compressed files are
+    decompressed as they are read, as for load_file().
+    """
+    import binary_file_loader
+    import txt_file_loader
+    
+    ifp = open(filename,'rb')
+    try:
+        buf = map_file(ifp)
+        try:
+            cache_key = None
+            if use_cache:
+                cache_key = _get_cache_key(filename, buf)
+            if cache_key is not None:
+                try:
+                    contents = load_from_cache(filename, cache_key)
+                    contents.n_bytes = len(buf)
+                    ifp.close()
+                    return contents
+                except KeyError:
+                    pass
+            
+            compression = decompress.get_compression(
+                                                buf[:decompress.MAGIC_SIZE])
+            if compression is not None:
+                ifp.close()
+                return _open_compressed(filename, compression, cache_key, 
+                                        chunk_rows, spill_size)
+            
+            loader = _find_loader(filename, buf)
+            if not loader.supports_streaming:
+                ifp.close()
+                return _load(filename, buf, loader, cache_key, progress)
+        finally:
+            if isinstance(buf, mmap.mmap):
+                buf.close()
+        
+        reader = loader.open_stream(filename, ifp)
+        return StreamingFileContents(filename, reader, chunk_rows=chunk_rows, 
+                                     cache_key=cache_key, spill_size=spill_size)
+    except:
+        ifp.close()
+        raise
+
+
+def _encode(s):
+    #JSON can only store unicode, but the file contents may not be valid utf-8
+    if s is None:
+        return None
+    return s.decode('latin-1')
+
+
+def _decode(s):
+    if s is None:
+        return None
+    return s.encode('latin-1')
+
+
+def save_to_cache(key, contents):
+    """
+    Stores the FileContents object in the data cache under the specified key.
+    The raw data of each column is stored, along with the converted data for 
+    numerical and time columns.
+    """
+    metadata, cache_arrays = _get_cache_entry(contents)
+    data_cache.DataCache().put(key, metadata, cache_arrays)
+
+
+def _get_cache_entry(contents):
+    #returns a tuple of (metadata, arrays) of the FileContents object for 
+    #storing in the data cache (see save_to_cache())
+    cache_arrays = {}
+    columns = []
+    for i, c in enumerate(contents.get_columns()):
+        d_type = c.get_data_type()
+        columns.append({'title':_encode(c.title), 'd_type':d_type})
+        if isinstance(c.raw_data, arrays.TokenColumn):
+            cache_arrays['chars_%d'%i] = c.raw_data.chars
+            cache_arrays['offsets_%d'%i] = c.raw_data.offsets
+        else:
+            cache_arrays['raw_%d'%i] = numpy.asarray(c.raw_data)
+        if d_type in ('number', 'time'):
+            data = c.get_data()
+            cache_arrays['values_%d'%i] = data.data
+            cache_arrays['mask_%d'%i] = numpy.ma.getmaskarray(data)
+    
+    metadata = {'header':_encode(contents.header), 
+                'footer':_encode(contents.footer),
+                'comment_symbols':[_encode(s) for s in contents.comment_symbols],
+                'skipped_rows':[(i, _encode(l)) for i,l in contents.skipped_rows],
+                'columns':columns}
+    
+    return metadata, cache_arrays
+
+
+def load_from_cache(filename, key):
+    """
+    Returns a FileContents object built from the data cache entry with the
+    specified key. The column data is memory-mapped from the cache files. 
+    Raises KeyError if the entry does not exist.
+    """
+    metadata, cache_arrays = data_cache.DataCache().get(key)
+    
+    columns = []
+    for i, c in enumerate(metadata['columns']):
+        if cache_arrays.has_key('chars_%d'%i):
+            raw_data = arrays.TokenColumn(cache_arrays['chars_%d'%i], 
+                                          cache_arrays['offsets_%d'%i])
+        else:
+            raw_data = cache_arrays['raw_%d'%i]
+        col = ColumnData(raw_data, title=_decode(c['title']))
+        col.d_type = c['d_type']
+        if col.d_type in ('number', 'time'):
+            col.data = numpy.ma.masked_array(cache_arrays['values_%d'%i], 
+                                             mask=cache_arrays['mask_%d'%i])
+        columns.append(col)
+    
+    return FileContents(filename, columns, 
+                        header=_decode(metadata['header']), 
+                        comment_symbols=[_decode(s) for s in metadata['comment_symbols']], 
+                        skipped_rows=[(i, _decode(l)) for i,l in metadata['skipped_rows']], 
+                        footer=_decode(metadata['footer']))
+
+
+def get_sample_indices(n_rows, sample_size=TYPE_SAMPLE_SIZE):
+    """
+    Returns a sorted array of the indices of the rows used as a sample of 
+    (at most) sample_size rows from n_rows. The sample is made up of rows from 
+    the start, end and (randomly chosen) from the middle.
+    """
+    if n_rows <= sample_size:
+        return numpy.arange(n_rows)
+    
+    n = sample_size // 3
+    interior = numpy.random.RandomState(0).randint(n, n_rows - n, 
+                                                   sample_size - 2*n)
+    return numpy.concatenate((numpy.arange(n), numpy.sort(interior), 
+                              numpy.arange(n_rows - n, n_rows)))
+
+
+def get_sample(data, sample_size=TYPE_SAMPLE_SIZE):
+    """
+    Returns a sample of sample_size items from the sequence data, as chosen by
+    get_sample_indices().
+    """
+    if len(data) <= sample_size:
+        return data
+    
+    idxs = get_sample_indices(len(data), sample_size)
+    if hasattr(data, 'take'):
+        return data.take(idxs)
+    return [data[i] for i in idxs]
 
 
 class FileLoaderBase:
+    """
+    Base class for file loaders. The test() method is passed the name of the 
+    file and a string of (at most) the first DISPATCH_HEADER_SIZE bytes of its
+    contents. Loaders which also need to inspect the end of the file should
+    override test_samples() instead. The load() method is passed the name of 
+    the file and a read-only buffer (normally a mmap.mmap object) containing 
+    its contents. Loaders should avoid copying the whole buffer, and must not
+    keep references to it after load() has returned since it is closed by 
+    load_file(). Loaders which take a long time should report their progress
+    using the progress argument of load() if it is not None (see 
+    load_file()).
     
-    def test(self, filename, ifp):
+    Loaders that can read files in chunks should also implement open_stream()
+    and set supports_streaming to True. Loaders for which loading is already
+    quick (for example because the data is memory-mapped from the file) 
+    should set cache_results to False.
+    """
+    supports_streaming = False
+    cache_results = True
+    
+    #file extensions (e.g. '.txt') and magic numbers (strings that the file 
+    #contents start with) used to decide which loaders to try first when 
+    #opening a file. If more than one loader matches, then the one with the
+    #highest priority is tried first.
+    extensions = ()
+    magic_numbers = ()
+    priority = 0
+    
+    def test(self, filename, buf):
         return False
     
-    def load(self,filename, ifp):
+    def test_samples(self, filename, head, tail):
+        """
+        Returns True if the loader can load the file. head is a string of (at
+        most) the first DISPATCH_HEADER_SIZE bytes of the file, and tail is a 
+        string of (at most) the last DISPATCH_TAIL_SIZE bytes of it, or '' if
+        head contains the whole file (or the end of the file is not known). 
+        By default this just calls test() with head.
+        """
+        return self.test(filename, head)
+    
+    def load(self,filename, buf, progress=None):
+        raise NotImplementedError
+    
+    def open_stream(self, filename, ifp):
+        """
+        Should return a FileStreamReaderBase instance for reading the file 
+        from the open file object ifp. 
+        """
         raise NotImplementedError
 
 
+class FileStreamReaderBase:
+    """
+    Base class for objects that read the contents of a file in chunks. The 
+    header, comment_symbols and titles attributes should be set once the 
+    reader has been created. The skipped_rows list may grow as the file is 
+    read, and the footer is only known once the end of the file is reached.
+    """
+    def __init__(self, ifp):
+        self.ifp = ifp
+        self.header = None
+        self.comment_symbols = []
+        self.titles = []
+        self.skipped_rows = []
+        self.footer = None
+    
+    
+    def read_chunk(self, n_rows):
+        """
+        Should return a list containing a sequence of (at most n_rows) string 
+        tokens for each column in the file, or None if the end of the file has
+        been reached.
+        """
+        raise NotImplementedError
+    
+    
+    def get_bytes_read(self):
+        """
+        Returns the number of bytes of the file that have been read so far.
+        """
+        return self.ifp.tell()
+    
+    
+    def close(self):
+        self.ifp.close()
+
+
 class FileContents:
     def __init__(self, filename, columns, header=None, comment_symbols=[], skipped_rows=[], footer=None):
         self.filename = filename
@@ -62,6 +580,11 @@ class FileContents:
         self.comment_symbols = comment_symbols
         self.skipped_rows = skipped_rows
         self.footer = footer
+        
+        #number of bytes of the file that were loaded (set by load_file() once
+        #the whole file has been loaded), e.g. for following files that are
+        #still being written to
+        self.n_bytes = None
            
         #build mapping between column names and indices
         self.__col_name_mapping = {}
@@ -103,6 +626,47 @@ class FileContents:
         return self.__columns
     
     
+    def close(self):
+        """
+        Releases any files that the columns are being read from. Columns that 
+        are read from the file on demand will open it again if they need to.
+        """
+        for c in self.__columns:
+            c.close()
+    
+    
+    def guess_data_types(self):
+        """
+        Guesses the data types of all the columns whose type is not yet known.
+        For files with lots of columns, the work is shared between several 
+        processes (if they can be started safely, see can_start_workers()).
+        """
+        columns = [c for c in self.__columns if c.d_type is None]
+        samples = [c.get_type_sample() for c in columns]
+        
+        d_types = None
+        if (len(columns) >= PARALLEL_TYPE_GUESS_COLUMNS and 
+            multiprocessing.cpu_count() > 1 and can_start_workers()):
+            try:
+                pool = multiprocessing.Pool()
+                try:
+                    #numpy arrays are much quicker to send to the workers than
+                    #lists of strings
+                    samples = [numpy.asarray(s) for s in samples]
+                    d_types = pool.map(guess_data_type, samples)
+                finally:
+                    pool.terminate()
+            except Exception, e:
+                warnings.warn("Failed to guess column data types in parallel. "
+                              "Error was: %s"%e.args)
+        
+        if d_types is None:
+            d_types = [guess_data_type(s) for s in samples]
+        
+        for c, d_type in zip(columns, d_types):
+            c.set_guessed_data_type(d_type)
+    
+    
     def print_summary(self):
         print "\n\n----------------------------------------"
         print "Comment symbols = %s"%self.comment_symbols
@@ -121,6 +685,7 @@ class ColumnData:
         self.d_type = None
         self.data = None
         self.title = title
+        self.__type_is_guessed = False
     
     def get_data_mask(self):
         return self.get_data().mask
@@ -130,37 +695,44 @@ class ColumnData:
         return len(self.raw_data)
     
     
+    def close(self):
+        """
+        Releases any file that the column is being read from. The raw data of 
+        a ColumnData is always in memory, so there is nothing to do.
+        """
+        pass
+    
+    
+    def get_type_sample(self):
+        """
+        Returns a sample of the raw data for guessing the data type of the 
+        column.
+        """
+        return get_sample(self.raw_data)
+    
+    
+    def get_raw_values(self, start, stop):
+        """
+        Returns a list of the raw values of rows start to stop - 1 as strings
+        (for displaying them).
+        """
+        return [str(v) for v in self.raw_data[start:stop]]
+    
+    
+    def set_guessed_data_type(self, dtype):
+        """
+        Sets the data type of the column to a value guessed from a sample of 
+        the data. The guess is checked when the data is converted.
+        """
+        self.d_type = dtype
+        self.__type_is_guessed = True
+    
+    
     def get_data_type(self):
         if self.d_type is not None:
             return self.d_type
         
-        #first see if it is a float
-        is_float = 0
-        not_float = 0
-        for x in self.raw_data:
-            try:
-                float(x)
-                is_float += 1
-            except ValueError:
-                not_float += 1
-        
-        if is_float > not_float:
-            self.d_type = 'number'
-            return self.d_type
-        
-        self.d_type ='text'
-        
-#        is_time = 0
-#        not_time = 0
-#        for x in self.raw_data:
-#            try:
-#                datetime.datetime.strptime(x,"%H:%M:%S")
-#                is_time += 1
-#            except ValueError:
-#                not_time += 1
-#        if is_time > not_time:
-#            self.d_type = 'time'
-        
+        self.set_guessed_data_type(guess_data_type(self.get_type_sample()))
         return self.d_type
     
     
@@ -168,6 +740,7 @@ class ColumnData:
         old_dtype = self.d_type
         self.data = None #force re-interpretation of the data
         self.d_type = dtype
+        self.__type_is_guessed = False
         d = self.get_data()
         if len(d) > 0 and numpy.all(d.mask):
             self.d_type = old_dtype
@@ -181,26 +754,1003 @@ class ColumnData:
             return self.data
         
         self.data = _converters[self.get_data_type()](self.raw_data)
+        self.check_data_type()
+        return self.data
+    
+    
+    def convert(self, tokens):
+        """
+        Returns a masked array of the string tokens (e.g. new rows appended to 
+        the file) converted to the data type of the column.
+        """
+        return _converters[self.get_data_type()](tokens)
+    
+    
+    def check_data_type(self):
+        """
+        If the data type of the column was guessed to be 'number' or 'time' 
+        from a sample of the data, then checks that the majority of the 
+        (converted) data really are numbers or times. If they are not, then the
+        data type is changed to 'text'.
+        """
+        if not self.__type_is_guessed or self.d_type == 'text':
+            return
+        self.__type_is_guessed = False
+        
+        n_invalid = numpy.count_nonzero(numpy.ma.getmaskarray(self.data))
+        if 2 * n_invalid < len(self.data):
+            return
+        
+        if self.d_type == 'time':
+            self.d_type = 'text'
+            self.data = None
+            self.get_data()
+            return
+        
+        #masked values may be nan or inf rather than text. Text is converted
+        #to nan, so only the tokens of masked nan values need checking.
+        mask = numpy.ma.getmaskarray(self.data)
+        values = self.data.data
+        n_inf = numpy.count_nonzero(numpy.isinf(values[mask]))
+        nan_idxs = numpy.flatnonzero(numpy.logical_and(mask, 
+                                                       numpy.isnan(values)))
+        n_nan = _count_nan_tokens(self.raw_data, nan_idxs)
+        if 2 * (n_invalid - n_inf - n_nan) >= len(self.data):
+            #the majority of the data is not numerical
+            self.d_type = 'text'
+            self.data = None
+            self.get_data()
+
+
+class LazyColumnData(ColumnData):
+    """
+    ColumnData object whose raw data is only read from the file the first time
+    that it is needed, using source.read_column(idx). Guessing the data type 
+    of the column only requires a sample of the data, which is read using 
+    source.read_sample(idx), and displaying a range of rows only requires 
+    those rows, which are read using source.read_rows(idx, start, stop).
+    
+    The memory used by the column is tracked by budget (a ColumnMemoryBudget 
+    object shared by all the columns of the file), which may release the data
+    when it is not being used. It is then read from the file again if it is 
+    needed.
+    """
+    def __init__(self, source, idx, n_rows, budget, title=''):
+        ColumnData.__init__(self, None, title)
+        
+        #raw_data is a property of this class, so remove the attribute set by
+        #ColumnData.__init__
+        del self.raw_data
+        
+        self.__source = source
+        self.__idx = idx
+        self.__n_rows = n_rows
+        self.__budget = budget
+        self.__raw_data = None
+    
+    
+    def __get_raw_data(self):
+        if self.__raw_data is None:
+            self.__raw_data = self.__source.read_column(self.__idx)
+        self.__budget.touch(self)
+        return self.__raw_data
+    
+    raw_data = property(__get_raw_data)
+    
+    
+    def is_loaded(self):
+        """
+        Returns True if the raw data of the column is currently in memory.
+        """
+        return self.__raw_data is not None
+    
+    
+    def get_number_of_rows(self):
+        return self.__n_rows
+    
+    
+    def get_type_sample(self):
+        if self.__raw_data is not None:
+            #no need to read the file again (which may have been closed)
+            return ColumnData.get_type_sample(self)
+        return self.__source.read_sample(self.__idx)
+    
+    
+    def get_raw_values(self, start, stop):
+        #avoid reading the whole column just to display part of it
+        if self.__raw_data is not None:
+            return ColumnData.get_raw_values(self, start, stop)
+        return self.__source.read_rows(self.__idx, start, stop)
+    
+    
+    def get_data(self):
+        data = ColumnData.get_data(self)
+        self.__budget.touch(self)
+        return data
+    
+    
+    def get_memory_size(self):
+        """
+        Returns the number of bytes of memory used by the raw and converted 
+        data of the column.
+        """
+        size = 0
+        if self.__raw_data is not None:
+            size += self.__raw_data.nbytes
+        if self.data is not None:
+            size += self.data.nbytes + self.data.mask.nbytes
+        return size
+    
+    
+    def release(self):
+        """
+        Frees the raw and converted data of the column. They are read from the 
+        file again if they are needed.
+        """
+        self.__raw_data = None
+        self.data = None
+    
+    
+    def close(self):
+        self.__source.close()
+
+
+
+class ColumnMemoryBudget:
+    """
+    Keeps track of the memory used by a set of LazyColumnData objects. If 
+    the total is more than max_size bytes (COLUMN_MEMORY_BUDGET by default) 
+    then the data of the least recently used columns is released.
+    """
+    def __init__(self, max_size=None):
+        if max_size is None:
+            max_size = COLUMN_MEMORY_BUDGET
+        self.max_size = max_size
+        self.__sizes = collections.OrderedDict() #least recently used first
+        self.__total_size = 0
+    
+    
+    def get_size(self):
+        """
+        Returns the memory (in bytes) currently used by the columns.
+        """
+        return self.__total_size
+    
+    
+    def touch(self, column):
+        """
+        Records that column has just been used and updates its size. The 
+        column that was used is never released.
+        """
+        size = column.get_memory_size()
+        self.__total_size += size - self.__sizes.pop(column, 0)
+        self.__sizes[column] = size
+        
+        while self.__total_size > self.max_size and len(self.__sizes) > 1:
+            oldest, oldest_size = self.__sizes.popitem(last=False)
+            oldest.release()
+            self.__total_size -= oldest_size
+
+
+
+class StreamingFileContents(FileContents):
+    """
+    FileContents object for files which are being read in chunks. The columns 
+    contain only the data that has been read so far, and grow each time that 
+    load_next_chunk() is called.
+    """
+    def __init__(self, filename, reader, chunk_rows=DEFAULT_CHUNK_ROWS, 
+                 cache_key=None, spill_size=arrays.DEFAULT_SPILL_SIZE):
+        self.__reader = reader
+        self.__chunk_rows = chunk_rows
+        self.__cache_key = cache_key
+        self.__cache_entry = None
+        self.__complete = False
+        
+        columns = [StreamingColumnData(t, spill_size) for t in reader.titles]
+        FileContents.__init__(self, filename, columns, header=reader.header, 
+                              comment_symbols=reader.comment_symbols, 
+                              skipped_rows=reader.skipped_rows)
+        
+        #load the first chunk so that there is something to look at, and use 
+        #it to decide the data type of each column. Converting it checks the 
+        #guessed types, after which the rest of the chunks can be converted
+        #as they are read (see convert_chunk()).
+        self.load_next_chunk()
+        self.guess_data_types()
+        for col in columns:
+            col.get_data()
+    
+    
+    def is_complete(self):
+        """
+        Returns True if the whole file has been loaded.
+        """
+        return self.__complete
+    
+    
+    def load_next_chunk(self):
+        """
+        Loads the next chunk of rows from the file. Returns the number of rows
+        loaded (zero once the end of the file has been reached).
+        """
+        if self.__complete:
+            return 0
+        n_rows = self.add_chunk(self.read_next_chunk())
+        self.save_to_cache()
+        return n_rows
+    
+    
+    def read_next_chunk(self):
+        """
+        Reads the next chunk of rows from the file without adding it to the 
+        columns, and returns it for passing to add_chunk(). Since it does not 
+        change the contents, this may be called from a different thread to 
+        the one that is using them (as long as only one thread at a time 
+        reads chunks). 
+        """
+        return self.__reader.read_chunk(self.__chunk_rows)
+    
+    
+    def convert_chunk(self, chunk):
+        """
+        Converts a chunk of rows returned by read_next_chunk() to the data 
+        types of the columns, and returns the converted data for passing to 
+        add_chunk() (see StreamingColumnData.convert_chunk()). Like 
+        read_next_chunk(), this may be called from a different thread to the 
+        one that is using the contents.
+        """
+        if chunk is None:
+            return None
+        return [col.convert_chunk(tokens) 
+                for col, tokens in zip(self.get_columns(), chunk)]
+    
+    
+    def add_chunk(self, chunk, converted=None):
+        """
+        Adds a chunk of rows returned by read_next_chunk() to the columns, 
+        using the converted data returned by convert_chunk() if it is given.
+        Returns the number of rows added. Once the last chunk has been added,
+        the contents can be stored in the data cache (see save_to_cache()).
+        """
+        if chunk is None:
+            self.__complete = True
+            self.skipped_rows = self.__reader.skipped_rows
+            self.footer = self.__reader.footer
+            self.n_bytes = self.__reader.get_bytes_read()
+            self.__reader.close()
+            if self.__cache_key is not None:
+                self.__cache_entry = _get_cache_entry(self)
+            return 0
+        
+        if converted is None:
+            converted = [None] * len(chunk)
+        for col, tokens, data in zip(self.get_columns(), chunk, converted):
+            col.append(tokens, data)
+        return len(chunk[0])
+    
+    
+    def save_to_cache(self):
+        """
+        Stores the contents in the data cache if the whole file has been added
+        to them (and they are to be cached). What is stored is the data that 
+        the columns held when the last chunk was added, so this may be called
+        from a different thread to the one that is using the contents.
+        """
+        cache_entry, self.__cache_entry = self.__cache_entry, None
+        if cache_entry is not None:
+            data_cache.DataCache().put(self.__cache_key, *cache_entry)
+    
+    
+    def get_bytes_read(self):
+        """
+        Returns the number of bytes of the file that have been read so far.
+        """
+        return self.__reader.get_bytes_read()
+    
+    
+    def close(self):
+        """
+        Stops loading the file, leaving the contents incomplete.
+        """
+        self.__reader.close()
+        FileContents.close(self)
+    
+    
+    def load_all(self, progress=None):
+        """
+        Loads the remainder of the file. The progress argument is as for 
+        load_file().
+        """
+        try:
+            while self.load_next_chunk():
+                if progress is not None:
+                    progress(self.get_bytes_read(), self.get_number_of_rows())
+        except LoadCancelledError:
+            self.close()
+            raise
+            
+            
+
+class BackgroundLoader(threading.Thread):
+    """
+    Loads a file in a separate thread, so that the thread which started 
+    loading it (e.g. the GUI) remains responsive. The contents are returned by 
+    get_contents() as soon as they are available. If streaming is True, then 
+    these are the contents returned by load_file_streaming() (i.e. only the 
+    first chunk of a large text file), and the rest of the chunks are read in 
+    the background. Otherwise, they are the contents returned by load_file().
+    
+    The contents are only ever modified by the thread using them - chunks 
+    that have been read (and converted) in the background are only added to 
+    the contents when add_pending_chunks() is called. At most 
+    max_pending_chunks chunks are read ahead of this. Once the last chunk has
+    been added, the contents are stored in the data cache in the background.
+    
+    The progress of the load can be monitored using get_progress(), and it 
+    can be stopped using cancel().
+    """
+    def __init__(self, filename, streaming=False, use_cache=True, 
+                 chunk_rows=DEFAULT_CHUNK_ROWS, max_pending_chunks=4):
+        threading.Thread.__init__(self, name="Loading %s"%filename)
+        
+        #don't stop the program from exiting
+        self.daemon = True
+        
+        self.filename = filename
+        self.file_size = os.path.getsize(filename)
+        self.__streaming = streaming
+        self.__use_cache = use_cache
+        self.__chunk_rows = chunk_rows
+        self.__contents = None
+        self.__error = None
+        self.__progress = (0, 0)
+        self.__complete = False
+        self.__ready = threading.Event()
+        self.__cancelled = threading.Event()
+        self.__all_added = threading.Event()
+        self.__chunks = Queue.Queue(max_pending_chunks)
+    
+    
+    def run(self):
+        try:
+            if self.__streaming:
+                contents = load_file_streaming(self.filename, 
+                                               chunk_rows=self.__chunk_rows,
+                                               use_cache=self.__use_cache, 
+                                               progress=self.__on_progress)
+            else:
+                contents = load_file(self.filename, use_cache=self.__use_cache,
+                                     progress=self.__on_progress)
+            
+            if (not isinstance(contents, StreamingFileContents) or 
+                contents.is_complete()):
+                self.__progress = (self.file_size, 
+                                   contents.get_number_of_rows())
+                self.__complete = True
+                self.__contents = contents
+                self.__ready.set()
+                return
+            
+            self.__progress = (contents.get_bytes_read(), 
+                               contents.get_number_of_rows())
+            self.__contents = contents
+            self.__ready.set()
+            
+            n_rows = contents.get_number_of_rows()
+            try:
+                while True:
+                    chunk = contents.read_next_chunk()
+                    self.__put_chunk((chunk, contents.convert_chunk(chunk)))
+                    if chunk is None:
+                        break
+                    n_rows += len(chunk[0])
+                    self.__on_progress(contents.get_bytes_read(), n_rows)
+                
+                #the contents can only be cached once the thread using them
+                #has added all the chunks
+                while not self.__all_added.wait(0.1):
+                    if self.__cancelled.is_set():
+                        raise LoadCancelledError("Loading %s was "
+                                                 "cancelled"%self.filename)
+                contents.save_to_cache()
+            except LoadCancelledError:
+                contents.close()
+                raise
+        
+        except Exception, e:
+            self.__error = e
+        
+        finally:
+            self.__ready.set()
+    
+    
+    def __on_progress(self, n_bytes, n_rows):
+        self.__progress = (n_bytes, n_rows)
+        if self.__cancelled.is_set():
+            raise LoadCancelledError("Loading %s was cancelled"%self.filename)
+    
+    
+    def __put_chunk(self, chunk):
+        #waits until there is space in the queue for the chunk (or the load is
+        #cancelled)
+        while True:
+            if self.__cancelled.is_set():
+                raise LoadCancelledError("Loading %s was cancelled"%self.filename)
+            try:
+                self.__chunks.put(chunk, timeout=0.1)
+                return
+            except Queue.Full:
+                pass
+    
+    
+    def cancel(self):
+        """
+        Stops loading the file. Contents that have already been returned are
+        left incomplete.
+        """
+        self.__cancelled.set()
+    
+    
+    def is_cancelled(self):
+        return self.__cancelled.is_set()
+    
+    
+    def wait(self, timeout=None):
+        """
+        Waits (for at most timeout seconds) until the contents are available
+        or loading has failed. Returns True if it has finished waiting.
+        """
+        self.__ready.wait(timeout)
+        return self.__ready.is_set()
+    
+    
+    def get_contents(self):
+        """
+        Returns the contents of the file, or None if they are not available 
+        yet. If loading the file failed (or was cancelled) before the contents 
+        were available, then the exception is raised here instead.
+        """
+        if self.__contents is None and self.__error is not None:
+            raise self.__error
+        return self.__contents
+    
+    
+    def get_error(self):
+        """
+        Returns the exception which stopped the file from loading, or None.
+        """
+        return self.__error
+    
+    
+    def get_progress(self):
+        """
+        Returns a tuple of (n_bytes, n_rows) of the number of bytes of the file
+        and rows of data that have been read so far.
+        """
+        return self.__progress
+    
+    
+    def is_complete(self):
+        """
+        Returns True if the whole file has been loaded and added to the 
+        contents.
+        """
+        return self.__complete
+    
+    
+    def add_pending_chunks(self):
+        """
+        Adds any chunks which have been read since the last call to the 
+        contents. This must be called from the thread which is using the 
+        contents. Returns the number of rows added.
+        """
+        n_rows = 0
+        while not self.__complete:
+            try:
+                chunk, converted = self.__chunks.get_nowait()
+            except Queue.Empty:
+                break
+            n_rows += self.__contents.add_chunk(chunk, converted)
+            self.__complete = chunk is None
+        
+        if self.__complete:
+            self.__all_added.set()
+        return n_rows
+
+
+
+class StreamingColumnData(ColumnData):
+    """
+    ColumnData object that can be appended to. The raw and converted data are
+    stored in arrays.TokenColumnBuilder and arrays.GrowableArray objects so 
+    that they are moved to disk if they get too large. The converted data of
+    'number' and 'time' columns is kept up to date as the column is appended 
+    to, rather than the whole column being converted again.
+    """
+    def __init__(self, title='', spill_size=arrays.DEFAULT_SPILL_SIZE):
+        self.__spill_size = spill_size
+        self.__raw = arrays.TokenColumnBuilder(spill_size)
+        self.__values = None
+        self.__mask = None
+        
+        #(data type, time format) that the converted data was created with, 
+        #or None if it is not kept up to date
+        self.__conversion = None
+        ColumnData.__init__(self, self.__raw.get_column(), title)
+    
+    
+    def convert_chunk(self, tokens):
+        """
+        Returns the converted data of the sequence of string tokens for passing
+        to append(), or None if the converted data of the column is not kept 
+        up to date as it is appended to. This does not change the column, so 
+        it may be called from a different thread to the one that is using it.
+        """
+        conversion = self.__conversion
+        if conversion is None:
+            return None
+        return conversion, self.__convert(tokens, *conversion)
+    
+    
+    def __convert(self, tokens, d_type, time_format):
+        #times are always read using the format found when the column was 
+        #first converted (None meaning seconds since the epoch), so that all 
+        #the chunks of the column are converted consistently
+        if d_type == 'number':
+            return to_float(tokens)
+        if time_format is None:
+            return to_time(to_float(tokens))
+        return to_time(tokens, time_format)
+    
+    
+    def __append_converted(self, data):
+        self.__values.append(data.data)
+        self.__mask.append(numpy.ma.getmaskarray(data))
+        self.data = numpy.ma.masked_array(self.__values.get_array(), 
+                                          mask=self.__mask.get_array())
+    
+    
+    def append(self, tokens, converted=None):
+        """
+        Appends the sequence of string tokens (e.g. an arrays.TokenColumn) to 
+        the column. converted may be the tokens' converted data as returned by
+        convert_chunk() (they are converted here if it is None, or if the data
+        type of the column has changed since).
+        """
+        self.__raw.append(tokens)
+        self.raw_data = self.__raw.get_column()
+        
+        if self.__conversion is not None:
+            if converted is None or converted[0] != self.__conversion:
+                converted = self.convert_chunk(tokens)
+            self.__append_converted(converted[1])
+        else:
+            self.data = None
+    
+    
+    def get_data(self):
+        if self.data is not None:
+            return self.data
+        
+        d_type = self.get_data_type()
+        if d_type not in ('number', 'time'):
+            self.__conversion = None
+            self.__values = None
+            self.__mask = None
+            return ColumnData.get_data(self)
+        
+        time_format = None
+        values_dtype = numpy.float64
+        if d_type == 'time':
+            time_format = guess_time_format(get_sample(self.raw_data))
+            values_dtype = TIME_DTYPE
+        
+        #convert the data a block at a time, so that the converted values can 
+        #be moved to disk if they are too big to fit in memory
+        self.__values = arrays.GrowableArray(values_dtype, self.__spill_size)
+        self.__mask = arrays.GrowableArray(bool, self.__spill_size)
+        for i in xrange(0, len(self.raw_data), _PARSE_BLOCK_SIZE):
+            self.__append_converted(self.__convert(
+                                    self.raw_data[i:i + _PARSE_BLOCK_SIZE], 
+                                    d_type, time_format))
+        
+        self.data = numpy.ma.masked_array(self.__values.get_array(), 
+                                          mask=self.__mask.get_array())
+        self.__conversion = (d_type, time_format)
+        self.check_data_type()
         return self.data
 
 
+def guess_data_type(tokens):
+    """
+    Returns 'number' if the majority of the string tokens can be interpreted as
+    floats, 'time' if the majority of them match one of TIME_FORMATS, and 
+    'text' otherwise. Note that times given as seconds since the epoch are 
+    numbers, so such columns are always guessed as 'number' - users have to
+    choose the 'time' data type for them by hand.
+    """
+    if len(tokens) == 0:
+        return 'text'
+    
+    if isinstance(tokens, arrays.TokenColumn):
+        tokens = tokens.to_array()
+    values = _bulk_float(numpy.asarray(tokens))
+    
+    #tokens such as "nan" also count as floats
+    nan_idxs = numpy.flatnonzero(numpy.isnan(values))
+    n_float = len(values) - len(nan_idxs) + _count_nan_tokens(tokens, nan_idxs)
+    
+    if n_float > len(tokens) - n_float:
+        return 'number'
+    if guess_time_format(tokens) is not None:
+        return 'time'
+    return 'text'
+
+
 def _float(s):
     try:
         return float(s)
     except ValueError:
         return numpy.nan
+
+
+#spellings of nan that float() accepts (in any case)
+_NAN_TOKENS = ['nan', '+nan', '-nan']
+
+
+def _count_nan_tokens(tokens, idxs):
+    """
+    Returns the number of the string tokens at the indices idxs which are 
+    spellings of nan (rather than text that is not a number).
+    """
+    if len(idxs) == 0:
+        return 0
+    if hasattr(tokens, 'take'):
+        tokens = tokens.take(idxs)
+    else:
+        tokens = numpy.asarray(tokens)[idxs]
+    return numpy.count_nonzero(numpy.in1d(numpy.char.lower(tokens), 
+                                          _NAN_TOKENS))
+
+
+#number of tokens converted at a time by the bulk float parser - this keeps 
+#the temporary arrays used during parsing reasonably small
+_PARSE_BLOCK_SIZE = 65536
+
+#separator used when handing tokens to numpy's parser - this should be a 
+#character that is never found in a number
+_PARSE_SEP = '\x1f'
+
+#lookup table of characters that the bulk parser does not accept at the start
+#of a token (NUL means an empty token)
+_BAD_FIRST_CHAR = numpy.zeros(256, dtype=bool)
+_BAD_FIRST_CHAR[[ord(c) for c in '\x00 \t\n\r\x0b\x0c']] = True
+
+
+def _bulk_float(tokens):
+    """
+    Converts an array of string tokens into an array of floats. Tokens that
+    cannot be interpreted as numbers are returned as NaN.
+    
+    The tokens are joined into a single separated string which is handed to
+    numpy's C parser (this uses the same correctly rounded conversion as 
+    float()). The parser stops at the first token that it cannot convert, which 
+    is then converted using float() and parsing resumes after it. The last
+    token of each block is always converted using float(), since the parser
+    does not report whether it could only partly parse it.
+    """
+    n = len(tokens)
+    values = numpy.empty(n, dtype=numpy.float64)
+    
+    if tokens.dtype.kind != 'S' or n == 0:
+        values[:] = [_float(i) for i in tokens]
+        return values
+    
+    #view the tokens as a 2D array of characters
+    width = tokens.dtype.itemsize
+    chars = tokens.view(numpy.uint8).reshape(n, width)
+    stride = width + 1
+    
+    for start in range(0, n, _PARSE_BLOCK_SIZE):
+        end = min(start + _PARSE_BLOCK_SIZE, n)
+        block = chars[start:end]
+        
+        #lay the tokens out in fixed width slots with a separator at the end 
+        #of each one. Numpy ignores the (space) padding around the values.
+        text = numpy.empty((end - start, stride), dtype=numpy.uint8)
+        text[:, :width] = block
+        text[text == 0] = ord(' ')
+        text[:, width] = ord(_PARSE_SEP)
+        
+        #mark the tokens that numpy's parser would treat differently to 
+        #float() so that we skip over them
+        bad = _BAD_FIRST_CHAR[block[:, 0]]
+        bad |= (block == ord(_PARSE_SEP)).any(axis=1)
+        text[bad, 0] = ord('!')
+        text = text.tostring()
+        
+        i = 0
+        while i < end - start:
+            parsed = numpy.fromstring(buffer(text, i * stride), sep=_PARSE_SEP)
+            values[start + i:start + i + len(parsed)] = parsed
+            i += len(parsed)
+            
+            if i < end - start:
+                #parsing stopped early. Either the last value returned came from
+                #a token that could only partly be parsed (e.g. "1x"), or the 
+                #next token could not be parsed at all.
+                if len(parsed):
+                    values[start + i - 1] = _float(tokens[start + i - 1])
+                else:
+                    values[start + i] = _float(tokens[start + i])
+                    i += 1
+        
+        #the parser also stops early on a partly parsed last token (e.g. 
+        #"12:30:00"), but then there is nothing left for it to stop before
+        values[end - 1] = _float(tokens[end - 1])
+    
+    return values
         
         
 def to_float(data):
-    return numpy.ma.masked_invalid([_float(i) for i in data])
+    """
+    Converts a sequence of string tokens into a masked array of floats. Tokens
+    that cannot be interpreted as numbers are masked.
+    """
+    if isinstance(data, arrays.TokenColumn):
+        #convert a block at a time to limit the size of the temporary arrays
+        values = numpy.empty(len(data), dtype=numpy.float64)
+        for i in xrange(0, len(data), _PARSE_BLOCK_SIZE):
+            block = data.to_array(i, min(i + _PARSE_BLOCK_SIZE, len(data)))
+            values[i:i + len(block)] = _bulk_float(block)
+        return numpy.ma.masked_invalid(values, copy=False)
+    
+    tokens = numpy.asarray(data)
+    
+    if tokens.dtype.kind in 'biuf':
+        #float64 data (e.g. memory-mapped from a binary file) is not copied
+        values = tokens.astype(numpy.float64, copy=False)
+    else:
+        values = _bulk_float(tokens)
+    
+    return numpy.ma.masked_invalid(values, copy=False)
 
 
 def to_str(data):
-    return numpy.ma.masked_array(data, mask=numpy.zeros_like(data))
+    if isinstance(data, arrays.TokenColumn):
+        data = data.to_array()
+    return numpy.ma.masked_array(data, mask=numpy.zeros(len(data), dtype=bool))
    
    
+#date/time layouts that are recognised in text columns (in the order that 
+#they are tried). Only the %Y, %m, %d, %H, %M and %S directives (with their 
+#usual strptime meanings) are supported. Formats ending in %S also accept 
+#fractional seconds, and formats containing a date and a time may end with 
+#'Z' or a UTC offset of the form +HH:MM or +HHMM (or -HH:MM, -HHMM), in 
+#which case the times are converted to UTC. Times without a date are given 
+#the date 1900-01-01, as with strptime.
+TIME_FORMATS = ['%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M', '%Y-%m-%d', 
+                '%H:%M:%S', '%H:%M']
+
+#numpy type used for time data - microsecond resolution means that the values 
+#can be converted to datetime.datetime objects
+TIME_DTYPE = 'datetime64[us]'
+
+_FIELD_WIDTHS = {'Y':4, 'm':2, 'd':2, 'H':2, 'M':2, 'S':2}
+_compiled_time_formats = {}
+
+
+def _compile_time_format(time_format):
+    #returns a tuple of (template, fields) for the format, where template is 
+    #a string with a '%' at each digit position and fields maps the
+    #directive letters to (start, width) tuples
+    try:
+        return _compiled_time_formats[time_format]
+    except KeyError:
+        pass
+    
+    template = ''
+    fields = {}
+    i = 0
+    while i < len(time_format):
+        if time_format[i] == '%':
+            code = time_format[i + 1]
+            fields[code] = (len(template), _FIELD_WIDTHS[code])
+            template += '%' * _FIELD_WIDTHS[code]
+            i += 2
+        else:
+            template += time_format[i]
+            i += 1
+    
+    _compiled_time_formats[time_format] = (template, fields)
+    return template, fields
+
+
+def _to_char_array(tokens):
+    #returns an (n_tokens, width) uint8 array of the characters of the tokens
+    tokens = numpy.asarray(tokens)
+    if tokens.dtype.kind != 'S':
+        tokens = tokens.astype(str)
+    if tokens.dtype.itemsize == 0:
+        tokens = tokens.astype('S1')
+    return tokens.view(numpy.uint8).reshape(len(tokens), tokens.dtype.itemsize)
+
+
+def _digits(chars, start, width):
+    #returns the integer value of the digits in columns start to 
+    #start + width - 1 of chars
+    value = numpy.zeros(len(chars), dtype=numpy.int64)
+    for i in range(start, start + width):
+        value *= 10
+        value += chars[:, i]
+        value -= ord('0')
+    return value
+
+
+def _parse_times(chars, time_format):
+    """
+    Converts the tokens in the (n_tokens, width) character array chars into 
+    times using time_format. Returns a tuple of (values, valid) where values
+    is an array of int64 microseconds since the epoch and valid is a boolean
+    array which is False for tokens that do not match the format.
+    """
+    template, fields = _compile_time_format(time_format)
+    n, width = chars.shape
+    length = len(template)
+    
+    if width < length:
+        return numpy.zeros(n, dtype=numpy.int64), numpy.zeros(n, dtype=bool)
+    
+    lengths = width - numpy.argmax(chars[:, ::-1] != 0, axis=1)
+    lengths[chars[:, 0] == 0] = 0
+    is_digit = lambda c: (c - numpy.uint8(ord('0'))) <= 9
+    
+    valid = lengths >= length
+    for i, c in enumerate(template):
+        if c == '%':
+            valid &= is_digit(chars[:, i])
+        else:
+            valid &= chars[:, i] == ord(c)
+    
+    #optional 'Z' (UTC) or UTC offset suffix
+    offset_minutes = numpy.zeros(n, dtype=numpy.int64)
+    if fields.has_key('d') and fields.has_key('H'):
+        rows = numpy.arange(n)
+        char_at = lambda idxs: chars[rows, numpy.clip(idxs, 0, width - 1)]
+        has_suffix = char_at(lengths - 1) == ord('Z')
+        lengths = lengths - has_suffix
+        
+        for suffix in ('+%%:%%', '+%%%%'):
+            start = lengths - len(suffix)
+            sign = char_at(start)
+            is_offset = numpy.logical_not(has_suffix) & (start >= length)
+            is_offset &= (sign == ord('+')) | (sign == ord('-'))
+            digits = []
+            for i, c in enumerate(suffix[1:]):
+                suffix_char = char_at(start + 1 + i)
+                if c == '%':
+                    is_offset &= is_digit(suffix_char)
+                    digits.append(suffix_char.astype(numpy.int64) - ord('0'))
+                else:
+                    is_offset &= suffix_char == ord(c)
+            
+            hours = digits[0] * 10 + digits[1]
+            minutes = digits[2] * 10 + digits[3]
+            valid &= numpy.logical_not(is_offset) | ((hours < 24) & 
+                                                     (minutes < 60))
+            offset = numpy.where(sign == ord('-'), -1, 1) * (hours * 60 + 
+                                                              minutes)
+            offset_minutes = numpy.where(is_offset, offset, offset_minutes)
+            lengths = lengths - is_offset * len(suffix)
+            has_suffix |= is_offset
+    
+    #optional fractional seconds
+    micro_seconds = numpy.zeros(n, dtype=numpy.int64)
+    if time_format.endswith('%S') and width > length:
+        has_fraction = lengths > length
+        valid &= lengths != length + 1
+        valid &= numpy.logical_not(has_fraction) | (chars[:, length] == ord('.'))
+        for i in range(length + 1, width):
+            in_fraction = lengths > i
+            valid &= numpy.logical_not(in_fraction) | is_digit(chars[:, i])
+            if i - length <= 6:
+                digit = numpy.where(in_fraction, chars[:, i], ord('0'))
+                digit = digit.astype(numpy.int64) - ord('0')
+                micro_seconds += digit * 10**(6 - (i - length))
+    else:
+        valid &= lengths == length
+    
+    get_field = lambda code, default: (_digits(chars, *fields[code]) 
+                                       if fields.has_key(code) else default)
+    year = get_field('Y', 1900)
+    month = get_field('m', 1)
+    day = get_field('d', 1)
+    hour = get_field('H', 0)
+    minute = get_field('M', 0)
+    second = get_field('S', 0)
+    
+    valid &= (month >= 1) & (month <= 12) & (day >= 1)
+    valid &= (hour < 24) & (minute < 60) & (second < 60)
+    
+    #work out the day number (since the epoch) of the start of the month, 
+    #and the number of days in the month
+    months = numpy.where(valid, (year - 1970) * 12 + month - 1, 0)
+    month_start = months.astype('datetime64[M]').astype('datetime64[D]')
+    month_end = (months + 1).astype('datetime64[M]').astype('datetime64[D]')
+    valid &= day <= (month_end - month_start).astype(numpy.int64)
+    
+    days = month_start.astype(numpy.int64) + day - 1
+    minutes = (days * 24 + hour) * 60 + minute - offset_minutes
+    values = (minutes * 60 + second) * 1000000
+    values += micro_seconds
+    return values, valid
+
+
+def guess_time_format(tokens):
+    """
+    Returns the first of TIME_FORMATS that the majority of the string tokens 
+    match, or None if there is no such format.
+    """
+    if len(tokens) == 0:
+        return None
+    
+    if isinstance(tokens, arrays.TokenColumn):
+        tokens = tokens.to_array()
+    chars = _to_char_array(tokens)
+    
+    for time_format in TIME_FORMATS:
+        n_valid = numpy.count_nonzero(_parse_times(chars, time_format)[1])
+        if n_valid > len(tokens) - n_valid:
+            return time_format
+    return None
+
+
+def to_time(data, time_format=None):
+    """
+    Converts a sequence of string tokens into a masked array of TIME_DTYPE. 
+    If time_format is None, then it is guessed from a sample of the data (see
+    guess_time_format()). If none of TIME_FORMATS fit the data, then the 
+    tokens are interpreted as the number of seconds since the epoch. Tokens 
+    that cannot be interpreted as times are masked.
+    
+    Numerical arrays are interpreted as seconds since the epoch and datetime64
+    arrays are used as they are.
+    """
+    if isinstance(data, numpy.ndarray) and data.dtype.kind == 'M':
+        values = data.astype(TIME_DTYPE)
+        return numpy.ma.masked_array(values, mask=numpy.isnat(values))
+    
+    if (time_format is None and not 
+        (isinstance(data, numpy.ndarray) and data.dtype.kind in 'biuf')):
+        time_format = guess_time_format(get_sample(data))
+    
+    n = len(data)
+    values = numpy.empty(n, dtype=numpy.int64)
+    valid = numpy.empty(n, dtype=bool)
+    
+    #convert a block at a time to limit the size of the temporary arrays
+    for i in xrange(0, n, _PARSE_BLOCK_SIZE):
+        j = min(i + _PARSE_BLOCK_SIZE, n)
+        if time_format is None:
+            seconds = to_float(data[i:j])
+            valid[i:j] = numpy.logical_not(numpy.ma.getmaskarray(seconds))
+            values[i:j] = numpy.round(seconds.filled(0.0) * 1e6)
+        else:
+            if isinstance(data, arrays.TokenColumn):
+                tokens = data.to_array(i, j)
+            else:
+                tokens = data[i:j]
+            values[i:j], valid[i:j] = _parse_times(_to_char_array(tokens), 
+                                                   time_format)
+    
+    return numpy.ma.masked_array(values.view(TIME_DTYPE), 
+                                 mask=numpy.logical_not(valid))
+
+
 _converters = {'number':to_float,
-               'text':to_str}
+               'text':to_str,
+               'time':to_time}
 
     
     
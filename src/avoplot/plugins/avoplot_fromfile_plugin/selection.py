@@ -0,0 +1,236 @@
+#Copyright (C) Nial Peters 2013
+#
+#This file is part of AvoPlot.
+#
+#AvoPlot is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#AvoPlot is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with AvoPlot.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Functions for selecting rows of data from the columns of a loaded file, using
+selection strings of the form "A[1:20], A[23:25]" (as entered in the "From 
+file" plotting dialog). These do not depend on wx, so they can be used without
+the GUI (see avoplot.batch).
+"""
+import re
+import numpy
+
+from avoplot import storage
+
+
+class InvalidSelectionError(ValueError):
+    pass
+
+
+def compile_selection(selection_params):
+    """
+    Converts the parameters of a validated selection (as returned by 
+    XYDataSeriesPanel._validate_selection_str()) into a sorted list of 
+    (start, stop) row index intervals, with overlapping and adjacent intervals
+    merged. Row numbers in selections start at 1 and include the upper bound,
+    whereas the intervals are indices (starting at 0) that exclude stop.
+    """
+    blocks = sorted([(int(s['lower_bound']) - 1, int(s['upper_bound'])) 
+                     for s in selection_params])
+    intervals = []
+    for start, stop in blocks:
+        if intervals and start <= intervals[-1][1]:
+            intervals[-1] = (intervals[-1][0], max(stop, intervals[-1][1]))
+        else:
+            intervals.append((start, stop))
+    return intervals
+
+
+def intersect_intervals(intervals1, intervals2):
+    """
+    Returns the list of intervals covering the rows that are in both of the 
+    (sorted and merged) lists of intervals.
+    """
+    intervals = []
+    i = j = 0
+    while i < len(intervals1) and j < len(intervals2):
+        start = max(intervals1[i][0], intervals2[j][0])
+        stop = min(intervals1[i][1], intervals2[j][1])
+        if start < stop:
+            intervals.append((start, stop))
+        
+        #move on from whichever interval finishes first
+        if intervals1[i][1] < intervals2[j][1]:
+            i += 1
+        else:
+            j += 1
+    return intervals
+
+
+def merge_adjacent(intervals):
+    """
+    Returns the sorted list of intervals with any that touch (one stopping 
+    where the next starts) joined together.
+    """
+    merged = []
+    for start, stop in intervals:
+        if merged and start == merged[-1][1]:
+            merged[-1] = (merged[-1][0], stop)
+        else:
+            merged.append((start, stop))
+    return merged
+
+
+def select_rows(data, intervals):
+    """
+    Returns the rows of the array data that are in the (sorted) list of 
+    intervals. Rows that form a single block are returned as a view of data 
+    (so no data is copied), otherwise the blocks are joined into a new array.
+    """
+    blocks = [data[start:stop] for start, stop in merge_adjacent(intervals)]
+    if len(blocks) == 1:
+        return blocks[0]
+    
+    if not blocks:
+        return data[:0]
+    
+    if isinstance(data, numpy.ma.MaskedArray):
+        return numpy.ma.concatenate(blocks)
+    return numpy.concatenate(blocks)
+
+
+def get_row_numbers(intervals):
+    """
+    Returns the indices (starting at 0) of the rows in the (sorted) list of
+    intervals. Rows that form a single block are returned as a 
+    storage.RegularSamples object rather than an array of the indices.
+    """
+    intervals = merge_adjacent(intervals)
+    if len(intervals) == 1:
+        start, stop = intervals[0]
+        return storage.RegularSamples(0, 1, start, stop - start, numpy.int64)
+    
+    return numpy.concatenate([numpy.arange(start, stop) 
+                              for start, stop in intervals] + 
+                             [numpy.arange(0)])
+
+
+def parse_selection_str(selection_str, file_contents):
+    """
+    Parses and validates a selection string (of the form "A[1:20], A[23:25]")
+    of rows of one of the columns of file_contents. Returns a list of dicts 
+    of the column name, lower bound and upper bound (as strings) of each block
+    of the selection, or an empty list if the string is empty. Raises 
+    InvalidSelectionError if the selection is not valid.
+    """
+    if not selection_str or selection_str.isspace():
+        return []
+    
+    selection_blocks = selection_str.split(',')
+    
+    regexp = re.compile(r'''
+                           (?:^\s*(?P<column>[A-Z]+) #matches column name 
+                           \s*\[\s*(?P<lower_bound>[0-9]*) #matches lower bound number (if there is one)
+                           \s*:\s*  
+                           (?P<upper_bound>[0-9]*)\s*\]\s*$) #matches upped bound number (if there is one)''', 
+                           flags=re.VERBOSE)
+    cols = set()
+    selection_params = []
+    for block in selection_blocks:
+        match = regexp.match(block)
+        
+        if match is None:
+            #then there is a syntax error in the selection string
+            raise InvalidSelectionError("Syntax error in selection string. \'%s\' is not a valid selection, expecting something of the form \'A[2:8]\'."%block)
+    
+        params = match.groupdict()
+        selection_params.append(params)
+
+        cols.add(params['column'])
+        try:
+            column = file_contents.get_column_by_name(params['column'])
+        except KeyError:
+            raise InvalidSelectionError("Value error in selection string. \'%s\' is not a valid selection, there is no column \'%s\'."%(block, params['column']))
+        n_rows = column.get_number_of_rows()
+           
+        if not params['lower_bound']:
+            params['lower_bound'] = '1'
+        if not params['upper_bound']:
+            params['upper_bound'] = str(n_rows)
+        
+        lower_bound = int(params['lower_bound'])
+        upper_bound = int(params['upper_bound'])
+        
+        if lower_bound < 1:
+            raise InvalidSelectionError("Value error in selection string. \'%s\' is not a valid selection, lower bound must be greater than zero."%block)
+        
+        if lower_bound > upper_bound:
+            raise InvalidSelectionError("Value error in selection string. \'%s\' is not a valid selection, upper bound cannot be smaller than lower bound."%block)
+         
+        if upper_bound > n_rows:
+            raise InvalidSelectionError("Value error in selection string. \'%s\' is not a valid selection, upper bound is outside data range."%block)
+
+    if len(cols) != 1:
+        raise InvalidSelectionError("Selection cannot contain data from multiple columns.")
+    
+    return selection_params
+
+
+def compile_selection_str(selection_str, file_contents):
+    """
+    Validates the selection string (see parse_selection_str()) and returns a 
+    tuple of (column, intervals) where column is the loader.ColumnData object
+    selected from and intervals is as returned by compile_selection(), or None
+    if the string is empty. 
+    """
+    selection_params = parse_selection_str(selection_str, file_contents)
+    if not selection_params:
+        return None
+    
+    column = file_contents.get_column_by_name(selection_params[0]['column'])
+    return column, compile_selection(selection_params)
+
+
+def get_selection_data(column, intervals):
+    """
+    Returns a masked array of the rows of column (a loader.ColumnData object)
+    in intervals. A single block of rows is a view of the column data. Time 
+    data is returned as datetime64 values (loader.TIME_DTYPE), which data 
+    series and matplotlib handle directly. Raises InvalidSelectionError if the
+    column contains text.
+    """
+    if column.get_data_type() == 'text':
+        raise InvalidSelectionError("You cannot plot text as a data series.")
+    
+    return select_rows(column.get_data(), intervals)
+
+
+def get_series_data(x_selection, y_selection):
+    """
+    Returns a tuple of (xdata, ydata) containing the rows that are in both
+    the x and y selections (as returned by compile_selection_str()), or None
+    if neither has been made. If only one of them has been made, then the row
+    numbers are used for the other (see get_row_numbers()).
+    """
+    if x_selection is None and y_selection is None:
+        return
+    
+    if x_selection is None:
+        intervals = y_selection[1]
+    elif y_selection is None:
+        intervals = x_selection[1]
+    else:
+        intervals = intersect_intervals(x_selection[1], y_selection[1])
+    
+    if x_selection is None:
+        return (get_row_numbers(intervals), 
+                get_selection_data(y_selection[0], intervals))
+    elif y_selection is None:
+        return (get_selection_data(x_selection[0], intervals), 
+                get_row_numbers(intervals))
+    else:
+        return (get_selection_data(x_selection[0], intervals), 
+                get_selection_data(y_selection[0], intervals))
@@ -17,16 +17,17 @@
 
 import warnings
 import mimetypes
-import wx
 import re
 import StringIO
 import os.path
-from avoplot.plugins import AvoPlotPluginSimple
-from avoplot.series import XYDataSeries
-from avoplot.persist import PersistentStorage
-from column_selector import TxtFileDataSeriesSelectFrame
+import array
+import mmap
+import numpy
+from avoplot import data_cache
 #from avoplot.plugins.avoplot_fromfile_plugin.loader import FileLoaderBase
 import loader
+import arrays
+import decompress
 
 
 try:
@@ -44,9 +45,41 @@ except ImportError:
     have_magic = False
 
 
-#required otherwise plugin will not be loaded!
-plugin_is_GPL_compatible = True
+#comment symbols that the loader will recognise (in order of preference)
+COMMENT_SYMBOLS = ('#',';','%','//')
 
+#number of bytes from the start and end of a file to inspect when deciding 
+#if it is a text file
+SAMPLE_SIZE = 65536
+
+#number of lines of data to split into words at a time
+SPLIT_CHUNK_LINES = 10000
+
+#number of rows read at a time when displaying part of a column which has not
+#been loaded yet
+ROW_BLOCK_SIZE = 1000
+
+#files larger than this (in bytes) are loaded in chunks. Streamed files are 
+#split into all of their columns as they are read (spilling them to disk if 
+#they are large), rather than the columns being split out of the file when 
+#they are first used. This is what allows files larger than the available 
+#memory to be loaded, since a column split out of a mapped file is held in 
+#memory.
+STREAMING_THRESHOLD = 64 * 1024**2
+
+#number of bytes read at a time when streaming a file
+STREAM_BLOCK_SIZE = 1024**2
+
+#number of lines scanned between reports of the progress of loading a file
+PROGRESS_LINES = 65536
+
+#number of bytes at the end of a file which are checked to make sure that it 
+#has only been appended to since it was loaded
+APPEND_CHECK_SIZE = 4096
+
+#version number of the format used for storing the structure of files in the 
+#data cache - increment it if the format changes
+_SCAN_CACHE_VERSION = 1
 
 def tuple_compare(first, second, element=0):
     """
@@ -81,81 +114,190 @@ def load(filename):
         s = ifp.read()
     return StringIO.StringIO(s)
 
-class TextFilePlugin(AvoPlotPluginSimple):
-    def __init__(self):
-        AvoPlotPluginSimple.__init__(self,"Text File", XYDataSeries)
-        self.set_menu_entry(['From file'], "Plot data from a file")
-    
-    
-    def plot_into_subplot(self, subplot):
-        
-        data_series = self.get_data_series()
-        
-        if not data_series:
-            return False
+
+def is_binary(buf):
+    """Return true if the given file buffer is binary. This is done
+    based on finding null bytes in the file - it will only be used
+    when python-magic is not available.
+    """
+    return buf.find('\0') != -1
+
+
+def get_samples(buf):
+    """
+    Returns (head, tail) samples of the file buffer, each of at most 
+    SAMPLE_SIZE bytes. For small files the tail sample is empty.
+    """
+    if len(buf) <= 2 * SAMPLE_SIZE:
+        return buf[:], ''
+    return buf[:SAMPLE_SIZE], buf[-SAMPLE_SIZE:]
         
-        for s in data_series:
-            subplot.add_data_series(s)
         
-        return True
+def scan_lines(text, progress=None):
+    """
+    Scans through the lines of text, returning a tuple of (line_offsets, 
+    line_n_cols, line_comments, comment_counts, col_counts). The first three
+    are arrays with an entry per line containing its position in the text, the
+    number of words it contains, and the index in COMMENT_SYMBOLS of the 
+    comment symbol it starts with (-1 if none). line_offsets has an extra 
+    entry at the end containing the length of the text. comment_counts is a 
+    list of the number of lines starting with each comment symbol (ignoring 
+    leading whitespace) and col_counts is a dict mapping numbers of words to 
+    the number of lines containing them. If progress is not None, then it is 
+    called every PROGRESS_LINES lines as progress(n_bytes, n_lines).
+    """
+    line_offsets = array.array('L')
+    line_n_cols = array.array('L')
+    line_comments = array.array('b')
     
+    comment_counts = [0] * len(COMMENT_SYMBOLS)
+    col_counts = {}
     
-    def get_data_series(self):
-        persistant_storage = PersistentStorage()
-        
-        try:
-            last_path_used = persistant_storage.get_value("fromfile_last_dir_used")
-        except KeyError:
-            last_path_used = ""
+    pos = 0
+    text_len = len(text)
+    while pos < text_len:
+        end = text.find('\n', pos)
+        if end < 0:
+            end = text_len
+        else:
+            end += 1
+        line = text[pos:end]
+        line_offsets.append(pos)
+        pos = end
         
-        #get filename to open
-        file_to_open = wx.FileSelector("Choose file to open", default_path=last_path_used)
-        if file_to_open == "":
-            return
+        if progress is not None and len(line_offsets) % PROGRESS_LINES == 0:
+            progress(pos, len(line_offsets))
         
-        persistant_storage.set_value("fromfile_last_dir_used", os.path.dirname(file_to_open))
+        #count lines starting with each of the comment symbols
+        stripped_line = line.lstrip()
+        for i, symbol in enumerate(COMMENT_SYMBOLS):
+            if stripped_line.startswith(symbol):
+                comment_counts[i] += 1
+                break
         
-        wx.BeginBusyCursor()
-        try:
-            contents = loader.load_file(file_to_open)
-            series_select_dialog = TxtFileDataSeriesSelectFrame(self.get_parent(), contents)
-        finally:
-            wx.EndBusyCursor()
+        #record whether the (unstripped) line starts with a comment symbol
+        for i, symbol in enumerate(COMMENT_SYMBOLS):
+            if line.startswith(symbol):
+                line_comments.append(i)
+                break
+        else:
+            line_comments.append(-1)
         
-        if series_select_dialog.ShowModal() == wx.ID_OK:
-            return series_select_dialog.get_series()
-            
+        #build a histogram of the number of columns in each line
+        n_cols = len(line.split())
+        line_n_cols.append(n_cols)
+        if col_counts.has_key(n_cols):
+            col_counts[n_cols] += 1
+        else:
+            col_counts[n_cols] = 1
+    
+    line_offsets.append(text_len)
+    
+    return line_offsets, line_n_cols, line_comments, comment_counts, col_counts
 
-def is_binary(ifp):
-    """Return true if the given filename is binary. This is done
-    based on finding null bytes in the file - it will only be used
-    when python-magic is not available.
+
+def find_data_lines(line_n_cols, line_comments, n_cols, comment_idx):
     """
-    while 1:
-        chunk = ifp.read(2048)
-        if '\0' in chunk: # found null byte
-            return True
-        if len(chunk) < 2048:
-            break # done
-    return False
-        
-        
+    Returns a tuple of boolean arrays (is_comment, is_data) indicating which
+    lines start with the comment symbol and which contain data (i.e. have 
+    n_cols words and are not commented out). The line_n_cols and line_comments
+    arguments are as returned by scan_lines().
+    """
+    line_n_cols = numpy.frombuffer(line_n_cols, dtype=numpy.uint)
+    line_comments = numpy.frombuffer(line_comments, dtype=numpy.int8)
+    if comment_idx < 0:
+        is_comment = numpy.zeros(len(line_comments), dtype=bool)
+    else:
+        is_comment = line_comments == comment_idx
+    is_data = numpy.logical_and(line_n_cols == n_cols, 
+                                numpy.logical_not(is_comment))
+    return is_comment, is_data
+
+
+def split_columns(text, line_offsets, start_idx, end_idx, lines_to_skip, 
+                  columns):
+    """
+    Splits lines start_idx to end_idx - 1 of the text into words, excluding 
+    the lines whose indices are in lines_to_skip (which must be sorted), and
+    appends them to columns (a list of arrays.TokenColumnBuilder objects). All
+    the lines must contain len(columns) words. Columns that are None in the 
+    list are not stored. Long runs of lines are split in chunks so that we 
+    never hold a copy of the whole text.
+    """
+    n_cols = len(columns)
+    block_start = start_idx
+    for skip_idx in lines_to_skip + [end_idx]:
+        for i in xrange(block_start, skip_idx, SPLIT_CHUNK_LINES):
+            chunk_end = min(i + SPLIT_CHUNK_LINES, skip_idx)
+            chars = numpy.frombuffer(text[line_offsets[i]:line_offsets[chunk_end]],
+                                     dtype=numpy.uint8)
+            starts, ends = arrays.find_words(chars)
+            for j, c in enumerate(columns):
+                if c is not None:
+                    c.append_words(chars, starts[j::n_cols], ends[j::n_cols])
+        block_start = skip_idx + 1
+
+
 class TextFileLoader(loader.FileLoaderBase):
+    supports_streaming = True
+    
+    #columns are only split out of the file when they are used, so caching 
+    #the contents would mean reading all of them - the structure of the file
+    #is cached instead
+    cache_results = False
+    
+    extensions = ('.txt', '.csv', '.tsv', '.asc')
+    
+    #this is the catch-all loader, so more specific loaders should be tried 
+    #before it
+    priority = -10
     
     def __init__(self):
         self.name = "Text file loader"
         
+        #results of test_samples(), keyed by path. Values are tuples of (file
+        #signature, result), so that only the result for the latest version 
+        #of each file is kept.
+        self.__test_results = {}
+        
+        
+    def test(self, filename, buf):
+        """
+        Returns True if buf (the contents of the file) looks like text. Only
+        samples from the start and end of buf are inspected.
+        """
+        return self.test_samples(filename, *get_samples(buf))
+    
+    
+    def test_samples(self, filename, head, tail):
+        """
+        Returns True if the file looks like a text file, judging by samples 
+        from its start and end (see loader.FileLoaderBase.test_samples()). 
+        The result is cached for as long as the file remains unchanged.
+        """
+        signature = loader.get_file_signature(filename)
+        if signature is None:
+            return self.__test_samples(filename, head, tail)
         
-    def test(self, filename, ifp):
+        path = signature[0]
+        previous_signature, result = self.__test_results.get(path, 
+                                                             (None, None))
+        if signature != previous_signature:
+            result = self.__test_samples(filename, head, tail)
+            self.__test_results[path] = (signature, result)
+        return result
+    
+    
+    def __test_samples(self, filename, head, tail):
+        if is_binary(tail):
+            return False
         
         if have_magic:
             try:
-                file_type = magic.from_buffer(ifp.read(),mime=True)
+                file_type = magic.from_buffer(head,mime=True)
             except Exception, e:
                 print e.args
                 return False
-            finally:
-                ifp.seek(0)
             
             if file_type.startswith('text/'):
                 return True
@@ -167,7 +309,7 @@ class TextFileLoader(loader.FileLoaderBase):
                 if file_type and file_type.startswith('text/'):
                     return True
                 else:
-                    if is_binary(ifp):
+                    if is_binary(head):
                         return False
                     return True
             except Exception, e:
@@ -176,122 +318,105 @@ class TextFileLoader(loader.FileLoaderBase):
             
     
     
-    def load(self, filename,ifp):
-        comment = self.guess_comment_symbol(ifp)
-        n_cols = self.guess_number_of_columns(ifp)
-        start_idx, end_idx, lines_to_skip = self.guess_data_lines(ifp, n_cols, comment)
-        headings = self.guess_column_titles(ifp, n_cols, start_idx, comment)
-        header,columns,footer = self.get_columns(ifp, n_cols, start_idx, end_idx, lines_to_skip, headings)
+    def load(self, filename, buf, progress=None):
+        """
+        Returns a FileContents object for the file. Only the structure of the
+        file is worked out here - the columns are loaded.LazyColumnData 
+        objects, which are split out of the file the first time that they are
+        used.
+        """
+        structure = self.scan_file(filename, buf, progress=progress)
+        header, columns, footer = self.get_columns(structure, 
+                                        TextColumnSource(filename, structure))
         
-        return loader.FileContents(filename, columns, header=header, comment_symbols=[comment], skipped_rows=[(i,l) for i,l in lines_to_skip], footer=footer)
+        return loader.FileContents(filename, columns, header=header, 
+                                   comment_symbols=[structure.comment], 
+                                   skipped_rows=structure.get_skipped_rows(), 
+                                   footer=footer)
         
     
-    
-    def guess_comment_symbol(self, ifp):
-        try:
-            common_choices = ('#',';','%','//')
-            counts = [0,0,0,0]
-            
-            for line in ifp:
-                for i in range(len(counts)):
-                    if line.lstrip().startswith(common_choices[i]):
-                        counts[i] += 1
-                        break
-        finally:
-            ifp.seek(0)
-        if max(counts) == 0:
-            return None
-        return common_choices[counts.index(max(counts))]
+    def scan(self, text, progress=None):
+        """
+        Works out the structure of the file (comment symbol, number of columns,
+        which lines contain data etc.) in a single pass over its contents.
+        Returns a TextFileStructure object. The progress argument is as for 
+        scan_lines().
+        """
+        return TextFileStructure(text, *scan_lines(text, progress))
     
     
-    def guess_number_of_columns(self, ifp):
+    def scan_file(self, filename, buf, progress=None):
+        """
+        As for scan(), but the results of scanning the file are stored in the 
+        data cache, so that they can be reused if the same file is opened 
+        again (and has not changed).
+        """
+        signature = loader.get_file_signature(filename)
+        if signature is None:
+            return self.scan(buf, progress)
+        
+        key = ((__name__, _SCAN_CACHE_VERSION) + signature + 
+               (data_cache.get_sample_hash(buf),))
+        cache = data_cache.DataCache()
         try:
-            col_counts = {}
-            
-            for line in ifp:
-                n_cols = len(line.split())
-                if col_counts.has_key(n_cols):
-                    col_counts[n_cols] += 1
-                else:
-                    col_counts[n_cols] = 1
-            
-            cols, counts = zip(*col_counts.items())
-            counts, cols = multi_sort(counts, cols)
-        finally:
-            ifp.seek(0)
+            metadata, scan_arrays = cache.get(key)
+            return TextFileStructure(buf, scan_arrays['line_offsets'], 
+                                     scan_arrays['line_n_cols'], 
+                                     scan_arrays['line_comments'], 
+                                     metadata['comment_counts'], 
+                                     dict(metadata['col_counts']))
+        except KeyError:
+            pass
+        
+        line_offsets, line_n_cols, line_comments, comment_counts, col_counts = scan_lines(buf, progress)
+        
+        #the line offsets are unsigned longs, but will never be large enough
+        #for that to matter
+        cache.put(key, {'comment_counts':comment_counts, 
+                        'col_counts':col_counts.items()},
+                  {'line_offsets':numpy.frombuffer(line_offsets, 
+                                                   dtype=numpy.int64),
+                   'line_n_cols':numpy.frombuffer(line_n_cols, 
+                                                  dtype=numpy.uint),
+                   'line_comments':numpy.frombuffer(line_comments, 
+                                                    dtype=numpy.int8)})
         
-        return cols[-1]
+        return TextFileStructure(buf, line_offsets, line_n_cols, line_comments, 
+                                 comment_counts, col_counts)
     
     
-    def guess_data_lines(self, ifp, n_cols, comment=None):
-        try:
-            lines = ifp.readlines()
-            lines_to_skip = []
-            start_idx = None
-            end_idx = None
-            for i, line in enumerate(lines):
-                if comment is not None and line.startswith(comment):
-                    if start_idx is not None:
-                        lines_to_skip.append((i,line))
-                    continue
-                if len(line.split()) == n_cols:
-                    if start_idx is None:
-                        start_idx = i
-                    else:
-                        end_idx = i
-                else:
-                    lines_to_skip.append((i,line))
-            if end_idx is None:
-                end_idx = start_idx
-            
-            while lines_to_skip and lines_to_skip[-1][0] >= end_idx:
-                lines_to_skip.pop() #otherwise it will include line=end_idx
-            
-            
-        finally:
-            ifp.seek(0)
-            
-        return start_idx, end_idx, lines_to_skip
+    def open_stream(self, filename, ifp):
+        return TextFileStreamReader(ifp, self)
     
     
-    def get_columns(self, ifp, n_cols, start_idx, end_idx, lines_to_skip, headings):
-        
-        columns = []
-        for i in range(n_cols):
-            columns.append([])
+    def get_columns(self, structure, source):
+        """
+        Returns a tuple of (header, columns, footer) where columns is a list of 
+        loader.LazyColumnData objects which read their data from source (a 
+        TextColumnSource object for the file). The columns share a memory 
+        budget, so that only the most recently used ones are kept in memory
+        if they are too large to all fit.
+        """
+        header = structure.get_text(0, structure.start_idx)
+        footer = structure.get_text(structure.end_idx + 1, structure.n_lines)
         
-        lines = ifp.readlines()
-        ifp.seek(0)
+        headings = self.guess_column_titles(structure.get_heading_line(), 
+                                            structure.n_cols, structure.comment)
         
-        header = ''.join(lines[:start_idx])
+        budget = loader.ColumnMemoryBudget()
+        columns = [loader.LazyColumnData(source, i, source.n_rows, budget, 
+                                         title=headings[i]) 
+                   for i in range(structure.n_cols)]
         
-        if len(lines) == end_idx + 1:
-            footer=''
-        else:
-            footer = ''.join(lines[end_idx+1:])
-        
-        lines = lines[start_idx:end_idx+1]
-        for idx in [i[0]-start_idx for i in reversed(sorted(lines_to_skip, cmp=tuple_compare))]:
-            lines.pop(idx)
-        
-        for line in lines:
-            vals = line.split()
-            
-            for i in range(n_cols):
-                columns[i].append(vals[i])
-
-        return header,[loader.ColumnData(c, title=headings[i]) for i,c in enumerate(columns)],footer
+        return header, columns, footer
         
            
-    def guess_column_titles(self, ifp, n_cols, start_idx, comment_symbol):
-        if start_idx == 0:
+    def guess_column_titles(self, line, n_cols, comment_symbol):
+        if line is None:
             #there are no column headings - data starts in the first row
             return ['']*n_cols
         
-        lines = ifp.readlines()
-        ifp.seek(0)
-        
-        words = lines[start_idx - 1].lstrip(comment_symbol).split()
+        words = line.lstrip(comment_symbol).split()
         if len(words) == n_cols:
             return words
         elif len(words) < n_cols:
@@ -300,7 +425,7 @@ class TextFileLoader(loader.FileLoaderBase):
         else:
             #life is more difficult since the column names might have spaces in them
             #first check to see if there are a sane number of separators greater than one space
-            line = lines[start_idx - 1].strip().lstrip(comment_symbol).lstrip()
+            line = line.strip().lstrip(comment_symbol).lstrip()
             
             seps = re.findall(r' {2,}| ?[\t\n\r\f\v]+', line)
             
@@ -319,5 +444,429 @@ class TextFileLoader(loader.FileLoaderBase):
                 return ['']*n_cols
 
 
+
+
+class TextFileStructure:
+    """
+    Holds the structure of a text file, as found by TextFileLoader.scan(). 
+    Lines are referred to by their index in the file, and the text of a range 
+    of lines can be retrieved using get_text(). The text may be a str or a 
+    mmap.mmap object.
+    """
+    def __init__(self, text, line_offsets, line_n_cols, line_comments, 
+                 comment_counts, col_counts):
+        self.text = text
+        self.line_offsets = line_offsets
+        self.n_lines = len(line_offsets) - 1
+        
+        #the most commonly used comment symbol (if any)
+        if max(comment_counts) == 0:
+            self.comment = None
+            comment_idx = -1
+        else:
+            comment_idx = comment_counts.index(max(comment_counts))
+            self.comment = COMMENT_SYMBOLS[comment_idx]
+        
+        #the most common number of columns 
+        if not col_counts:
+            raise IOError("Failed to find any data in the file.")
+        cols, counts = zip(*col_counts.items())
+        counts, cols = multi_sort(counts, cols)
+        self.n_cols = cols[-1]
+        
+        #data lines are those with the correct number of columns that are not 
+        #commented out
+        is_comment, is_data = find_data_lines(line_n_cols, line_comments, 
+                                              self.n_cols, comment_idx)
+        self.comment_idx = comment_idx
+        data_idxs = numpy.flatnonzero(is_data)
+        
+        if len(data_idxs) == 0:
+            raise IOError("Failed to find any data in the file.")
+        
+        self.start_idx = int(data_idxs[0])
+        self.end_idx = int(data_idxs[-1])
+        
+        #invalid lines are those within the data that are either comments or
+        #have the wrong number of columns, and any non-comment lines before 
+        #the data.
+        is_invalid = numpy.logical_not(is_data)
+        is_invalid[:self.start_idx] = numpy.logical_not(is_comment[:self.start_idx])
+        is_invalid[self.end_idx:] = False
+        self.lines_to_skip = numpy.flatnonzero(is_invalid).tolist()
+    
+    
+    def get_text(self, start_idx, end_idx):
+        """
+        Returns the text of lines start_idx to end_idx - 1 (including newlines).
+        """
+        return self.text[self.line_offsets[start_idx]:self.line_offsets[end_idx]]
+    
+    
+    def get_skipped_rows(self):
+        """
+        Returns a list of (line index, line) tuples for the invalid lines.
+        """
+        return [(i, self.get_text(i, i + 1)) for i in self.lines_to_skip]
+    
+    
+    def get_heading_line(self):
+        """
+        Returns the line before the start of the data (which may contain the 
+        column headings) or None if the data starts on the first line.
+        """
+        if self.start_idx == 0:
+            return None
+        return self.get_text(self.start_idx - 1, self.start_idx)
+
+
+
+
+class TextColumnSource:
+    """
+    Splits individual columns out of the data lines of a text file, as 
+    described by structure (a TextFileStructure object). Used as the source 
+    of data for loader.LazyColumnData objects. 
+    
+    Memory mapped files are mapped again, since the mapping used for loading 
+    the file is closed once it has been loaded. The mapping is closed again 
+    by close(), or once every column has been split out of the file, and is 
+    reopened if any more data is read. IOError is raised if the file is 
+    modified after it was opened, other than by appending to it (as for log 
+    files that are still being written to). 
+    """
+    def __init__(self, filename, structure):
+        self.__filename = filename
+        self.__file = None
+        self.__text = structure.text
+        self.__is_mapped = isinstance(self.__text, mmap.mmap)
+        if self.__is_mapped:
+            self.__open()
+            self.__signature = self.__get_signature()
+            self.__tail = self.__text[-APPEND_CHECK_SIZE:]
+        
+        self.__line_offsets = structure.line_offsets
+        self.__start_idx = structure.start_idx
+        self.__end_idx = structure.end_idx
+        
+        #invalid lines before the data are part of the header
+        self.__lines_to_skip = [i for i in structure.lines_to_skip 
+                                if i > structure.start_idx]
+        
+        self.n_cols = structure.n_cols
+        self.n_rows = (self.__end_idx + 1 - self.__start_idx - 
+                       len(self.__lines_to_skip))
+        self.__sample = None
+        self.__row_block = (None, None) #(first row, words of each column)
+        self.__split = set() #indices of the columns that have been read
+    
+    
+    def __open(self):
+        #keep the file open, so that we can check that the mapped file has 
+        #not been modified even if it is renamed or deleted
+        self.__file = open(self.__filename, 'rb')
+        self.__text = loader.map_file(self.__file)
+    
+    
+    def close(self):
+        """
+        Closes the file (if it is memory mapped). It is opened again if any 
+        more data is read from it.
+        """
+        if self.__file is None:
+            return
+        if isinstance(self.__text, mmap.mmap):
+            self.__text.close()
+        self.__file.close()
+        self.__file = None
+        self.__text = None
+    
+    
+    def __get_text(self):
+        #returns the text of the file, opening it again if it has been closed
+        if self.__is_mapped and self.__file is None:
+            self.__open()
+        self.__check_file()
+        return self.__text
+    
+    
+    def __get_signature(self):
+        stat = os.fstat(self.__file.fileno())
+        return (stat.st_size, stat.st_mtime)
+    
+    
+    def __check_file(self):
+        if not self.__is_mapped:
+            return
+        signature = self.__get_signature()
+        if signature == self.__signature:
+            return
+        
+        #appending to the file doesn't change the part that is mapped, but 
+        #anything else might have (the end of the mapped part is checked, 
+        #since that is where a rewritten file is most likely to differ)
+        if (signature[0] < self.__signature[0] or 
+            self.__text[-APPEND_CHECK_SIZE:] != self.__tail):
+            raise IOError("%s has changed since it was opened."%self.__filename)
+    
+    
+    def read_column(self, idx):
+        """
+        Returns an arrays.TokenColumn of the words in column idx.
+        """
+        text = self.__get_text()
+        columns = [None] * self.n_cols
+        columns[idx] = arrays.TokenColumnBuilder(spill_size=None)
+        split_columns(text, self.__line_offsets, self.__start_idx, 
+                      self.__end_idx + 1, self.__lines_to_skip, columns)
+        columns[idx].trim()
+        
+        #the file is not needed any more once all the columns have been split 
+        #out of it (unless they are released from memory and read again)
+        self.__split.add(idx)
+        if len(self.__split) == self.n_cols:
+            self.close()
+        return columns[idx].get_column()
+    
+    
+    def read_sample(self, idx):
+        """
+        Returns a list of the words from the rows of column idx chosen by 
+        loader.get_sample_indices(). The sample lines are only split once, 
+        for all the columns.
+        """
+        if self.__sample is None:
+            self.__sample = self.__split_rows(
+                                    loader.get_sample_indices(self.n_rows))
+        return self.__sample[idx]
+    
+    
+    def read_rows(self, idx, start, stop):
+        """
+        Returns a list of the words in rows start to stop - 1 of column idx.
+        The rows are read ROW_BLOCK_SIZE at a time (for all the columns), and 
+        the most recently read block is kept, so that displaying a range of 
+        rows of all the columns only needs to split them once.
+        """
+        stop = min(stop, self.n_rows)
+        words = []
+        first_block = (start // ROW_BLOCK_SIZE) * ROW_BLOCK_SIZE
+        for block_start in xrange(first_block, stop, ROW_BLOCK_SIZE):
+            if self.__row_block[0] != block_start:
+                block_stop = min(block_start + ROW_BLOCK_SIZE, self.n_rows)
+                self.__row_block = (block_start, self.__split_rows(
+                                    numpy.arange(block_start, block_stop)))
+            
+            words.extend(self.__row_block[1][idx][max(start - block_start, 0):
+                                                  stop - block_start])
+        return words
+    
+    
+    def __split_rows(self, row_idxs):
+        #returns a list (one per column) of lists of the words in the rows
+        #whose indices are in row_idxs (which must be sorted)
+        text = self.__get_text()
+        line_idxs = self.__get_line_indices(row_idxs)
+        words = ''.join([text[self.__line_offsets[i]:self.__line_offsets[i + 1]]
+                         for i in line_idxs]).split()
+        return [words[i::self.n_cols] for i in range(self.n_cols)]
+    
+    
+    def __get_line_indices(self, row_idxs):
+        #converts (sorted) indices of data rows into indices of lines in the 
+        #file, allowing for the invalid lines within the data. skip_rows[j] is 
+        #the number of data rows before the j'th invalid line.
+        skip_rows = (numpy.array(self.__lines_to_skip, dtype=numpy.int64) - 
+                     self.__start_idx - numpy.arange(len(self.__lines_to_skip)))
+        return (self.__start_idx + row_idxs + 
+                numpy.searchsorted(skip_rows, row_idxs, side='right'))
+
+
+
+
+class TextFileStreamReader(loader.FileStreamReaderBase):
+    """
+    Reads a text file in chunks. The structure of the file (comment symbol, 
+    number of columns, column titles etc.) is worked out from a sample of 
+    SAMPLE_SIZE bytes from the start of the file, and the rest of the file is 
+    read STREAM_BLOCK_SIZE bytes at a time.
+    """
+    def __init__(self, ifp, text_loader):
+        loader.FileStreamReaderBase.__init__(self, ifp)
+        self.__eof = False
+        self.__carry = '' #incomplete line left over from the last read
+        self.__columns = None #words that have been read but not returned yet
+        self.__trailing_lines = [] #invalid lines since the last data line
+        
+        head = ''
+        while not head and not self.__eof:
+            head = self.__read_lines(SAMPLE_SIZE)
+        
+        structure = text_loader.scan(head)
+        self.__n_cols = structure.n_cols
+        self.__columns = self.__new_columns()
+        self.__comment_idx = structure.comment_idx
+        
+        self.header = structure.get_text(0, structure.start_idx)
+        self.comment_symbols = [structure.comment]
+        self.titles = text_loader.guess_column_titles(
+                                        structure.get_heading_line(), 
+                                        structure.n_cols, structure.comment)
+        self.skipped_rows = [(i, l) for i, l in structure.get_skipped_rows() 
+                             if i < structure.start_idx]
+        
+        self.__line_idx = structure.start_idx
+        self.__process(structure.get_text(structure.start_idx, 
+                                          structure.n_lines))
+    
+    
+    def __new_columns(self):
+        return [arrays.TokenColumnBuilder(spill_size=None) 
+                for i in range(self.__n_cols)]
+    
+    
+    def __read_lines(self, n_bytes):
+        #reads about n_bytes from the file, returning only complete lines
+        data = self.ifp.read(n_bytes)
+        if len(data) < n_bytes:
+            #reached the end of the file
+            self.__eof = True
+            text, self.__carry = self.__carry + data, ''
+            return text
+        
+        text = self.__carry + data
+        end = text.rfind('\n') + 1
+        self.__carry = text[end:]
+        return text[:end]
+    
+    
+    def __process(self, text):
+        #splits the data lines in text into words and keeps track of any 
+        #invalid lines
+        line_offsets, line_n_cols, line_comments = scan_lines(text)[:3]
+        is_comment, is_data = find_data_lines(line_n_cols, line_comments, 
+                                              self.__n_cols, self.__comment_idx)
+        invalid_idxs = numpy.flatnonzero(numpy.logical_not(is_data))
+        data_idxs = numpy.flatnonzero(is_data)
+        
+        get_line = lambda i: (self.__line_idx + i, 
+                              text[line_offsets[i]:line_offsets[i + 1]])
+        
+        if len(data_idxs) > 0:
+            #any invalid lines before the last data line are within the data
+            end_idx = data_idxs[-1] + 1
+            lines_to_skip = invalid_idxs[invalid_idxs < end_idx].tolist()
+            self.skipped_rows.extend(self.__trailing_lines)
+            self.skipped_rows.extend([get_line(i) for i in lines_to_skip])
+            split_columns(text, line_offsets, 0, end_idx, lines_to_skip, 
+                          self.__columns)
+            self.__trailing_lines = []
+            invalid_idxs = invalid_idxs[invalid_idxs >= end_idx]
+        
+        #invalid lines after the data form the footer (unless more data
+        #follows them)
+        self.__trailing_lines.extend([get_line(i) for i in invalid_idxs])
+        self.__line_idx += len(line_offsets) - 1
+    
+    
+    def read_chunk(self, n_rows):
+        n_pending = lambda: len(self.__columns[0]) if self.__columns else 0
+        while self.__columns and n_pending() < n_rows and not self.__eof:
+            self.__process(self.__read_lines(STREAM_BLOCK_SIZE))
+        
+        if n_pending() == 0:
+            self.footer = ''.join([l for i, l in self.__trailing_lines])
+            return None
+        
+        columns = [c.get_column() for c in self.__columns]
+        
+        #keep any rows beyond n_rows for the next chunk
+        self.__columns = self.__new_columns()
+        for builder, c in zip(self.__columns, columns):
+            builder.append(c[n_rows:])
+        
+        return [c[:n_rows] for c in columns]
+
+
+
+class TextFileFollower:
+    """
+    Reads the rows that are appended to a text file after it has been loaded,
+    for following files that are still being written to (e.g. log files). 
+    Reading starts at offset (the number of bytes of the file that were 
+    loaded, see loader.FileContents.n_bytes) and each call to read_new_rows()
+    only reads the bytes that have been appended since the last one. Rows are
+    only read once they are complete (i.e. their newline has been written).
+    
+    The new lines are split into n_cols columns, skipping any that start with
+    comment_symbol or do not have n_cols words. Raises IOError if the file is
+    not a text file.
+    """
+    def __init__(self, filename, offset, n_cols, comment_symbol=None):
+        with open(filename, 'rb') as ifp:
+            head = ifp.read(SAMPLE_SIZE)
+            if (decompress.get_compression(head) is not None or 
+                is_binary(head)):
+                raise IOError("Cannot follow %s. Only uncompressed text files "
+                              "can be followed."%filename)
+            
+            #if the file was loaded part way through a line, then the start of 
+            #it has been loaded already
+            self.__in_line = False
+            if offset > 0:
+                ifp.seek(offset - 1)
+                self.__in_line = ifp.read(1) != '\n'
+        
+        self.filename = filename
+        self.offset = offset
+        self.__n_cols = n_cols
+        if comment_symbol in COMMENT_SYMBOLS:
+            self.__comment_idx = COMMENT_SYMBOLS.index(comment_symbol)
+        else:
+            self.__comment_idx = -1
+    
+    
+    def read_new_rows(self):
+        """
+        Returns a list of arrays.TokenColumn objects containing the rows that
+        have been appended to each column of the file, or None if there are 
+        no new rows. Raises IOError if the file has been truncated (e.g. 
+        replaced by a new file).
+        """
+        size = os.path.getsize(self.filename)
+        if size < self.offset:
+            raise IOError("%s has been truncated."%self.filename)
+        if size == self.offset:
+            return None
+        
+        with open(self.filename, 'rb') as ifp:
+            ifp.seek(self.offset)
+            text = ifp.read(size - self.offset)
+        
+        #leave any incomplete line until the next read
+        end = text.rfind('\n') + 1
+        if end == 0:
+            return None
+        text = text[:end]
+        self.offset += end
+        
+        if self.__in_line:
+            text = text[text.find('\n') + 1:]
+            self.__in_line = False
+        
+        line_offsets, line_n_cols, line_comments = scan_lines(text)[:3]
+        is_comment, is_data = find_data_lines(line_n_cols, line_comments, 
+                                              self.__n_cols, self.__comment_idx)
+        if not is_data.any():
+            return None
+        
+        columns = [arrays.TokenColumnBuilder(spill_size=None) 
+                   for i in range(self.__n_cols)]
+        split_columns(text, line_offsets, 0, len(line_offsets) - 1, 
+                      numpy.flatnonzero(numpy.logical_not(is_data)).tolist(), 
+                      columns)
+        return [c.get_column() for c in columns]
+
+
         
 loader.register_loader(TextFileLoader())        
\ No newline at end of file
@@ -0,0 +1,270 @@
+#Copyright (C) Nial Peters 2013
+#
+#This file is part of AvoPlot.
+#
+#AvoPlot is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#AvoPlot is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with AvoPlot.  If not, see <http://www.gnu.org/licenses/>.
+"""
+The "From file" plugin, for plotting data from files that are loaded using the
+loaders defined in the loader, txt_file_loader and binary_file_loader modules.
+"""
+import os
+import multiprocessing
+import wx
+import avoplot
+from avoplot.figure import AvoPlotFigure
+from avoplot.plugins import AvoPlotPluginSimple
+from avoplot.series import XYDataSeries
+from avoplot.persist import PersistentStorage
+from column_selector import TxtFileDataSeriesSelectFrame, wait_for_loader
+from follow import FileFollowTimer
+import loader
+from txt_file_loader import STREAMING_THRESHOLD, TextFileFollower
+
+#required otherwise plugin will not be loaded!
+plugin_is_GPL_compatible = True
+
+
+class TextFilePlugin(AvoPlotPluginSimple):
+    def __init__(self):
+        AvoPlotPluginSimple.__init__(self,"Text File", XYDataSeries)
+        self.set_menu_entry(['From file'], "Plot data from a file")
+        
+        #timers for the files that are being followed (they stop once the 
+        #series plotted from the file have been deleted)
+        self.__follow_timers = []
+    
+    
+    def plot_into_subplot(self, subplot):
+        
+        file_series, follow_timer = self.get_file_series()
+        
+        if not file_series:
+            return False
+        
+        if (len(file_series) > 1 and 
+            wx.MessageBox("Plot each file in a separate figure?", 
+                          avoplot.PROG_SHORT_NAME, 
+                          wx.YES_NO | wx.ICON_QUESTION) == wx.YES):
+            for filename, data_series in file_series[1:]:
+                self.plot_into_new_figure(os.path.basename(filename), 
+                                          data_series)
+            file_series = file_series[:1]
+        
+        for filename, data_series in file_series:
+            for s in data_series:
+                subplot.add_data_series(s)
+        
+        if follow_timer is not None:
+            follow_timer.start()
+            self.__follow_timers = [t for t in self.__follow_timers 
+                                    if t.IsRunning()]
+            self.__follow_timers.append(follow_timer)
+        
+        return True
+    
+    
+    def plot_into_new_figure(self, name, data_series):
+        """
+        Plots the data series into a subplot of a new figure called name, and
+        adds it to the main window.
+        """
+        fig = AvoPlotFigure(self.get_figure_parent(), name)
+        subplot_type = XYDataSeries.get_supported_subplot_type()
+        subplot = subplot_type(fig, name)
+        for s in data_series:
+            subplot.add_data_series(s)
+        self.show_figure(fig)
+    
+    
+    def get_data_series(self):
+        file_series = self.get_file_series()[0]
+        if file_series:
+            return [s for filename, data_series in file_series 
+                    for s in data_series]
+    
+    
+    def get_file_series(self):
+        """
+        Asks the user to choose one or more files and select the data to plot 
+        from them. Returns a tuple of (file series, follow timer) where file
+        series is a list of (filename, data series list) tuples, or None if 
+        the user cancelled. When several files are chosen, the data is 
+        selected from the first of them and the same selections are then
+        loaded from the rest. 
+        
+        If the user chose to follow the (first) file, then follow timer is a 
+        follow.FileFollowTimer object which should be started once the series
+        have been plotted, otherwise it is None.
+        """
+        persistant_storage = PersistentStorage()
+        
+        try:
+            last_path_used = persistant_storage.get_value("fromfile_last_dir_used")
+        except KeyError:
+            last_path_used = ""
+        
+        #get filenames to open
+        file_dialog = wx.FileDialog(self.get_parent(), "Choose file(s) to open",
+                                    defaultDir=last_path_used, 
+                                    style=wx.FD_OPEN | wx.FD_MULTIPLE)
+        try:
+            if file_dialog.ShowModal() != wx.ID_OK:
+                return None, None
+            files_to_open = file_dialog.GetPaths()
+        finally:
+            file_dialog.Destroy()
+        
+        if not files_to_open:
+            return None, None
+        file_to_open = files_to_open[0]
+        
+        persistant_storage.set_value("fromfile_last_dir_used", os.path.dirname(file_to_open))
+        
+        #the file is loaded in a separate thread so that the GUI stays 
+        #responsive. Large files are loaded in chunks, so that the first part 
+        #of the file can be displayed while the rest loads
+        bg_loader = loader.BackgroundLoader(file_to_open, streaming=(
+                        os.path.getsize(file_to_open) > STREAMING_THRESHOLD))
+        bg_loader.start()
+        
+        wait_for_loader(self.get_parent(), bg_loader)
+        try:
+            contents = bg_loader.get_contents()
+        except loader.LoadCancelledError:
+            return None, None
+        except Exception, e:
+            wx.MessageBox("Failed to load %s. Error was: %s"%(file_to_open, e),
+                          "AvoPlot", wx.ICON_ERROR)
+            return None, None
+        
+        series_select_dialog = TxtFileDataSeriesSelectFrame(self.get_parent(), 
+                                                            contents, bg_loader)
+        
+        try:
+            if series_select_dialog.ShowModal() != wx.ID_OK:
+                return None, None
+        
+            data_series = series_select_dialog.get_series()
+            selections = series_select_dialog.get_selections()
+            file_series = [(file_to_open, data_series)]
+            if len(files_to_open) > 1:
+                other_series = self.load_files(files_to_open[1:], selections)
+                if other_series is None:
+                    return None, None
+                file_series.extend(other_series)
+        
+            follow_timer = None
+            if series_select_dialog.follow_file():
+                follow_timer = self.create_follow_timer(file_to_open, contents, 
+                                                        data_series, selections)
+            return file_series, follow_timer
+        finally:
+            #columns that are read from the file on demand keep it open until
+            #the contents are closed (they open it again if they are needed 
+            #later on, e.g. when following the file). Contents that are still 
+            #being streamed are closed by the loader once it is cancelled.
+            if bg_loader.is_complete():
+                contents.close()
+    
+    
+    def create_follow_timer(self, filename, contents, data_series, selections):
+        """
+        Returns a follow.FileFollowTimer object for adding rows appended to
+        the file to the data series that were plotted from its contents using 
+        selections (a list of (x, y) selection strings for each series), or 
+        None if the file cannot be followed.
+        """
+        try:
+            if contents.n_bytes is None:
+                raise IOError("The file was not loaded completely.")
+            if contents.comment_symbols:
+                comment_symbol = contents.comment_symbols[0]
+            else:
+                comment_symbol = None
+            file_follower = TextFileFollower(filename, contents.n_bytes, 
+                                             contents.get_number_of_columns(), 
+                                             comment_symbol)
+        except IOError, e:
+            wx.MessageBox("Cannot follow %s. Error was: %s"%(
+                                                os.path.basename(filename), e),
+                          avoplot.PROG_SHORT_NAME, wx.ICON_ERROR)
+            return None
+        
+        follow_timer = FileFollowTimer(file_follower, contents)
+        followed = [follow_timer.add_series(s, x, y) 
+                    for s, (x, y) in zip(data_series, selections)]
+        if not any(followed):
+            wx.MessageBox("None of the series will be updated as %s is "
+                          "appended to, since their selections have upper "
+                          "bounds (use e.g. \"A[:]\" to select the whole of "
+                          "a column)."%os.path.basename(filename),
+                          avoplot.PROG_SHORT_NAME, wx.ICON_INFORMATION)
+            return None
+        return follow_timer
+    
+    
+    def load_files(self, filenames, selections):
+        """
+        Loads the data selected by selections (a list of (x, y) selection 
+        strings) from each of the files, parsing the files concurrently in 
+        worker processes (or threads, see batch.create_pool()). Returns a 
+        list of (filename, data series list) tuples for the files that were 
+        loaded successfully, or None if the user cancelled.
+        """
+        #batch imports this package, so can't be imported at the top of it
+        from avoplot import batch
+        
+        progress_dialog = wx.ProgressDialog(avoplot.PROG_SHORT_NAME, 
+                                            "Loading %d files"%len(filenames),
+                                            maximum=len(filenames), 
+                                            parent=self.get_parent(), 
+                                            style=(wx.PD_CAN_ABORT | 
+                                                   wx.PD_APP_MODAL | 
+                                                   wx.PD_ELAPSED_TIME))
+        pool = batch.create_pool(len(filenames))
+        file_series = []
+        errors = []
+        try:
+            results = batch.imap_series_data(filenames, selections, pool)
+            for i, filename in enumerate(filenames):
+                msg = "Loading %s (%d of %d)"%(os.path.basename(filename), 
+                                               i + 1, len(filenames))
+                while True:
+                    keep_going, skip = progress_dialog.Update(i, msg)
+                    if not keep_going:
+                        return None
+                    try:
+                        data, error = results.next(timeout=0.1)
+                        break
+                    except multiprocessing.TimeoutError:
+                        pass
+                
+                if error is not None:
+                    errors.append(error)
+                    continue
+                
+                name = os.path.basename(filename)
+                file_series.append((filename, [XYDataSeries(name, xdata=x, 
+                                                            ydata=y) 
+                                               for x, y in data]))
+            pool.close()
+        finally:
+            pool.terminate()
+            progress_dialog.Destroy()
+        
+        if errors:
+            wx.MessageBox("\n".join(errors), avoplot.PROG_SHORT_NAME, 
+                          wx.ICON_ERROR)
+        return file_series
+            
@@ -0,0 +1,325 @@
+#Copyright (C) Nial Peters 2013
+#
+#This file is part of AvoPlot.
+#
+#AvoPlot is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#AvoPlot is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with AvoPlot.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Preprocessing pipelines for data series. A pipeline is an ordered list of 
+stages (e.g. unit conversion, baseline subtraction, smoothing, cropping), each
+of which transforms the output of the stage before it. The output of each 
+stage is cached, so that changing a parameter of one stage only reruns that 
+stage and the ones after it, rather than the whole pipeline. 
+
+Stages must not modify their input data in place (it is passed to them as
+read-only arrays) since it is the cached output of the previous stage.
+"""
+import time
+import numpy
+
+
+class PreprocessingStage(object):
+    """
+    Base class for preprocessing stages - must be subclassed.
+    
+    * name - a string describing the stage, this will be displayed in the 
+             preprocessing control panel of the series.
+    * params - the parameters of the stage (see set_parameters()).
+    """
+    def __init__(self, name, **params):
+        self.__name = name
+        self.__params = params
+        self.__enabled = True
+        self.__version = 0
+        self.__last_run_time = None
+        self.__pipeline = None
+    
+    
+    def get_name(self):
+        return self.__name
+    
+    
+    def get_parameters(self):
+        """
+        Returns a dict of the parameters of the stage.
+        """
+        return dict(self.__params)
+    
+    
+    def set_parameters(self, **params):
+        """
+        Sets the values of the named parameters of the stage. Only this stage
+        and the ones after it are rerun the next time the data of the series
+        is requested. Note that you need to call the update() method of the 
+        series to draw the changes to the screen.
+        """
+        self.__params.update(params)
+        self.__changed()
+    
+    
+    def is_enabled(self):
+        return self.__enabled
+    
+    
+    def set_enabled(self, enabled):
+        """
+        Enables or disables the stage. Disabled stages pass their input data
+        through unchanged.
+        """
+        if enabled != self.__enabled:
+            self.__enabled = enabled
+            self.__changed()
+    
+    
+    def get_version(self):
+        """
+        Returns a number which is incremented every time that the stage is 
+        changed (its parameters are set or it is enabled/disabled).
+        """
+        return self.__version
+    
+    
+    def get_last_run_time(self):
+        """
+        Returns the time (in seconds) that the stage took to process the data
+        the last time that it was run, or None if it has not been run yet.
+        """
+        return self.__last_run_time
+    
+    
+    def run(self, xdata, ydata):
+        """
+        Returns the output of process() for the data (or the data itself if 
+        the stage is disabled) and records how long it took.
+        """
+        if not self.__enabled:
+            return xdata, ydata
+        
+        start_time = time.time()
+        xdata, ydata = self.process(xdata, ydata)
+        self.__last_run_time = time.time() - start_time
+        return xdata, ydata
+    
+    
+    def process(self, xdata, ydata):
+        """
+        Returns a tuple of the processed (xdata, ydata). This must be 
+        overridden by subclasses. Note that xdata and ydata are read-only, 
+        the output must be new arrays (or the input arrays unchanged).
+        """
+        raise NotImplementedError("Subclasses should override the process "
+                                  "method of PreprocessingStage")
+    
+    
+    def _set_pipeline(self, pipeline):
+        if pipeline is not None and self.__pipeline is not None:
+            raise ValueError("Stage \'%s\' is already part of a preprocessing "
+                             "pipeline"%self.__name)
+        self.__pipeline = pipeline
+    
+    
+    def __changed(self):
+        self.__version += 1
+        if self.__pipeline is not None:
+            self.__pipeline.on_stage_change(self)
+
+
+
+class ScaleStage(PreprocessingStage):
+    """
+    Unit conversion: xdata -> xdata * x_scale + x_offset and similarly for 
+    ydata.
+    """
+    def __init__(self, name='Scale', x_scale=1.0, x_offset=0.0, y_scale=1.0,
+                 y_offset=0.0):
+        super(ScaleStage, self).__init__(name, x_scale=x_scale, 
+                                         x_offset=x_offset, y_scale=y_scale,
+                                         y_offset=y_offset)
+    
+    
+    def process(self, xdata, ydata):
+        p = self.get_parameters()
+        return (xdata * p['x_scale'] + p['x_offset'], 
+                ydata * p['y_scale'] + p['y_offset'])
+
+
+
+class BaselineStage(PreprocessingStage):
+    """
+    Subtracts a polynomial baseline of the given degree from the ydata. The
+    baseline is fitted to the points with xdata within any of the (min, max)
+    ranges in fit_ranges, or to all the points if fit_ranges is None.
+    """
+    def __init__(self, name='Baseline', degree=1, fit_ranges=None):
+        super(BaselineStage, self).__init__(name, degree=degree, 
+                                            fit_ranges=fit_ranges)
+    
+    
+    def process(self, xdata, ydata):
+        p = self.get_parameters()
+        if p['fit_ranges'] is None:
+            mask = numpy.ones(len(xdata), dtype='bool')
+        else:
+            mask = numpy.zeros(len(xdata), dtype='bool')
+            for x_min, x_max in p['fit_ranges']:
+                mask |= numpy.logical_and(xdata >= x_min, xdata <= x_max)
+        
+        if numpy.count_nonzero(mask) <= p['degree']:
+            raise ValueError("Not enough points to fit a baseline of degree "
+                             "%d"%p['degree'])
+        
+        baseline = numpy.poly1d(numpy.polyfit(xdata[mask], ydata[mask], 
+                                              p['degree']))
+        return xdata, ydata - baseline(xdata)
+
+
+
+class SmoothStage(PreprocessingStage):
+    """
+    Smooths the ydata using a moving average of window_size points (centred
+    on each point). The window is truncated at the ends of the data.
+    """
+    def __init__(self, name='Smooth', window_size=5):
+        super(SmoothStage, self).__init__(name, window_size=window_size)
+    
+    
+    def process(self, xdata, ydata):
+        n = len(ydata)
+        half_width = self.get_parameters()['window_size'] // 2
+        if n == 0 or half_width < 1:
+            return xdata, ydata
+        
+        #moving sums from the cumulative sum, which is O(n) for any window size
+        cumsum = numpy.concatenate(([0.0], numpy.cumsum(ydata, dtype='float')))
+        idxs = numpy.arange(n)
+        lower = numpy.maximum(idxs - half_width, 0)
+        upper = numpy.minimum(idxs + half_width + 1, n)
+        return xdata, (cumsum[upper] - cumsum[lower]) / (upper - lower)
+
+
+
+class CropStage(PreprocessingStage):
+    """
+    Removes the points with xdata outside of the range x_min to x_max. Either
+    limit may be None, in which case the data is not cropped at that end.
+    """
+    def __init__(self, name='Crop', x_min=None, x_max=None):
+        super(CropStage, self).__init__(name, x_min=x_min, x_max=x_max)
+    
+    
+    def process(self, xdata, ydata):
+        p = self.get_parameters()
+        mask = numpy.ones(len(xdata), dtype='bool')
+        if p['x_min'] is not None:
+            mask &= xdata >= p['x_min']
+        if p['x_max'] is not None:
+            mask &= xdata <= p['x_max']
+        return xdata[mask], ydata[mask]
+
+
+
+class PreprocessingPipeline(object):
+    """
+    Ordered list of PreprocessingStage objects which are run in turn on the
+    data of a series. The output of each stage is cached along with the 
+    versions of the data and of the stages that produced it. on_change is 
+    called (with no arguments) whenever the output of the pipeline changes 
+    because stages have been added, removed or changed.
+    """
+    def __init__(self, on_change=None):
+        self.__stages = []
+        self.__cache = [] #(key, xdata, ydata) for the output of each stage
+        self.__on_change = on_change
+    
+    
+    def get_stages(self):
+        """
+        Returns a list of the stages in the pipeline, in the order that they
+        are run.
+        """
+        return list(self.__stages)
+    
+    
+    def add_stage(self, stage, index=None):
+        """
+        Inserts the stage into the pipeline at position index (or at the end
+        if index is None).
+        """
+        if index is None:
+            index = len(self.__stages)
+        stage._set_pipeline(self)
+        self.__stages.insert(index, stage)
+        self.__invalidate(index)
+    
+    
+    def remove_stage(self, stage):
+        index = self.__stages.index(stage)
+        self.__stages.pop(index)
+        stage._set_pipeline(None)
+        self.__invalidate(index)
+    
+    
+    def on_stage_change(self, stage):
+        #the cached output of the stage (and later stages) is no longer valid, 
+        #but this is detected by run() from the stage's version number
+        if self.__on_change is not None:
+            self.__on_change()
+    
+    
+    def run(self, xdata, ydata, data_version):
+        """
+        Runs the data through the pipeline and returns the read-only output 
+        of the final stage. data_version must change whenever the data 
+        changes, and is used to decide whether the cached output of each 
+        stage is still valid. Only the stages which have changed (and those 
+        after them) are rerun.
+        """
+        xdata, ydata = read_only_view(xdata), read_only_view(ydata)
+        key = (data_version,)
+        
+        for i, stage in enumerate(self.__stages):
+            key += ((stage.get_version(), stage.is_enabled()),)
+            
+            if i < len(self.__cache) and self.__cache[i][0] == key:
+                xdata, ydata = self.__cache[i][1:]
+                continue
+            
+            xdata, ydata = stage.run(xdata, ydata)
+            xdata, ydata = read_only_view(xdata), read_only_view(ydata)
+            
+            #all the later cached outputs depend on this one
+            del self.__cache[i:]
+            self.__cache.append((key, xdata, ydata))
+        
+        return xdata, ydata
+    
+    
+    def get_cached_data(self):
+        """
+        Returns a list of the (xdata, ydata) outputs of the stages that are
+        cached by the pipeline (e.g. for working out its memory usage).
+        """
+        return [c[1:] for c in self.__cache]
+    
+    
+    def __invalidate(self, index):
+        del self.__cache[index:]
+        if self.__on_change is not None:
+            self.__on_change()
+
+
+def read_only_view(data):
+    #returns a view of data which cannot be used to modify it
+    view = numpy.asanyarray(data).view()
+    view.flags.writeable = False
+    return view
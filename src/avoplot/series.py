@@ -30,6 +30,10 @@ from avoplot import subplots
 from avoplot import figure
 from avoplot import fitting
 from avoplot import data_selection
+from avoplot import preprocessing
+from avoplot import decimation
+from avoplot import buffers
+from avoplot import storage
 from avoplot.gui import linestyle_editor
 from avoplot.persist import PersistentStorage
 
@@ -173,12 +177,76 @@ class DataSeriesBase(core.AvoPlotElementBase):
 
 
 
+def _is_time(data):
+    #returns True if data is an array of datetime64 values or datetime objects
+    return data.dtype.kind == 'M' or (len(data) > 0 and 
+                                      isinstance(data[0], datetime))
+
+
+def _append(data, buffer, start, values, max_points, policy, compact=False):
+    #appends values to data, which is either buffer[start:start + len(data)]
+    #(see buffers.append()) or a storage.RegularSamples object, returning a
+    #tuple of (data, buffer, start) for the new data. If compact is True then
+    #regularly spaced data is kept as a storage.RegularSamples object.
+    new_data = None
+    if isinstance(data, storage.RegularSamples):
+        new_data = data.extend(values)
+        if new_data is None:
+            #the values don't continue the sequence
+            buffer, start = numpy.asarray(data), 0
+    
+    elif compact and len(data) < 2:
+        #not enough data to know its spacing until now
+        new_data = storage.RegularSamples.from_array(
+                                numpy.concatenate((data, values)),
+                                storage.get_dtype(values, policy))
+    
+    if new_data is not None:
+        if max_points is not None:
+            new_data = new_data[max(len(new_data) - max_points, 0):]
+        return new_data, None, 0
+    
+    buffer, start, stop = buffers.append(buffer, start, start + len(data), 
+                                    storage.convert(values, policy, False),
+                                    max_points)
+    return buffer[start:stop], buffer, start
+
+
+
 class XYDataSeries(DataSeriesBase):
     """
-    Class to represent 2D XY data series.
+    Class to represent 2D XY data series. If max_points is not None, then 
+    only the most recent max_points points are kept when data is appended to 
+    the series (see set_max_points()). The storage_policy and compact_x 
+    arguments control how the data is stored (see set_storage_policy() and
+    set_compact_x()).
     """
-    def __init__(self, name, xdata=None, ydata=None):
+    def __init__(self, name, xdata=None, ydata=None, max_points=None,
+                 storage_policy=storage.PRESERVE, compact_x=False):
         super(XYDataSeries, self).__init__(name)
+        self.__max_points = max_points
+        self.__storage_policy = storage_policy
+        self.__compact_x = compact_x
+        
+        #the output of preprocess() is cached until the data (or the 
+        #preprocessing) changes - see get_data_version()
+        self.__data_version = 0
+        self.__preprocessed_version = None
+        self.__preprocessed = None
+        
+        #version of the raw data only, used to decide whether the cached 
+        #outputs of the stages of the preprocessing pipeline are still valid
+        self.__raw_version = 0
+        self.__pipeline = preprocessing.PreprocessingPipeline(
+                                            self.invalidate_preprocessed_data)
+        
+        #long series are decimated for plotting (see __update_plot_data())
+        self.__pyramid = None
+        self.__pyramid_version = None
+        self.__undecimatable = False
+        self.__plotted_view = None
+        self.__draw_hook = None
+        
         self.set_xy_data(xdata, ydata)
         self.add_control_panel(XYSeriesControls(self))
         self.add_control_panel(XYSeriesFittingControls(self))
@@ -195,7 +263,10 @@ class XYDataSeries(DataSeriesBase):
     
     def copy(self):
         x,y = self.get_data()
-        return XYDataSeries(self.get_name(), xdata=x, ydata=y)
+        return XYDataSeries(self.get_name(), xdata=x, ydata=y, 
+                            max_points=self.get_max_points(),
+                            storage_policy=self.get_storage_policy(),
+                            compact_x=self.get_compact_x())
     
     
     def set_xy_data(self, xdata=None, ydata=None):
@@ -203,7 +274,9 @@ class XYDataSeries(DataSeriesBase):
         Sets the x and y values of the data series. Note that you need to call
         the update() method to draw the changes to the screen. Note that xdata 
         and ydata may be masked arrays (numpy.ma.masked_array) but only the 
-        unmasked values will be stored.
+        unmasked values will be stored. The data is copied, and stored 
+        according to the storage policy of the series (see 
+        set_storage_policy()).
         """
         if xdata is None and ydata is None:
             xdata = numpy.array([])
@@ -218,26 +291,234 @@ class XYDataSeries(DataSeriesBase):
         else:
             assert len(xdata) == len(ydata)
         
-        #if either of the arrays are masked - then skip the masked values
-        if numpy.ma.is_masked(xdata):
-            xmask = xdata.mask
+        if self.__max_points is not None:
+            xdata = xdata[max(len(xdata) - self.__max_points, 0):]
+            ydata = ydata[max(len(ydata) - self.__max_points, 0):]
+        
+        copy = True
+        if numpy.ma.is_masked(xdata) or numpy.ma.is_masked(ydata):
+            xdata, ydata = storage.remove_masked(xdata, ydata)
+            copy = False
+        
+        policy = self.__storage_policy
+        self.__ydata = storage.convert(ydata, policy, copy)
+        
+        self.__xdata = None
+        if self.__compact_x:
+            self.__xdata = storage.RegularSamples.from_array(xdata, 
+                                            storage.get_dtype(xdata, policy))
+        if self.__xdata is None:
+            self.__xdata = storage.convert(xdata, policy, copy)
+        
+        #the buffers that the data are stored in (see append_xy_data()) - 
+        #there is no x buffer if the x data is stored compactly - and the 
+        #number of points that have been dropped from the start of the data 
+        #by appending since it was set
+        if isinstance(self.__xdata, storage.RegularSamples):
+            self.__xbuffer = None
         else:
-            xmask = numpy.zeros(len(xdata))
-            
-        if numpy.ma.is_masked(ydata):
-            ymask = ydata.mask
+            self.__xbuffer = self.__xdata
+        self.__ybuffer = self.__ydata
+        self.__xbuffer_start = self.__ybuffer_start = 0
+        self.__n_dropped = 0
+        
+        self.__raw_version += 1
+        self.invalidate_preprocessed_data()
+    
+    
+    def append_xy_data(self, xdata, ydata):
+        """
+        Appends values to the end of the x and y data of the series, e.g. new 
+        rows of a file which is still being written to. As for set_xy_data(),
+        masked values are skipped and you need to call the update() method to
+        draw the changes. If the series has a maximum number of points (see 
+        set_max_points()) then the oldest points are dropped to make room for
+        the new ones.
+        
+        Space is reserved for future appends, so that the time taken 
+        (including updating the plotted line) depends on the number of values 
+        appended rather than the length of the series, unless the series has 
+        any preprocessing, which is rerun on all of the data.
+        """
+        assert len(xdata) == len(ydata)
+        if numpy.ma.is_masked(xdata) or numpy.ma.is_masked(ydata):
+            xdata, ydata = storage.remove_masked(xdata, ydata)
+        
+        old_length = len(self.__xdata)
+        self.__xdata, self.__xbuffer, self.__xbuffer_start = _append(
+                                    self.__xdata, self.__xbuffer, 
+                                    self.__xbuffer_start, xdata, 
+                                    self.__max_points, self.__storage_policy, 
+                                    compact=self.__compact_x)
+        self.__ydata, self.__ybuffer, self.__ybuffer_start = _append(
+                                    self.__ydata, self.__ybuffer, 
+                                    self.__ybuffer_start, ydata, 
+                                    self.__max_points, self.__storage_policy)
+        
+        self.__n_dropped += old_length + len(xdata) - len(self.__xdata)
+        
+        self.__raw_version += 1
+        if self.__has_preprocessing():
+            self.invalidate_preprocessed_data()
         else:
-            ymask = numpy.zeros(len(ydata))
+            #the decimation of the data can be updated rather than redone
+            self.__data_changed()
+    
+    
+    def set_max_points(self, max_points):
+        """
+        Sets the maximum number of points that the series holds, or None for
+        no limit. When data is appended to a series (see append_xy_data()) 
+        which has reached its maximum size, the oldest points are dropped, 
+        e.g. so that data can be plotted live as it is acquired for as long as 
+        needed without running out of memory. If the series holds more than
+        max_points points already, then the oldest ones are dropped.
+        """
+        if max_points is not None and max_points < 1:
+            raise ValueError("max_points must be at least 1")
         
-        data_mask = numpy.logical_not(numpy.logical_or(xmask, ymask))
-        data_idxs = numpy.where(data_mask)
-        self.__xdata = numpy.array(xdata)[data_idxs]
-        self.__ydata = numpy.array(ydata)[data_idxs]
+        self.__max_points = max_points
+        if max_points is not None and len(self.__xdata) > max_points:
+            self.set_xy_data(self.__xdata, self.__ydata)
+    
+    
+    def get_max_points(self):
+        """
+        Returns the maximum number of points that the series holds, or None
+        if there is no limit (see set_max_points()).
+        """
+        return self.__max_points
+    
+    
+    def set_storage_policy(self, policy):
+        """
+        Sets the storage policy for the data of the series, which is one of 
+        the policies defined in the storage module: storage.PRESERVE (the
+        default) stores the data with the dtype that it is given in, and
+        storage.FLOAT32 stores floating point data as float32, which halves
+        the memory needed for it. The data already held by the series is 
+        converted, but note that precision lost by converting to float32 is 
+        not regained by changing the policy back.
+        """
+        if policy not in storage.POLICIES:
+            raise ValueError("Unknown storage policy \'%s\'"%policy)
         
-        if self.is_plotted():
+        self.__storage_policy = policy
+        self.set_xy_data(self.__xdata, self.__ydata)
+    
+    
+    def get_storage_policy(self):
+        """
+        Returns the storage policy of the series (see set_storage_policy()).
+        """
+        return self.__storage_policy
+    
+    
+    def set_compact_x(self, compact_x):
+        """
+        If compact_x is True, then regularly spaced x data (e.g. the sample 
+        times of data acquired at a fixed rate) is stored as a 
+        storage.RegularSamples object rather than an array, so that it needs
+        almost no memory. The x data is still returned as an array by 
+        get_raw_data() and get_data(), but is plotted without creating one.
+        """
+        self.__compact_x = compact_x
+        self.set_xy_data(self.__xdata, self.__ydata)
+    
+    
+    def get_compact_x(self):
+        """
+        Returns True if regularly spaced x data is stored compactly (see 
+        set_compact_x()).
+        """
+        return self.__compact_x
+    
+    
+    def get_memory_usage(self):
+        """
+        Returns the number of bytes of memory used by the data of the series,
+        including the space reserved for appending to it (see 
+        append_xy_data()), the cached output of its preprocessing and the 
+        data used for decimating it when it is plotted.
+        """
+        arrays = [self.__xbuffer, self.__ybuffer]
+        for cached_data in self.__pipeline.get_cached_data():
+            arrays.extend(cached_data)
+        if self.__preprocessed is not None:
+            arrays.extend(self.__preprocessed)
+        
+        n_bytes = storage.nbytes(*arrays)
+        if self.__pyramid is not None:
+            n_bytes += self.__pyramid.get_nbytes()
+        return n_bytes
+    
+    
+    def get_data_version(self):
+        """
+        Returns a number which is incremented every time that the data held by
+        the series (or the preprocessing of it) changes. This can be used to
+        check whether results calculated from the output of get_data() are 
+        still valid.
+        """
+        return self.__data_version
+    
+    
+    def invalidate_preprocessed_data(self):
+        """
+        Discards the cached output of preprocess() (see get_data()) and 
+        updates the data in the plotted line. This is called automatically
+        when the stages of the preprocessing pipeline are changed. Subclasses
+        whose preprocess() method depends on anything other than the data 
+        (e.g. a background spectrum that is subtracted from it) must call this
+        whenever that changes. Note that you need to call the update() method
+        to draw the changes to the screen.
+        """
+        #the data to plot has changed completely, so must be decimated again
+        self.__pyramid = None
+        self.__undecimatable = False
+        self.__data_changed()
+    
+    
+    def __data_changed(self):
+        self.__data_version += 1
+        self.__preprocessed = None
+        
+        if self.__draw_hook is not None:
             #update the the data in the plotted line
+            self.__update_plot_data()
+        
+        elif self.is_plotted():
+            #subclasses which override plot() are not decimated
             line, = self.get_mpl_lines()
-            line.set_data(*self.preprocess(self.__xdata, self.__ydata))
+            line.set_data(*self.get_data())
+    
+    
+    def add_preprocessing_stage(self, stage, index=None):
+        """
+        Inserts stage (an avoplot.preprocessing.PreprocessingStage object) 
+        into the preprocessing pipeline of the series at position index (or 
+        at the end if index is None). The pipeline is run on the data before 
+        preprocess(). Note that you need to call the update() method to draw
+        the changes to the screen.
+        """
+        if not self.__pipeline.get_stages():
+            self.add_control_panel(XYSeriesPreprocessingControls(self))
+        self.__pipeline.add_stage(stage, index)
+    
+    
+    def remove_preprocessing_stage(self, stage):
+        """
+        Removes stage from the preprocessing pipeline of the series.
+        """
+        self.__pipeline.remove_stage(stage)
+    
+    
+    def get_preprocessing_stages(self):
+        """
+        Returns a list of the stages of the preprocessing pipeline of the 
+        series, in the order that they are run.
+        """
+        return self.__pipeline.get_stages()
     
     
     def get_raw_data(self):
@@ -246,7 +527,7 @@ class XYDataSeries(DataSeriesBase):
         (without any pre-processing operations performed). In general you should
         use the get_data() method instead.
         """
-        return (self.__xdata, self.__ydata)
+        return (numpy.asarray(self.__xdata), self.__ydata)
     
     def get_length(self):
         """
@@ -258,9 +539,36 @@ class XYDataSeries(DataSeriesBase):
     def get_data(self):
         """
         Returns a tuple (xdata, ydata) of the data held by the series, with
-        any pre-processing operations applied to it.
-        """
-        return self.preprocess(self.__xdata.copy(), self.__ydata.copy())
+        any pre-processing operations applied to it (the stages of the 
+        preprocessing pipeline followed by preprocess()). The preprocessing 
+        is only run once for each version of the data (see 
+        get_data_version()), and the arrays returned are read-only, since 
+        they are shared between all the callers. Copy them if you need to 
+        modify them.
+        """
+        if self.__preprocessed_version != self.__data_version:
+            xdata, ydata = self.__pipeline.run(numpy.asarray(self.__xdata), 
+                                               self.__ydata, self.__raw_version)
+            
+            if self.__overrides_preprocess():
+                #preprocess() may modify the data in place
+                xdata, ydata = self.preprocess(numpy.array(xdata), 
+                                               numpy.array(ydata))
+            
+            self.__preprocessed = (preprocessing.read_only_view(xdata), 
+                                   preprocessing.read_only_view(ydata))
+            self.__preprocessed_version = self.__data_version
+        
+        return self.__preprocessed
+    
+    
+    def __overrides_preprocess(self):
+        return (type(self).preprocess.__func__ is not 
+                XYDataSeries.preprocess.__func__)
+    
+    
+    def __has_preprocessing(self):
+        return bool(self.__pipeline.get_stages()) or self.__overrides_preprocess()
     
     
     def preprocess(self, xdata, ydata):
@@ -274,10 +582,102 @@ class XYDataSeries(DataSeriesBase):
     
     def plot(self, subplot):
         """
-        plots the x,y data into the subplot as a line plot.
+        plots the x,y data into the subplot as a line plot. Long series are
+        decimated each time that the subplot is drawn, so that only the points
+        needed to draw the line at the current zoom level are plotted (see 
+        avoplot.decimation). get_data() still returns all of the data.
         """
-
-        return subplot.get_mpl_axes().plot(*self.get_data())
+        axes = subplot.get_mpl_axes()
+        lines = axes.plot(*self.__get_plot_data(axes))
+        
+        self.__draw_hook = decimation.DrawHook(self.__update_plot_data)
+        axes.add_artist(self.__draw_hook)
+        
+        return lines
+    
+    
+    def delete(self):
+        """
+        Overrides the base class method in order to stop updating the plotted
+        line when the subplot is drawn.
+        """
+        if self.__draw_hook is not None:
+            self.__draw_hook.remove()
+            self.__draw_hook = None
+        super(XYDataSeries, self).delete()
+    
+    
+    def __get_plot_source(self):
+        #returns the data that is decimated for plotting, which is the raw 
+        #data if there is no preprocessing, so that x data that is stored 
+        #compactly doesn't have to be expanded into an array
+        if self.__has_preprocessing():
+            return self.get_data()
+        return self.__xdata, self.__ydata
+    
+    
+    def __get_pyramid(self):
+        #returns the decimation.MinMaxPyramid for the data, or None if the
+        #data should be plotted in full
+        if self.__pyramid_version != self.__data_version:
+            xdata, ydata = self.__get_plot_source()
+            
+            if self.__pyramid is not None:
+                #data has only been appended since the pyramid was built (see
+                #invalidate_preprocessed_data()), so it can be updated
+                try:
+                    self.__pyramid.extend(xdata, ydata, self.__n_dropped)
+                except ValueError:
+                    self.__pyramid = None
+                    self.__undecimatable = True
+                    
+            elif (len(xdata) >= decimation.DECIMATION_THRESHOLD and 
+                  not self.__undecimatable):
+                if decimation.can_decimate(xdata, ydata):
+                    self.__pyramid = decimation.MinMaxPyramid(xdata, ydata, 
+                                                             self.__n_dropped)
+                else:
+                    #appending data can't make it decimatable, so don't
+                    #check again until it is replaced
+                    self.__undecimatable = True
+            
+            self.__pyramid_version = self.__data_version
+        return self.__pyramid
+    
+    
+    def __get_plot_data(self, axes, decimate=True):
+        #returns the data to plot into axes at its current x limits and size
+        pyramid = self.__get_pyramid()
+        if pyramid is None or axes.get_xscale() != 'linear':
+            return self.get_data()
+        
+        xdata, ydata = self.__get_plot_source()
+        
+        x_min, x_max = sorted(axes.get_xlim())
+        idxs = pyramid.get_indices(x_min, x_max, int(axes.bbox.width), 
+                                   decimate=decimate)
+        return xdata[idxs], ydata[idxs]
+    
+    
+    def __update_plot_data(self):
+        #updates the data of the plotted line if the data, or the x limits or
+        #size of the axes have changed since it was last set
+        line, = self.get_mpl_lines()
+        axes = line.axes
+        
+        #markers are drawn for every point, so they can't be decimated
+        has_markers = line.get_marker() not in ('None', '', ' ', None)
+        
+        if self.__get_pyramid() is None:
+            view = self.__data_version
+        else:
+            view = (self.__data_version, tuple(axes.get_xlim()), 
+                    int(axes.bbox.width), axes.get_xscale(), has_markers)
+        
+        if view != self.__plotted_view:
+            self.__plotted_view = view
+            line.set_data(*self.__get_plot_data(axes, 
+                                                decimate=not has_markers))
     
     
     def export(self):
@@ -302,8 +702,8 @@ class XYDataSeries(DataSeriesBase):
             
             with open(path, 'w') as fp:
                 
-                if isinstance(xdata[0], datetime):
-                    if isinstance(ydata[0], datetime):
+                if _is_time(xdata):
+                    if _is_time(ydata):
                         for i in range(len(xdata)):                   
                             fp.write("%s\t%s\n" %(str(xdata[i]), str(ydata[i])))
                         
@@ -312,7 +712,7 @@ class XYDataSeries(DataSeriesBase):
                             fp.write("%s\t%f\n" %(str(xdata[i]), ydata[i]))
                 
                 else:
-                    if isinstance(ydata[0], datetime):
+                    if _is_time(ydata):
                         for i in range(len(xdata)):                 
                             fp.write("%f\t%s\n" %(xdata[i], str(ydata[i])))
 
@@ -414,6 +814,71 @@ class FitParamsCtrl(controls.AvoPlotControlPanelBase):
     
 
 
+class XYSeriesPreprocessingControls(controls.AvoPlotControlPanelBase):
+    """
+    Control panel listing the stages of the preprocessing pipeline of a series
+    along with their parameters and how long they took to run, and allowing
+    the user to enable/disable them.
+    """
+    def __init__(self, series):
+        super(XYSeriesPreprocessingControls, self).__init__("Preprocessing")
+        self.series = series
+    
+    
+    def setup(self, parent):
+        """
+        Creates all the controls in the panel
+        """
+        super(XYSeriesPreprocessingControls, self).setup(parent)
+        
+        stages_static_sizer = wx.StaticBoxSizer(wx.StaticBox(self, wx.ID_ANY, 'Stages'), wx.VERTICAL)
+        self.stages_list = wx.CheckListBox(self, wx.ID_ANY)
+        stages_static_sizer.Add(self.stages_list, 1, wx.EXPAND)
+        self.Add(stages_static_sizer, 1, wx.EXPAND|wx.ALL, border=5)
+        
+        wx.EVT_CHECKLISTBOX(self, self.stages_list.GetId(), self.on_check)
+    
+    
+    def on_display(self):
+        self.update_stages()
+    
+    
+    def update_stages(self):
+        """
+        Updates the list of stages to show their current state.
+        """
+        stages = self.series.get_preprocessing_stages()
+        labels = []
+        for stage in stages:
+            params = ', '.join(["%s=%s"%i for i in sorted(stage.get_parameters().items())])
+            run_time = stage.get_last_run_time()
+            if run_time is None:
+                labels.append("%s (%s)"%(stage.get_name(), params))
+            else:
+                labels.append("%s (%s): %.1f ms"%(stage.get_name(), params, 
+                                                  1000.0 * run_time))
+        
+        self.stages_list.Set(labels)
+        for i, stage in enumerate(stages):
+            self.stages_list.Check(i, stage.is_enabled())
+    
+    
+    def on_check(self, evnt):
+        idx = evnt.GetInt()
+        stage = self.series.get_preprocessing_stages()[idx]
+        
+        try:
+            wx.BeginBusyCursor()
+            stage.set_enabled(self.stages_list.IsChecked(idx))
+            self.series.update()
+        finally:
+            wx.EndBusyCursor()
+        
+        #show the times taken by the stages that were rerun
+        self.update_stages()
+        
+        
+
 class XYSeriesFittingControls(controls.AvoPlotControlPanelBase):
     def __init__(self, series):
         super(XYSeriesFittingControls, self).__init__("Maths")
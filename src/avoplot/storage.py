@@ -0,0 +1,265 @@
+#Copyright (C) Nial Peters 2013
+#
+#This file is part of AvoPlot.
+#
+#AvoPlot is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#AvoPlot is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with AvoPlot.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Compact storage of the data of series. The storage policy of a series 
+decides the dtype that its data is stored with, and regularly spaced data 
+(e.g. the sample times of data acquired at a fixed rate, or row numbers) can
+be stored as a RegularSamples object, which holds just the first value, the
+spacing and the number of values rather than an array of them.
+"""
+import numpy
+
+#storage policies for the data of series:
+#  PRESERVE - data is stored with the dtype it was given in
+#  FLOAT32 - floating point data is downcast to float32, which halves the 
+#            memory needed for it at the cost of precision (other data is 
+#            stored as for PRESERVE)
+PRESERVE = 'preserve'
+FLOAT32 = 'float32'
+POLICIES = (PRESERVE, FLOAT32)
+
+#how far (as a fraction of the spacing) values may be from a regular 
+#spacing and still be stored as RegularSamples (see 
+#RegularSamples.from_array()) - allows for rounding errors in the values
+REGULAR_TOLERANCE = 1e-6
+
+
+def get_dtype(data, policy):
+    """
+    Returns the dtype that data (an array or a RegularSamples object) should
+    be stored with under the storage policy.
+    """
+    if policy not in POLICIES:
+        raise ValueError("Unknown storage policy \'%s\'"%policy)
+    
+    dtype = getattr(data, 'dtype', None)
+    if dtype is None:
+        dtype = numpy.asarray(data).dtype
+    if policy == FLOAT32 and dtype.kind == 'f' and dtype.itemsize > 4:
+        return numpy.dtype(numpy.float32)
+    return dtype
+
+
+def convert(data, policy, copy=True):
+    """
+    Returns data (an array) converted to the dtype given by the storage 
+    policy. If copy is False then data is only copied if it needs converting.
+    """
+    return numpy.array(data, dtype=get_dtype(data, policy), copy=copy)
+
+
+def remove_masked(xdata, ydata):
+    """
+    Returns a tuple of (xdata, ydata) containing copies of the x and y values 
+    (which may be masked arrays), skipping any that are masked in either of 
+    them.
+    """
+    data_mask = numpy.logical_not(numpy.logical_or(
+                                            numpy.ma.getmaskarray(xdata), 
+                                            numpy.ma.getmaskarray(ydata)))
+    return numpy.asarray(xdata)[data_mask], numpy.asarray(ydata)[data_mask]
+
+
+def nbytes(*arrays):
+    """
+    Returns the number of bytes of memory used by the arrays. Memory shared 
+    between the arrays (e.g. if some are views of others) is only counted 
+    once, and anything that is not a numpy array (e.g. RegularSamples 
+    objects, which use a negligible amount of memory) is ignored.
+    """
+    bases = {}
+    for array in arrays:
+        if not isinstance(array, numpy.ndarray):
+            continue
+        while isinstance(array.base, numpy.ndarray):
+            array = array.base
+        bases[id(array)] = array.nbytes
+    return sum(bases.values())
+
+
+
+class RegularSamples(object):
+    """
+    Read-only array-like sequence of n values, regularly spaced by step
+    (which must be positive), which are items first to first + n - 1 of the 
+    sequence origin, origin + step, origin + 2 * step... Supports len(), 
+    indexing (slices give RegularSamples, integers give a single value and 
+    index arrays give an array of the values) and searchsorted(), and can 
+    be converted to an array with numpy.asarray(). For datetime64 values, 
+    origin and step are the underlying integers (in the units of the dtype).
+    """
+    def __init__(self, origin, step, first, n, dtype):
+        self.origin = origin
+        self.step = step
+        self.first = first
+        self.n = n
+        self.dtype = numpy.dtype(dtype)
+    
+    
+    @classmethod
+    def from_array(cls, values, dtype=None):
+        """
+        Returns a RegularSamples object for the values in the array, or None
+        if they are not regularly spaced (within REGULAR_TOLERANCE of the 
+        spacing) in ascending order, or are not numeric. The dtype defaults 
+        to that of values. values may also be a RegularSamples object, in 
+        which case a copy of it with the new dtype is returned.
+        """
+        if isinstance(values, RegularSamples):
+            return cls(values.origin, values.step, values.first, values.n,
+                       values.dtype if dtype is None else dtype)
+        
+        values = numpy.asarray(values)
+        if (values.ndim != 1 or len(values) < 2 or 
+            values.dtype.kind not in 'iufM'):
+            return None
+        if dtype is None:
+            dtype = values.dtype
+        
+        if values.dtype.kind == 'M':
+            if numpy.dtype(dtype) != values.dtype or numpy.isnat(values).any():
+                return None
+            values = values.view(numpy.int64)
+        
+        n = len(values)
+        span = values[-1] - values[0]
+        if values.dtype.kind == 'f':
+            step = span / float(n - 1)
+            tolerance = REGULAR_TOLERANCE * step
+        else:
+            #integers must be exactly evenly spaced
+            step, remainder = divmod(int(span), n - 1)
+            if remainder:
+                return None
+            tolerance = 0
+        
+        if not (numpy.isfinite(step) and step > 0):
+            return None
+        
+        samples = cls(values[0], step, 0, n, dtype)
+        if not samples.__matches(values, 0, tolerance):
+            return None
+        return samples
+    
+    
+    def get_values(self, start, stop):
+        """
+        Returns an array of the values from index start to stop.
+        """
+        return self.__values(numpy.arange(start, stop))
+    
+    
+    def __values(self, idxs):
+        #returns the values at the indices idxs (all values are calculated 
+        #here, so that they are always the same)
+        return ((self.first + idxs) * self.step + 
+                self.origin).astype(self.dtype, copy=False)
+    
+    
+    def __matches(self, values, start, tolerance):
+        #returns True if the values are the values from index start onwards
+        #(before they are converted to self.dtype, which may be less precise)
+        idxs = numpy.arange(start, start + len(values))
+        expected = (self.first + idxs) * self.step + self.origin
+        return bool(numpy.all(numpy.abs(values - expected) <= tolerance))
+    
+    
+    def extend(self, values):
+        """
+        Returns a RegularSamples object for the values of this one followed 
+        by the values in the array, or None if they do not continue the 
+        sequence (within REGULAR_TOLERANCE of the spacing).
+        """
+        values = numpy.asarray(values)
+        if self.dtype.kind == 'M':
+            if values.dtype.kind != 'M' or numpy.isnat(values).any():
+                return None
+            values = values.astype(self.dtype).view(numpy.int64)
+        
+        elif values.dtype.kind not in 'iuf':
+            return None
+        
+        extended = RegularSamples(self.origin, self.step, self.first, 
+                                  self.n + len(values), self.dtype)
+        if self.dtype.kind == 'f':
+            tolerance = REGULAR_TOLERANCE * self.step
+        else:
+            tolerance = 0
+        
+        if not extended.__matches(values, self.n, tolerance):
+            return None
+        return extended
+    
+    
+    def __len__(self):
+        return self.n
+    
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, stride = index.indices(self.n)
+            if stride == 1:
+                return RegularSamples(self.origin, self.step, 
+                                      self.first + start, 
+                                      max(stop - start, 0), self.dtype)
+            return self.__values(numpy.arange(start, stop, stride))
+        
+        idxs = numpy.asarray(index)
+        if idxs.dtype.kind == 'b':
+            idxs = numpy.nonzero(idxs)[0]
+        if numpy.any(idxs >= self.n) or numpy.any(idxs < -self.n):
+            raise IndexError("index out of range for RegularSamples of "
+                             "length %d"%self.n)
+        return self.__values(numpy.where(idxs < 0, idxs + self.n, idxs))[()]
+    
+    
+    def __array__(self, dtype=None):
+        values = self.get_values(0, self.n)
+        if dtype is not None:
+            return values.astype(dtype, copy=False)
+        return values
+    
+    
+    def searchsorted(self, v, side='left', sorter=None):
+        """
+        As for numpy.ndarray.searchsorted(), but takes a time independent of
+        the number of values.
+        """
+        v = numpy.asarray(v)
+        if self.dtype.kind == 'M':
+            #search the underlying integers
+            return RegularSamples.from_array(self, numpy.int64).searchsorted(
+                        v.astype(self.dtype).view(numpy.int64), side, sorter)
+        
+        positions = (v - self.origin) / float(self.step) - self.first
+        if side == 'left':
+            idxs = numpy.ceil(positions)
+        else:
+            idxs = numpy.floor(positions) + 1
+        idxs = numpy.clip(numpy.nan_to_num(idxs), 0, self.n).astype(numpy.intp)
+        
+        #correct for any rounding errors in the positions, which are at most 
+        #one value out
+        if side == 'left':
+            too_high = lambda i: self.__values(i - 1) >= v
+            too_low = lambda i: self.__values(i) < v
+        else:
+            too_high = lambda i: self.__values(i - 1) > v
+            too_low = lambda i: self.__values(i) <= v
+        idxs -= numpy.logical_and(idxs > 0, too_high(idxs))
+        idxs += numpy.logical_and(idxs < self.n, too_low(idxs))
+        return idxs[()]
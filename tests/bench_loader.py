@@ -0,0 +1,195 @@
+#Copyright (C) Nial Peters 2013
+#
+#This file is part of AvoPlot.
+#
+#AvoPlot is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#AvoPlot is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with AvoPlot.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Benchmarks for the avoplot_fromfile_plugin.loader module. These are not run as
+part of the unit tests, run them directly with:
+
+    python bench_loader.py
+"""
+
+import time
+import datetime
+import os
+import tempfile
+import shutil
+import gzip
+import bz2
+import resource
+import multiprocessing
+import numpy
+
+from avoplot.plugins.avoplot_fromfile_plugin import loader
+from avoplot.plugins.avoplot_fromfile_plugin import decompress
+
+
+def timeit(func, *args):
+    """
+    Returns the time (in seconds) taken to call func(*args).
+    """
+    t = time.time()
+    func(*args)
+    return time.time() - t
+
+
+def make_number_tokens(n_rows, invalid_fraction=0.001):
+    """
+    Returns a list of n_rows string tokens representing numbers, with a small
+    fraction of them being invalid.
+    """
+    tokens = ['%.6g' % x for x in numpy.random.randn(n_rows) * 1000.0]
+    for i in numpy.random.randint(0, n_rows, int(n_rows * invalid_fraction)):
+        tokens[i] = 'N/A'
+    return tokens
+
+
+def per_cell_to_float(data):
+    """
+    Reference implementation of loader.to_float() which converts each cell 
+    individually.
+    """
+    return numpy.ma.masked_invalid([loader._float(i) for i in data])
+
+
+def bench_to_float():
+    print "Column conversion (to_float)"
+    for n_rows in (1000000, 10000000):
+        tokens = make_number_tokens(n_rows)
+        t_ref = timeit(per_cell_to_float, tokens)
+        t_bulk = timeit(loader.to_float, tokens)
+        tokens = numpy.array(tokens)
+        t_array = timeit(loader.to_float, tokens)
+        
+        print ("  %9d rows: per-cell %6.2fs, bulk (list) %6.2fs, "
+               "bulk (array) %6.2fs"%(n_rows, t_ref, t_bulk, t_array))
+        del tokens
+
+
+def bench_to_time():
+    print "Time column conversion (to_time)"
+    n_rows = 1000000
+    times = (numpy.datetime64('2013-01-01T00:00:00') + 
+             numpy.arange(n_rows) * numpy.timedelta64(1234567, 'us'))
+    iso_tokens = numpy.datetime_as_string(times)
+    hms_tokens = numpy.array([t[11:19] for t in iso_tokens])
+    
+    for tokens, time_format in ((iso_tokens, '%Y-%m-%dT%H:%M:%S.%f'), 
+                                (hms_tokens, '%H:%M:%S')):
+        #strptime is too slow to run on all the rows
+        t_ref = timeit(lambda t: [datetime.datetime.strptime(i, time_format) 
+                                  for i in t], tokens[:n_rows // 10])
+        t_bulk = timeit(loader.to_time, tokens)
+        print ("  %9d rows (%s): strptime (estimated) %6.2fs, bulk %6.2fs"%(
+                                       n_rows, time_format, t_ref * 10, t_bulk))
+
+
+class BenchLoader(loader.FileLoaderBase):
+    def __init__(self, i):
+        self.extensions = ('.bench%d'%i,)
+        self.magic_numbers = ('BENCH%d\n'%i,)
+
+
+def bench_dispatch():
+    print "Loader dispatch (_find_loader)"
+    n_loaders = 0
+    for n_extra_loaders in (0, 100, 1000):
+        while n_loaders < n_extra_loaders:
+            loader.register_loader(BenchLoader(n_loaders))
+            n_loaders += 1
+        
+        for size in (1024, 1024**3):
+            fd, filename = tempfile.mkstemp(suffix='.txt')
+            try:
+                with os.fdopen(fd, 'wb') as ofp:
+                    ofp.write('1 2\n' * 256)
+                    ofp.truncate(size)
+                with open(filename, 'rb') as ifp:
+                    buf = loader.map_file(ifp)
+                    t_first = timeit(loader._find_loader, filename, buf)
+                    t_repeat = timeit(loader._find_loader, filename, buf)
+                    buf.close()
+            finally:
+                os.remove(filename)
+            
+            print ("  %4d extra loaders, %10d byte file: first open %7.2fms, "
+                   "repeat open %7.3fms"%(n_extra_loaders, size, 
+                                          t_first * 1000, t_repeat * 1000))
+
+
+def _load_all_columns(filename, results):
+    #loads the file and converts all of its columns, putting the time taken 
+    #and the increase in peak memory usage (in kB) into the results queue
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t = time.time()
+    contents = loader.load_file(filename, use_cache=False)
+    for col in contents.get_columns():
+        col.get_data()
+    results.put((time.time() - t, 
+                 resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - max_rss))
+
+
+def measure_load(filename):
+    """
+    Returns a tuple of (time, peak memory increase in kB) for loading the 
+    file. The file is loaded in a new process, so that the memory 
+    measurements are not affected by previous loads.
+    """
+    results = multiprocessing.Queue()
+    p = multiprocessing.Process(target=_load_all_columns, 
+                                args=(filename, results))
+    p.start()
+    result = results.get()
+    p.join()
+    return result
+
+
+def bench_compressed():
+    print "Compressed files (load_file, all columns converted)"
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(tmp_dir, 'data.txt')
+        n_rows = 2000000
+        numpy.savetxt(filename, numpy.random.randn(n_rows, 4), fmt='%.6f')
+        with open(filename, 'rb') as ifp:
+            text = ifp.read()
+        
+        ofp = gzip.GzipFile(filename + '.gz', 'wb')
+        ofp.write(text)
+        ofp.close()
+        with open(filename + '.bz2', 'wb') as ofp:
+            ofp.write(bz2.compress(text))
+        files = [('uncompressed', filename), ('gzip', filename + '.gz'), 
+                 ('bzip2', filename + '.bz2')]
+        if decompress.have_lzma:
+            with open(filename + '.xz', 'wb') as ofp:
+                ofp.write(decompress.lzma.compress(text))
+            files.append(('xz', filename + '.xz'))
+        del text
+        
+        for name, f in files:
+            t, peak_kb = measure_load(f)
+            print ("  %9d rows, %12s (%6.1f MB): %6.2fs, peak memory +%6.1f "
+                   "MB"%(n_rows, name, os.path.getsize(f) / 1024.0**2, t, 
+                         peak_kb / 1024.0))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    bench_to_float()
+    bench_to_time()
+    bench_dispatch()
+    bench_compressed()
@@ -0,0 +1,57 @@
+#Copyright (C) Nial Peters 2013
+#
+#This file is part of AvoPlot.
+#
+#AvoPlot is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#AvoPlot is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with AvoPlot.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Unit tests for the avoplot_fromfile_plugin.arrays module
+"""
+
+import unittest
+import numpy
+from avoplot.plugins.avoplot_fromfile_plugin import arrays
+
+
+class TokenColumnTestCase(unittest.TestCase):
+
+    def setUp(self):
+        text = " ab  c\t1.5\n xx 2 y \n"
+        chars = numpy.frombuffer(text, dtype=numpy.uint8)
+        starts, ends = arrays.find_words(chars)
+        
+        #mix of the different ways of adding tokens
+        builder = arrays.TokenColumnBuilder(spill_size=16)
+        builder.append_words(chars, starts[:3], ends[:3])
+        builder.append(['', 'longer token'])
+        builder.append_words(chars, starts[3:], ends[3:])
+        self.column = builder.get_column()
+        self.tokens = text.split()[:3] + ['', 'longer token'] + text.split()[3:]
+    
+    
+    def test_tokens(self):
+        self.assertEqual(len(self.column), len(self.tokens))
+        self.assertEqual(list(self.column), self.tokens)
+        self.assertEqual(self.column[-1], 'y')
+        self.assertEqual(list(self.column[2:5]), self.tokens[2:5])
+        self.assertEqual(list(self.column.to_array(1, 4)), self.tokens[1:4])
+        self.assertEqual(list(self.column.take([5, 0, 3])), ['xx', 'ab', ''])
+        
+        #slices should be usable for building new columns
+        builder = arrays.TokenColumnBuilder()
+        builder.append(self.column[4:])
+        self.assertEqual(builder.get_column().tolist(), self.tokens[4:])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+#Copyright (C) Nial Peters 2013
+#
+#This file is part of AvoPlot.
+#
+#AvoPlot is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#AvoPlot is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with AvoPlot.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Unit tests for the avoplot.batch module
+"""
+
+import unittest
+import os
+import sys
+import subprocess
+import tempfile
+import shutil
+import threading
+import multiprocessing.pool
+from avoplot import batch
+
+
+class BatchTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.data_file = os.path.join(self.tmp_dir, 'data.txt')
+        with open(self.data_file, 'w') as ofp:
+            ofp.write("# time value name\n")
+            ofp.writelines(['%d %d.5 x\n'%(i, i * i) for i in range(100)])
+        
+        self.job_file = os.path.join(self.tmp_dir, 'jobs.txt')
+        with open(self.job_file, 'w') as ofp:
+            ofp.write("# comment\n\n")
+            for x, y, output in [('A[:]', 'B[:]', 'a b.png'), 
+                                 ('-', 'B[1:10], B[20:30]', 'b.svg'), 
+                                 ('A[:]', 'C[:]', 'c.png'), 
+                                 ('A[:]', 'B[1:200]', 'd.png')]:
+                ofp.write('"%s" "%s" "%s" "%s"\n'%(self.data_file, x, y,
+                                    os.path.join(self.tmp_dir, output)))
+    
+    
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+    
+    
+    def test_read_job_file(self):
+        jobs = batch.read_job_file(self.job_file)
+        self.assertEqual(len(jobs), 4)
+        self.assertEqual(jobs[1].x_selection, '')
+        self.assertEqual(jobs[1].y_selection, 'B[1:10], B[20:30]')
+        self.assertEqual(os.path.basename(jobs[0].output), 'a b.png')
+        
+        with open(self.job_file, 'a') as ofp:
+            ofp.write("data.txt A[:] out.png\n")
+        self.assertRaises(batch.JobFileError, batch.read_job_file, 
+                          self.job_file)
+    
+    
+    def test_run_jobs(self):
+        jobs = batch.read_job_file(self.job_file)
+        results = batch.run_jobs(jobs, processes=1)
+        
+        #text columns and rows outside the data cannot be plotted
+        self.assertEqual([job for job, error in results], jobs)
+        self.assertEqual([error is None for job, error in results], 
+                         [True, True, False, False])
+        for job in jobs[:2]:
+            self.assertTrue(os.path.getsize(job.output) > 0)
+    
+    
+    def test_imap_series_data(self):
+        filenames = [self.data_file, os.path.join(self.tmp_dir, 'missing.txt'),
+                     self.data_file]
+        selections = [('A[:]', 'B[:]'), ('', 'B[1:10]')]
+        
+        pool = batch.create_pool(len(filenames), processes=2)
+        try:
+            results = list(batch.imap_series_data(filenames, selections, pool))
+            pool.close()
+        finally:
+            pool.terminate()
+        
+        self.assertEqual([error is None for data, error in results], 
+                         [True, False, True])
+        xdata, ydata = results[0][0][0]
+        self.assertEqual(len(xdata), 100)
+        self.assertEqual(ydata[-1], 99 * 99 + 0.5)
+        xdata, ydata = results[2][0][1]
+        self.assertEqual(list(xdata), range(10))
+        self.assertEqual(ydata[0], 0.5)
+    
+    
+    def test_pool_with_threads(self):
+        #worker processes should not be forked while other threads are 
+        #running, but the data should still be loaded
+        stop = threading.Event()
+        thread = threading.Thread(target=stop.wait)
+        thread.start()
+        try:
+            pool = batch.create_pool(2, processes=2)
+        finally:
+            stop.set()
+            thread.join()
+        try:
+            if sys.platform != 'win32':
+                self.assertTrue(isinstance(pool, 
+                                           multiprocessing.pool.ThreadPool))
+            results = list(batch.imap_series_data([self.data_file], 
+                                                  [('', 'B[1:10]')], pool))
+            pool.close()
+        finally:
+            pool.terminate()
+        self.assertEqual(results[0][1], None)
+        self.assertEqual(results[0][0][0][1][0], 0.5)
+    
+    
+    def test_without_wx(self):
+        #batch mode must not need wx, so run the jobs in a separate 
+        #interpreter in which it cannot be imported
+        script = ("import sys\n"
+                  "sys.modules['wx'] = None\n"
+                  "from avoplot import batch\n"
+                  "sys.exit(batch.run_job_file(sys.argv[1], processes=1))\n")
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        process = subprocess.Popen([sys.executable, '-c', script, 
+                                    self.job_file], env=env, 
+                                   stdout=subprocess.PIPE, 
+                                   stderr=subprocess.PIPE)
+        stdout, stderr = process.communicate()
+        
+        #only the two invalid jobs should fail
+        self.assertEqual(process.returncode, 2, stderr)
+        self.assertTrue('Traceback' not in stderr, stderr)
+        for job in batch.read_job_file(self.job_file)[:2]:
+            self.assertTrue(os.path.getsize(job.output) > 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+#Copyright (C) Nial Peters 2013
+#
+#This file is part of AvoPlot.
+#
+#AvoPlot is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#AvoPlot is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with AvoPlot.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Unit tests for the avoplot_fromfile_plugin.binary_file_loader module
+"""
+
+import unittest
+import os
+import shutil
+import tempfile
+import numpy
+from avoplot.plugins.avoplot_fromfile_plugin import loader
+from avoplot.plugins.avoplot_fromfile_plugin import binary_file_loader
+
+
+class BinaryFileLoaderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.time = numpy.arange(10, dtype=numpy.float64)
+        self.values = numpy.arange(20, dtype=numpy.int16).reshape(10, 2)
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+
+    def check_columns(self, contents, titles):
+        columns = contents.get_columns()
+        self.assertEqual([c.title for c in columns], titles)
+        self.assertEqual([c.get_data_type() for c in columns], 
+                         ['number'] * len(titles))
+        self.assertEqual(list(columns[0].get_data()), list(self.time))
+        self.assertEqual(list(columns[2].get_data()), list(self.values[:, 1]))
+        self.assertTrue(isinstance(columns[0].raw_data, numpy.memmap))
+
+
+    def test_npy(self):
+        filename = os.path.join(self.tmp_dir, 'test.npy')
+        a = numpy.zeros(10, dtype=[('time', '<f8'), ('values', '<i2', 2)])
+        a['time'] = self.time
+        a['values'] = self.values
+        numpy.save(filename, a)
+        
+        contents = loader.load_file(filename, use_cache=False)
+        self.check_columns(contents, ['time', 'values[0]', 'values[1]'])
+        
+        #native float data should be used directly from the file, not copied
+        time_col = contents.get_column_by_index(0)
+        self.assertTrue(numpy.may_share_memory(time_col.get_data().data, 
+                                               time_col.raw_data))
+
+
+    def test_npz(self):
+        filename = os.path.join(self.tmp_dir, 'test.npz')
+        numpy.savez(filename, time=self.time, values=self.values)
+        contents = loader.load_file(filename, use_cache=False)
+        
+        #npz files do not preserve the order of the arrays
+        columns = sorted(contents.get_columns(), key=lambda c: c.title)
+        contents = loader.FileContents(filename, columns)
+        self.check_columns(contents, ['time', 'values[0]', 'values[1]'])
+        
+        #compressed arrays cannot be memory-mapped but should still load
+        numpy.savez_compressed(filename, values=self.values)
+        contents = loader.load_file(filename, use_cache=False)
+        self.assertEqual(list(contents.get_column_by_index(1).get_data()), 
+                         list(self.values[:, 1]))
+
+
+    def test_raw(self):
+        filename = os.path.join(self.tmp_dir, 'test.dat')
+        a = numpy.zeros(10, dtype=[('time', '>f8'), ('pad', 'V3'), 
+                                   ('values', '>i2', 2)])
+        a['time'] = self.time
+        a['values'] = self.values
+        with open(filename, 'wb') as ofp:
+            ofp.write('HEADER')
+            ofp.write(a.tostring())
+        
+        #raw files can only be loaded once they have been described
+        self.assertRaises(IOError, loader.load_file, filename, False)
+        
+        binary_file_loader.write_raw_description(filename, 
+                                                 ['time', 'values'], 
+                                                 ['f8', '2i2'], 
+                                                 byte_order='>',
+                                                 header_bytes=6,
+                                                 offsets=[0, 11])
+        contents = loader.load_file(filename, use_cache=False)
+        self.check_columns(contents, ['time', 'values[0]', 'values[1]'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+#Copyright (C) Nial Peters 2013
+#
+#This file is part of AvoPlot.
+#
+#AvoPlot is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#AvoPlot is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with AvoPlot.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Unit tests for the avoplot.buffers module
+"""
+
+import unittest
+import numpy
+from avoplot import buffers
+
+
+class BuffersTestCase(unittest.TestCase):
+
+    def test_append(self):
+        buffer, start, stop = numpy.arange(3), 0, 3
+        views = []
+        for i in range(1, 20):
+            buffer, start, stop = buffers.append(buffer, start, stop, 
+                                                 numpy.arange(i) + stop)
+            views.append(buffer[start:stop])
+        
+        self.assertEqual(list(buffer[start:stop]), range(stop))
+        self.assertTrue(len(buffer) <= 4 * stop)
+        
+        #appending never changes data that has already been appended
+        for view in views:
+            self.assertEqual(list(view), range(len(view)))
+
+
+    def test_max_length(self):
+        buffer, start, stop = numpy.zeros(0), 0, 0
+        n_allocations = 0
+        for i in range(1000):
+            old_buffer = buffer
+            buffer, start, stop = buffers.append(buffer, start, stop, 
+                                                 [2 * i, 2 * i + 1], 
+                                                 max_length=15)
+            n_allocations += buffer is not old_buffer
+        
+        self.assertEqual(list(buffer[start:stop]), range(1985, 2000))
+        #the data is only copied about once per max_length values appended
+        self.assertTrue(n_allocations <= 2000 // 15 + 1)
+        
+        buffer, start, stop = buffers.append(buffer, start, stop, 
+                                             numpy.arange(20), max_length=15)
+        self.assertEqual(list(buffer[start:stop]), range(5, 20))
+
+
+    def test_dtype(self):
+        buffer, start, stop = buffers.append(numpy.arange(3), 0, 3, [0.5])
+        self.assertEqual(buffer.dtype, numpy.float)
+        self.assertEqual(list(buffer[start:stop]), [0, 1, 2, 0.5])
+
+
+    def test_multidimensional(self):
+        buffer, start, stop = numpy.zeros((0, 2)), 0, 0
+        for i in range(10):
+            buffer, start, stop = buffers.append(buffer, start, stop, 
+                                                 [[i, -i]], max_length=4)
+        self.assertEqual(buffer[start:stop].tolist(), 
+                         [[6, -6], [7, -7], [8, -8], [9, -9]])
+
+
+if __name__ == '__main__':
+    unittest.main()
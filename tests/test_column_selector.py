@@ -0,0 +1,98 @@
+#Copyright (C) Nial Peters 2013
+#
+#This file is part of AvoPlot.
+#
+#AvoPlot is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#AvoPlot is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with AvoPlot.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Unit tests for the avoplot_fromfile_plugin.column_selector module
+"""
+
+import unittest
+import numpy
+from avoplot import storage
+from avoplot.plugins.avoplot_fromfile_plugin import column_selector
+from avoplot.plugins.avoplot_fromfile_plugin import loader
+
+
+class SelectionTestCase(unittest.TestCase):
+    
+    def make_params(self, *blocks):
+        return [{'column':'A', 'lower_bound':str(l), 'upper_bound':str(u)} 
+                for l, u in blocks]
+    
+    
+    def test_compile_selection(self):
+        #overlapping and adjacent blocks should be merged
+        params = self.make_params((23, 25), (1, 20), (5, 10), (21, 21), 
+                                  (30, 30))
+        self.assertEqual(column_selector.compile_selection(params), 
+                         [(0, 21), (22, 25), (29, 30)])
+    
+    
+    def test_intersect_intervals(self):
+        self.assertEqual(column_selector.intersect_intervals(
+                                        [(0, 10), (20, 30)], [(5, 25)]), 
+                         [(5, 10), (20, 25)])
+        self.assertEqual(column_selector.intersect_intervals(
+                                        [(0, 10)], [(10, 20)]), [])
+    
+    
+    def test_select_rows(self):
+        data = numpy.ma.masked_array(numpy.arange(100.0), 
+                                     mask=numpy.arange(100) == 5)
+        
+        #a single block of rows should not be copied
+        rows = column_selector.select_rows(data, [(2, 50)])
+        self.assertTrue(numpy.may_share_memory(rows, data))
+        self.assertEqual(len(rows), 48)
+        self.assertTrue(rows.mask[3])
+        
+        rows = column_selector.select_rows(data, [(2, 4), (98, 100)])
+        self.assertEqual(list(rows), [2.0, 3.0, 98.0, 99.0])
+        self.assertEqual(len(column_selector.select_rows(data, [])), 0)
+        
+        #blocks that touch are still a single block of rows
+        rows = column_selector.select_rows(data, [(2, 4), (4, 10)])
+        self.assertTrue(numpy.may_share_memory(rows, data))
+        self.assertEqual(len(rows), 8)
+    
+    
+    def test_row_numbers(self):
+        #the row numbers of a single block should not need an array
+        column = loader.ColumnData(['%d'%i for i in range(100)])
+        xdata, ydata = column_selector.get_series_data(None, 
+                                                       (column, [(10, 20)]))
+        self.assertTrue(isinstance(xdata, storage.RegularSamples))
+        self.assertEqual(list(xdata), range(10, 20))
+        self.assertEqual(list(ydata), range(10, 20))
+        
+        xdata, ydata = column_selector.get_series_data((column, [(0, 2), 
+                                                                 (5, 6)]),
+                                                       None)
+        self.assertEqual(list(ydata), [0, 1, 5])
+    
+    
+    def test_time_selection(self):
+        #time data should stay as (a view of) the datetime64 column data
+        column = loader.ColumnData(['2020-01-01T00:00:%02d'%i 
+                                    for i in range(60)])
+        column.set_data_type('time')
+        data = column_selector.get_selection_data(column, [(10, 20)])
+        self.assertEqual(data.dtype, numpy.dtype(loader.TIME_DTYPE))
+        self.assertTrue(numpy.may_share_memory(data, column.get_data()))
+        self.assertEqual(data[0], numpy.datetime64('2020-01-01T00:00:10'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,209 @@
+#Copyright (C) Nial Peters 2013
+#
+#This file is part of AvoPlot.
+#
+#AvoPlot is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#AvoPlot is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with AvoPlot.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Unit tests for the avoplot.data_cache module
+"""
+
+import unittest
+import os
+import time
+import tempfile
+import shutil
+import numpy
+from avoplot import data_cache
+from avoplot.persist import PersistentStorage
+from avoplot.plugins.avoplot_fromfile_plugin import loader
+from avoplot.plugins.avoplot_fromfile_plugin import txt_file_loader
+
+
+def _clear_max_size():
+    #removes any data_cache_max_size setting made by a test
+    settings = getattr(PersistentStorage(), '_PersistentStorage__settings')
+    settings.pop('data_cache_max_size', None)
+
+
+class DataCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = getattr(data_cache, '__DataCache')(self.cache_dir)
+        self.arrays = {'a':numpy.arange(1000.0), 
+                       'b':numpy.arange(1000, dtype='int8')}
+        #size of an entry holding self.arrays
+        self.entry_size = 9000
+        _clear_max_size()
+
+
+    def tearDown(self):
+        _clear_max_size()
+        shutil.rmtree(self.cache_dir)
+    
+    
+    def get_manifest(self, key):
+        entry_dir = getattr(self.cache, '_DataCache__get_entry_dir')(key)
+        return os.path.join(entry_dir, data_cache._MANIFEST_FILENAME)
+
+
+    def test_put_get(self):
+        self.cache.put(['file.txt', 10, 1.5], {'rows':1000}, self.arrays)
+        metadata, arrays = self.cache.get(['file.txt', 10, 1.5])
+        self.assertEqual(metadata, {'rows':1000})
+        self.assertEqual(sorted(arrays.keys()), ['a', 'b'])
+        for name, a in self.arrays.items():
+            self.assertEqual(arrays[name].dtype, a.dtype)
+            self.assertTrue(numpy.all(arrays[name] == a))
+        self.assertEqual(self.cache.get_size(), self.entry_size)
+        
+        self.assertRaises(KeyError, self.cache.get, ['file.txt', 10, 2.5])
+
+
+    def test_max_size(self):
+        self.assertEqual(self.cache.get_max_size(), data_cache.DEFAULT_MAX_SIZE)
+        
+        for i in range(3):
+            self.cache.put(i, None, self.arrays)
+        self.assertEqual(self.cache.get_size(), 3 * self.entry_size)
+        
+        #reducing the maximum size should evict entries straight away
+        self.cache.set_max_size(2 * self.entry_size)
+        self.assertEqual(PersistentStorage().get_value('data_cache_max_size'),
+                         2 * self.entry_size)
+        self.assertEqual(self.cache.get_max_size(), 2 * self.entry_size)
+        self.assertEqual(self.cache.get_size(), 2 * self.entry_size)
+        
+        #and adding new ones should keep the cache within its maximum size
+        self.cache.put(3, None, self.arrays)
+        self.assertEqual(self.cache.get_size(), 2 * self.entry_size)
+        self.cache.get(3)
+
+
+    def test_lru_eviction(self):
+        #the least recently used entry is evicted, not the oldest one
+        self.cache.set_max_size(2 * self.entry_size)
+        self.cache.put('first', None, self.arrays)
+        self.cache.put('second', None, self.arrays)
+        now = time.time()
+        os.utime(self.get_manifest('first'), (now - 20, now - 20))
+        os.utime(self.get_manifest('second'), (now - 10, now - 10))
+        
+        self.cache.get('first')
+        self.cache.put('third', None, self.arrays)
+        
+        self.assertRaises(KeyError, self.cache.get, 'second')
+        self.cache.get('first')
+        self.cache.get('third')
+
+
+    def test_oversize_entry(self):
+        #entries bigger than the whole cache are not stored, and do not cause
+        #other entries to be evicted
+        self.cache.set_max_size(2 * self.entry_size)
+        self.cache.put('small', None, self.arrays)
+        self.cache.put('large', None, {'a':numpy.zeros(2 * self.entry_size)})
+        
+        self.assertRaises(KeyError, self.cache.get, 'large')
+        self.cache.get('small')
+        self.assertEqual(self.cache.get_size(), self.entry_size)
+
+
+    def test_hash_collision(self):
+        #simulate the entries for two different keys having the same hash by
+        #moving one of them to the location of the other
+        self.cache.put('key1', 'metadata1', self.arrays)
+        os.rename(os.path.dirname(self.get_manifest('key1')),
+                  os.path.dirname(self.get_manifest('key2')))
+        
+        self.assertRaises(KeyError, self.cache.get, 'key2')
+
+
+    def test_clear(self):
+        self.cache.put('key1', None, self.arrays)
+        self.cache.put('key2', None, self.arrays)
+        self.cache.clear()
+        
+        self.assertRaises(KeyError, self.cache.get, 'key1')
+        self.assertRaises(KeyError, self.cache.get, 'key2')
+        self.assertEqual(self.cache.get_size(), 0)
+        
+        #the cache should still be usable after clearing it
+        self.cache.put('key1', None, self.arrays)
+        self.cache.get('key1')
+
+
+
+class LoaderCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.old_cache = data_cache._data_cache
+        data_cache._data_cache = getattr(data_cache, '__DataCache')(
+                                                                self.cache_dir)
+        text = ("# test file\n"
+                "# value time name\n"
+                "1.5 2020-01-01T00:00:00 first\n"
+                "junk\n"
+                "x 2020-01-01T00:00:10 second\n"
+                "3.5 bad third\n"
+                "end\n")
+        self.contents = txt_file_loader.TextFileLoader().load('test.txt', text)
+        for c, d_type in zip(self.contents.get_columns(), 
+                             ('number', 'time', 'text')):
+            c.set_data_type(d_type)
+
+
+    def tearDown(self):
+        data_cache._data_cache = self.old_cache
+        shutil.rmtree(self.cache_dir)
+
+
+    def test_round_trip(self):
+        #text loader results are not normally cached, so save them explicitly
+        loader.save_to_cache(['test.txt', 1], self.contents)
+        cached = loader.load_from_cache('test.txt', ['test.txt', 1])
+        
+        self.assertEqual(cached.filename, 'test.txt')
+        self.assertEqual(cached.header, self.contents.header)
+        self.assertEqual(cached.footer, self.contents.footer)
+        self.assertEqual(cached.comment_symbols, self.contents.comment_symbols)
+        self.assertEqual(cached.skipped_rows, self.contents.skipped_rows)
+        self.assertEqual(cached.get_number_of_columns(), 3)
+        
+        for c, original in zip(cached.get_columns(), 
+                               self.contents.get_columns()):
+            self.assertEqual(c.title, original.title)
+            self.assertEqual(c.get_data_type(), original.get_data_type())
+            self.assertEqual(list(c.raw_data), list(original.raw_data))
+            
+            data = c.get_data()
+            expected = original.get_data()
+            self.assertEqual(data.dtype, expected.dtype)
+            self.assertEqual(list(numpy.ma.getmaskarray(data)), 
+                             list(numpy.ma.getmaskarray(expected)))
+            self.assertEqual(list(data.compressed()), 
+                             list(expected.compressed()))
+        
+        self.assertEqual(list(cached.get_column_by_index(0).get_data_mask()),
+                         [False, True, False])
+        self.assertEqual(list(cached.get_column_by_index(1).get_data_mask()),
+                         [False, False, True])
+        
+        self.assertRaises(KeyError, loader.load_from_cache, 'test.txt', 
+                          ['test.txt', 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+#Copyright (C) Nial Peters 2013
+#
+#This file is part of AvoPlot.
+#
+#AvoPlot is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#AvoPlot is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with AvoPlot.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Unit tests for the avoplot.decimation module
+"""
+
+import unittest
+import datetime
+import numpy
+from matplotlib.dates import date2num
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from avoplot import decimation
+from avoplot.series import XYDataSeries
+
+
+class FakeSubplot(object):
+    #just enough of a subplot for a series to be plotted into
+    def __init__(self, axes):
+        self.axes = axes
+    
+    
+    def get_mpl_axes(self):
+        return self.axes
+
+
+
+class DecimationTestCase(unittest.TestCase):
+
+    def setUp(self):
+        numpy.random.seed(0)
+        self.n = 200003
+        self.xdata = numpy.linspace(0.0, 100.0, self.n)
+        self.ydata = numpy.random.randn(self.n).cumsum()
+
+
+    def test_can_decimate(self):
+        self.assertTrue(decimation.can_decimate(self.xdata, self.ydata))
+        self.assertFalse(decimation.can_decimate(self.xdata[::-1], 
+                                                 self.ydata))
+        self.ydata[10] = numpy.nan
+        self.assertFalse(decimation.can_decimate(self.xdata, self.ydata))
+
+
+    def test_get_indices(self):
+        pyramid = decimation.MinMaxPyramid(self.xdata, self.ydata)
+        
+        for x_min, x_max, n_pixels in ((-1.0, 101.0, 500), (20.0, 30.0, 300),
+                                       (50.0, 50.01, 1000), (0.0, 3.0, 7)):
+            idxs = pyramid.get_indices(x_min, x_max, n_pixels)
+            self.assertTrue(numpy.all(numpy.diff(idxs) > 0))
+            self.assertEqual((idxs[0], idxs[-1]), (0, self.n - 1))
+            
+            #the overall extremes are kept, so autoscaling is unaffected
+            self.assertEqual(self.ydata[idxs].max(), self.ydata.max())
+            self.assertEqual(self.ydata[idxs].min(), self.ydata.min())
+            
+            #the first, last, min and max points of each pixel column are kept
+            selected = numpy.zeros(self.n, dtype='bool')
+            selected[idxs] = True
+            edges = numpy.searchsorted(self.xdata, numpy.linspace(x_min, x_max,
+                                                              n_pixels + 1))
+            for start, stop in zip(edges[:-1], edges[1:]):
+                if stop == start:
+                    continue
+                column = slice(start, stop)
+                self.assertTrue(selected[start] and selected[stop - 1])
+                self.assertEqual(self.ydata[column][selected[column]].max(),
+                                 self.ydata[column].max())
+                self.assertEqual(self.ydata[column][selected[column]].min(),
+                                 self.ydata[column].min())
+
+
+    def test_extend(self):
+        #updating the pyramid as data is appended (and dropped) should give
+        #the same results as building it from scratch
+        pyramid = decimation.MinMaxPyramid(self.xdata[:1000], 
+                                           self.ydata[:1000])
+        for start, stop in ((0, 1001), (0, 50000), (10007, 60000), 
+                            (10007, 60000), (70000, 200000), (199000, 200003)):
+            xdata, ydata = self.xdata[start:stop], self.ydata[start:stop]
+            pyramid.extend(xdata, ydata, start)
+            rebuilt = decimation.MinMaxPyramid(xdata, ydata)
+            
+            for x_min, x_max in ((-1.0, 101.0), (xdata[0], xdata[-1]),
+                                 (xdata[len(xdata) // 3], xdata[-1])):
+                idxs = pyramid.get_indices(x_min, x_max, 300)
+                rebuilt_idxs = rebuilt.get_indices(x_min, x_max, 300)
+                self.assertEqual(list(ydata[idxs]), list(ydata[rebuilt_idxs]))
+        
+        self.assertRaises(ValueError, pyramid.extend, self.xdata[:10], 
+                          self.ydata[:10], 0)
+        
+        ydata = self.ydata.copy()
+        ydata[-1] = numpy.nan
+        self.assertRaises(ValueError, pyramid.extend, self.xdata[199000:], 
+                          ydata[199000:], 199000)
+
+
+    def test_plot(self):
+        fig = Figure(figsize=(8, 4), dpi=100)
+        FigureCanvasAgg(fig)
+        axes = fig.add_subplot(111)
+        series = XYDataSeries('test', xdata=self.xdata, ydata=self.ydata)
+        series._plot(FakeSubplot(axes))
+        line, = series.get_mpl_lines()
+        
+        fig.canvas.draw()
+        n_plotted = len(line.get_xdata())
+        self.assertTrue(n_plotted < 5 * axes.bbox.width)
+        
+        #zooming in should plot the visible data in more detail
+        axes.set_xlim(10.0, 10.5)
+        fig.canvas.draw()
+        x = line.get_xdata()
+        visible = numpy.logical_and(x >= 10.0, x <= 10.5)
+        self.assertEqual(numpy.count_nonzero(visible), 1000)
+        
+        #the full data is still available
+        self.assertEqual(len(series.get_data()[0]), self.n)
+        
+        series.set_xy_data(self.xdata[:10], self.ydata[:10])
+        self.assertEqual(len(line.get_xdata()), 10)
+    
+    
+    def test_plot_times(self):
+        #long series of timestamps (e.g. from log files) are decimated too,
+        #including when they are stored compactly
+        times = (numpy.datetime64('2020-01-01T00:00:00', 'us') + 
+                 numpy.arange(self.n) * numpy.timedelta64(10, 'ms'))
+        self.assertTrue(decimation.can_decimate(times, self.ydata))
+        
+        fig = Figure(figsize=(8, 4), dpi=100)
+        FigureCanvasAgg(fig)
+        axes = fig.add_subplot(111)
+        for compact_x in (False, True):
+            series = XYDataSeries('test', xdata=times, ydata=self.ydata, 
+                                  compact_x=compact_x)
+            series._plot(FakeSubplot(axes))
+            line, = series.get_mpl_lines()
+            axes.set_xlim(auto=True)
+            axes.autoscale_view()
+            fig.canvas.draw()
+            self.assertTrue(len(line.get_xdata()) < 5 * axes.bbox.width)
+            self.assertEqual(line.get_xdata().dtype, times.dtype)
+            
+            #zooming in to 10 seconds of data should plot all of it
+            start = times[1000]
+            axes.set_xlim(date2num(start.astype(datetime.datetime)), 
+                          date2num((start + numpy.timedelta64(10, 's')
+                                    ).astype(datetime.datetime)))
+            fig.canvas.draw()
+            x = line.get_xdata()
+            visible = numpy.logical_and(x >= start, x <= start + 
+                                        numpy.timedelta64(10, 's'))
+            self.assertEqual(numpy.count_nonzero(visible), 1001)
+            series.delete()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+#Copyright (C) Nial Peters 2013
+#
+#This file is part of AvoPlot.
+#
+#AvoPlot is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#AvoPlot is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with AvoPlot.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Unit tests for the avoplot_fromfile_plugin.decompress module
+"""
+
+import unittest
+import os
+import tempfile
+import shutil
+import gzip
+import bz2
+from avoplot.plugins.avoplot_fromfile_plugin import decompress
+from avoplot.plugins.avoplot_fromfile_plugin import loader
+
+
+class DecompressTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.text = "# time value\n" + ''.join(['%d %d.5\n'%(i, i)
+                                                for i in range(20000)])
+
+        #write the gzip file as two separate streams (as produced by
+        #concatenating gzip files)
+        self.gz_file = os.path.join(self.tmp_dir, 'data.txt.gz')
+        for part in (self.text[:1000], self.text[1000:]):
+            ofp = gzip.GzipFile(self.gz_file, 'ab')
+            ofp.write(part)
+            ofp.close()
+
+        self.bz2_file = os.path.join(self.tmp_dir, 'data.txt.bz2')
+        with open(self.bz2_file, 'wb') as ofp:
+            ofp.write(bz2.compress(self.text))
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+
+    def test_get_compression(self):
+        for filename, compression in ((self.gz_file, 'gzip'),
+                                      (self.bz2_file, 'bzip2')):
+            with open(filename, 'rb') as ifp:
+                self.assertEqual(decompress.get_compression(ifp.read(10)),
+                                 compression)
+            self.assertEqual(decompress.strip_extension(filename, compression),
+                             os.path.join(self.tmp_dir, 'data.txt'))
+
+        self.assertEqual(decompress.get_compression(self.text), None)
+        self.assertEqual(decompress.get_compression(''), None)
+
+
+    def test_read(self):
+        for filename, compression in ((self.gz_file, 'gzip'),
+                                      (self.bz2_file, 'bzip2')):
+            with decompress.DecompressedFile(filename, compression) as ifp:
+                self.assertEqual(ifp.read(999), self.text[:999])
+                self.assertEqual(ifp.read(5), self.text[999:1004])
+                self.assertEqual(ifp.read(), self.text[1004:])
+                self.assertEqual(ifp.read(10), '')
+                self.assertEqual(ifp.tell(), os.path.getsize(filename))
+
+
+    def test_corrupt_file(self):
+        with open(self.gz_file, 'r+b') as ofp:
+            ofp.seek(20)
+            ofp.write('x' * 100)
+
+        with decompress.DecompressedFile(self.gz_file, 'gzip') as ifp:
+            self.assertRaises(IOError, ifp.read)
+
+
+    def test_load_file(self):
+        for filename in (self.gz_file, self.bz2_file):
+            contents = loader.load_file(filename, use_cache=False)
+            self.assertEqual(contents.get_number_of_rows(), 20000)
+            self.assertEqual(contents.get_columns()[0].title, 'time')
+            self.assertEqual(contents.get_columns()[1].get_data()[-1],
+                             19999.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+#Copyright (C) Nial Peters 2013
+#
+#This file is part of AvoPlot.
+#
+#AvoPlot is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#AvoPlot is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with AvoPlot.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Unit tests for the avoplot_fromfile_plugin.follow module
+"""
+
+import unittest
+from avoplot.plugins.avoplot_fromfile_plugin import follow
+
+
+class FollowTestCase(unittest.TestCase):
+
+    def test_is_open_ended(self):
+        self.assertTrue(follow.is_open_ended('A[:]'))
+        self.assertTrue(follow.is_open_ended('A[1:10], A[20: ]'))
+        self.assertTrue(follow.is_open_ended(''))
+        self.assertFalse(follow.is_open_ended('A[1:10]'))
+        self.assertFalse(follow.is_open_ended('A[:10], A[20:30]'))
+
+
+if __name__ == '__main__':
+    unittest.main()
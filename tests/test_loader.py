@@ -0,0 +1,296 @@
+#Copyright (C) Nial Peters 2013
+#
+#This file is part of AvoPlot.
+#
+#AvoPlot is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#AvoPlot is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with AvoPlot.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Unit tests for the avoplot_fromfile_plugin.loader module
+"""
+
+import unittest
+import os
+import tempfile
+import numpy
+from avoplot.plugins.avoplot_fromfile_plugin import loader
+
+
+class ToFloatTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tokens = ['1.5', '-2', '+3e2', '.5', '5.', '1E-2', 'nan', 'inf',
+                       '-', '', '1,5', '1e', 'x1', '0x10', '1 2', ' 7 ',
+                       'N/A', '-0', '123456789.123456789']
+
+        #cells that cannot be interpreted as numbers (or are not finite)
+        #should be masked
+        self.expected_mask = [False, False, False, False, False, False, True,
+                              True, True, True, True, True, True, True, True,
+                              False, True, False, False]
+
+
+    def test_list_of_tokens(self):
+        data = loader.to_float(self.tokens)
+        self.assertEqual(list(data.mask), self.expected_mask)
+
+        for t, v, m in zip(self.tokens, data.data, data.mask):
+            if not m:
+                self.assertEqual(v, float(t))
+
+
+    def test_array_of_tokens(self):
+        #results must not depend on whether the tokens are in a list or array
+        data = loader.to_float(numpy.array(self.tokens))
+        self.assertEqual(list(data.mask), self.expected_mask)
+
+
+    def test_multiple_blocks(self):
+        #make sure that invalid cells are found correctly across block
+        #boundaries
+        n = loader._PARSE_BLOCK_SIZE * 2 + 10
+        tokens = numpy.array(['%d.25'%i for i in range(n)])
+        bad_idxs = [0, 1, loader._PARSE_BLOCK_SIZE - 1,
+                    loader._PARSE_BLOCK_SIZE, n - 1]
+        tokens[bad_idxs] = 'bad'
+
+        data = loader.to_float(tokens)
+
+        self.assertEqual(list(numpy.flatnonzero(data.mask)), bad_idxs)
+        self.assertEqual(data[2], 2.25)
+        self.assertEqual(data[n - 2], n - 2 + 0.25)
+
+
+    def test_partial_last_token(self):
+        #tokens that start with a number but are not one (e.g. times) must be 
+        #masked when they are the last token of the column or of a block
+        for tokens in (['1x'], ['2', '1x'], ['5', '12:30:00']):
+            data = loader.to_float(numpy.array(tokens))
+            self.assertEqual(list(data.mask), [False] * (len(tokens) - 1) + 
+                             [True])
+        
+        n = loader._PARSE_BLOCK_SIZE * 2
+        tokens = numpy.array(['%d.25'%i for i in range(n)])
+        bad_idxs = [loader._PARSE_BLOCK_SIZE - 1, n - 1]
+        tokens[bad_idxs] = '12:30:00'
+        data = loader.to_float(tokens)
+        self.assertEqual(list(numpy.flatnonzero(data.mask)), bad_idxs)
+        self.assertEqual(data[loader._PARSE_BLOCK_SIZE], 
+                         loader._PARSE_BLOCK_SIZE + 0.25)
+
+
+
+class DataTypeTestCase(unittest.TestCase):
+
+    def test_guess_data_type(self):
+        self.assertEqual(loader.guess_data_type(['1', '2', 'x']), 'number')
+        self.assertEqual(loader.guess_data_type(['1', 'x', 'y']), 'text')
+        self.assertEqual(loader.guess_data_type(['nan', 'inf', 'x']), 'number')
+        self.assertEqual(loader.guess_data_type(['1', 'x']), 'text')
+        self.assertEqual(loader.guess_data_type([]), 'text')
+
+
+    def test_sampled_guess(self):
+        n = loader.TYPE_SAMPLE_SIZE * 100
+        col = loader.ColumnData(['%d'%i for i in range(n - 1)] + ['x'])
+        self.assertEqual(len(col.get_type_sample()), loader.TYPE_SAMPLE_SIZE)
+        self.assertEqual(col.get_data_type(), 'number')
+
+
+    def test_check_guess(self):
+        #if the guess turns out to be wrong when the data is converted, then 
+        #the data type should be changed
+        col = loader.ColumnData(['1', 'x', 'y', 'nan'])
+        col.set_guessed_data_type('number')
+        col.get_data()
+        self.assertEqual(col.get_data_type(), 'text')
+        
+        col = loader.ColumnData(['1', 'x', 'nan', 'inf'])
+        col.set_guessed_data_type('number')
+        col.get_data()
+        self.assertEqual(col.get_data_type(), 'number')
+        
+        col = loader.ColumnData(['NaN', '-nan', 'nanx', '1e400'])
+        col.set_guessed_data_type('number')
+        col.get_data()
+        self.assertEqual(col.get_data_type(), 'number')
+        
+        col = loader.ColumnData(['+nan', 'nanx', '-x', '1'])
+        col.set_guessed_data_type('number')
+        col.get_data()
+        self.assertEqual(col.get_data_type(), 'text')
+
+
+    def test_guess_data_types(self):
+        #wide files should give the same results as narrow ones
+        columns = [loader.ColumnData([str(i), 'a', str(i)]) for i in range(80)]
+        columns.append(loader.ColumnData(['a', 'b', '3']))
+        contents = loader.FileContents('test.txt', columns)
+        
+        old_n_cols = loader.PARALLEL_TYPE_GUESS_COLUMNS
+        loader.PARALLEL_TYPE_GUESS_COLUMNS = 10
+        try:
+            contents.guess_data_types()
+        finally:
+            loader.PARALLEL_TYPE_GUESS_COLUMNS = old_n_cols
+        self.assertEqual([c.get_data_type() for c in columns], 
+                         ['number'] * 80 + ['text'])
+
+
+class ToTimeTestCase(unittest.TestCase):
+    
+    def check_times(self, data, expected):
+        self.assertEqual(list(numpy.ma.getmaskarray(data)), 
+                         [e is None for e in expected])
+        for d, e in zip(data.filled(numpy.datetime64('NaT')), expected):
+            if e is not None:
+                self.assertEqual(d, numpy.datetime64(e, 'us'))
+    
+    
+    def test_iso(self):
+        tokens = ['2013-01-02T03:04:05', '2012-02-29T23:59:59.25Z', 
+                  '2013-02-29T00:00:00', '2013-01-02T03:04:05.', 
+                  '2013-1-02T03:04:05', 'x', '']
+        self.assertEqual(loader.guess_time_format(tokens[:3]), 
+                         '%Y-%m-%dT%H:%M:%S')
+        data = loader.to_time(tokens, '%Y-%m-%dT%H:%M:%S')
+        self.check_times(data, ['2013-01-02T03:04:05', 
+                                '2012-02-29T23:59:59.250000', 
+                                None, None, None, None, None])
+        
+        self.check_times(loader.to_time(['2013-01-02', '2013-12-31']), 
+                         ['2013-01-02', '2013-12-31'])
+    
+    
+    def test_utc_offset(self):
+        tokens = ['2020-01-01T00:00:00+01:00', '2020-01-01T00:00:00.5-0230',
+                  '2020-01-01T23:30:00-01:00', '2020-01-01T00:00:00+0100',
+                  '2020-01-01T00:00:00+25:00', '2020-01-01T00:00:00+01:0',
+                  '2020-01-01T00:00:00Z+01:00', '2020-01-01T00:00:00+']
+        self.assertEqual(loader.guess_time_format(tokens[:4]), 
+                         '%Y-%m-%dT%H:%M:%S')
+        self.assertEqual(loader.guess_data_type(tokens[:4]), 'time')
+        self.check_times(loader.to_time(tokens, '%Y-%m-%dT%H:%M:%S'),
+                         ['2019-12-31T23:00:00', '2020-01-01T02:30:00.500000',
+                          '2020-01-02T00:30:00', '2019-12-31T23:00:00', 
+                          None, None, None, None])
+        self.check_times(loader.to_time(['2020-06-30T12:00+05:30']), 
+                         ['2020-06-30T06:30'])
+    
+    
+    def test_time_of_day(self):
+        data = loader.to_time(['12:30:00', '23:59:59.5', '00:00:01', 
+                               '24:00:00', '1:02'])
+        self.check_times(data, ['1900-01-01T12:30:00', 
+                                '1900-01-01T23:59:59.500000', 
+                                '1900-01-01T00:00:01', None, None])
+        self.check_times(loader.to_time(['12:30', '00:01']), 
+                         ['1900-01-01T12:30', '1900-01-01T00:01'])
+    
+    
+    def test_epoch(self):
+        data = loader.to_time(['0', '1000000000.5', 'x'])
+        self.check_times(data, ['1970-01-01', '2001-09-09T01:46:40.500000', 
+                                None])
+        self.check_times(loader.to_time(numpy.array([60])), 
+                         ['1970-01-01T00:01'])
+    
+    
+    def test_data_type(self):
+        self.assertEqual(loader.guess_data_type(['12:00', '13:00', 'x']), 
+                         'time')
+        col = loader.ColumnData(['1', '2'])
+        col.set_data_type('time')
+        self.check_times(col.get_data(), ['1970-01-01T00:00:01', 
+                                          '1970-01-01T00:00:02'])
+        
+        col = loader.ColumnData(['a', 'b'])
+        self.assertRaises(loader.InvalidDataTypeError, col.set_data_type, 
+                          'time')
+    
+    
+    def test_streaming(self):
+        #chunks appended to a time column should be converted on their own, 
+        #using the time format of the rest of the column
+        col = loader.StreamingColumnData()
+        col.append(['2013-01-02T03:04:05', '2013-01-02T03:04:06'])
+        self.assertEqual(col.get_data_type(), 'time')
+        col.get_data()
+        col.append(['2013-01-02T03:04:07', '12:00:00'])
+        self.assertTrue(col.data is not None)
+        self.check_times(col.get_data(), ['2013-01-02T03:04:05', 
+                                          '2013-01-02T03:04:06', 
+                                          '2013-01-02T03:04:07', None])
+        
+        col = loader.StreamingColumnData()
+        col.append(['1', '2'])
+        col.set_data_type('time')
+        col.append(['3'])
+        self.check_times(col.data, ['1970-01-01T00:00:01', 
+                                    '1970-01-01T00:00:02', 
+                                    '1970-01-01T00:00:03'])
+
+
+
+class DummyLoader(loader.FileLoaderBase):
+    extensions = ('.avotest',)
+    
+    def __init__(self, magic_number, priority):
+        self.magic_numbers = (magic_number,)
+        self.priority = priority
+        self.tested = []
+    
+    def test(self, filename, buf):
+        self.tested.append(len(buf))
+        return True
+
+
+
+class DispatchTestCase(unittest.TestCase):
+    
+    def setUp(self):
+        self.low = DummyLoader('AVOTEST', 1)
+        self.high = DummyLoader('AVOTEST_HIGH', 2)
+        loader.register_loader(self.low)
+        loader.register_loader(self.high)
+        
+        fd, self.filename = tempfile.mkstemp(suffix='.avotest')
+        with os.fdopen(fd, 'wb') as ofp:
+            ofp.write('AVOTEST' + 'x' * 2 * loader.DISPATCH_HEADER_SIZE)
+    
+    
+    def tearDown(self):
+        loader.unregister_loader(self.low)
+        loader.unregister_loader(self.high)
+        os.remove(self.filename)
+    
+    
+    def test_dispatch(self):
+        with open(self.filename, 'rb') as ifp:
+            buf = ifp.read()
+        
+        #both loaders match the extension, but only one the magic number
+        self.assertEqual(loader.get_candidate_loaders(self.filename, buf), 
+                         [self.high, self.low])
+        self.assertEqual(loader.get_candidate_loaders('test.txt', buf)[:1], 
+                         [self.low])
+        
+        #loaders should only be tested once per file, and on a sample of it
+        for i in range(2):
+            self.assertTrue(loader._find_loader(self.filename, buf) is 
+                            self.high)
+        self.assertEqual(self.high.tested, [loader.DISPATCH_HEADER_SIZE])
+        self.assertEqual(self.low.tested, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
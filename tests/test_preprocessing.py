@@ -0,0 +1,105 @@
+#Copyright (C) Nial Peters 2013
+#
+#This file is part of AvoPlot.
+#
+#AvoPlot is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#AvoPlot is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with AvoPlot.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Unit tests for the avoplot.preprocessing module
+"""
+
+import unittest
+import numpy
+from avoplot import preprocessing
+from avoplot.series import XYDataSeries
+
+
+class CountingStage(preprocessing.PreprocessingStage):
+    #stage which adds offset to the ydata and counts how often it is run
+    def __init__(self, offset=0.0):
+        super(CountingStage, self).__init__('Count', offset=offset)
+        self.n_runs = 0
+    
+    
+    def process(self, xdata, ydata):
+        self.n_runs += 1
+        return xdata, ydata + self.get_parameters()['offset']
+
+
+
+class PreprocessingTestCase(unittest.TestCase):
+
+    def test_stages(self):
+        xdata = numpy.arange(10.0)
+        ydata = 2.0 * xdata + 1.0
+        
+        stage = preprocessing.ScaleStage(x_scale=2.0, y_offset=-1.0)
+        x, y = stage.run(xdata, ydata)
+        self.assertEqual(list(x), list(2.0 * xdata))
+        self.assertEqual(list(y), list(2.0 * xdata))
+        self.assertTrue(stage.get_last_run_time() is not None)
+        
+        x, y = preprocessing.BaselineStage(degree=1).run(xdata, ydata)
+        self.assertTrue(numpy.allclose(y, 0.0))
+        
+        x, y = preprocessing.BaselineStage(degree=0, fit_ranges=[(0, 1)]).run(
+                                                                xdata, ydata)
+        self.assertTrue(numpy.allclose(y, ydata - 2.0))
+        
+        x, y = preprocessing.SmoothStage(window_size=3).run(xdata, 
+                                                            xdata ** 2)
+        self.assertTrue(numpy.allclose(y[:3], [0.5, 5.0 / 3, 14.0 / 3]))
+        self.assertTrue(numpy.allclose(y[-1], (64.0 + 81.0) / 2))
+        
+        x, y = preprocessing.CropStage(x_min=2, x_max=4).run(xdata, ydata)
+        self.assertEqual(list(x), [2, 3, 4])
+        self.assertEqual(list(y), [5, 7, 9])
+
+
+    def test_pipeline(self):
+        series = XYDataSeries('test', xdata=numpy.arange(10.0), 
+                              ydata=numpy.zeros(10))
+        stages = [CountingStage(1.0), CountingStage(10.0), CountingStage(100.0)]
+        for stage in stages:
+            series.add_preprocessing_stage(stage)
+        
+        self.assertEqual(list(series.get_data()[1]), [111.0] * 10)
+        self.assertEqual([s.n_runs for s in stages], [1, 1, 1])
+        
+        #changing a stage should only rerun it and the stages after it
+        stages[1].set_parameters(offset=20.0)
+        self.assertEqual(list(series.get_data()[1]), [121.0] * 10)
+        self.assertEqual([s.n_runs for s in stages], [1, 2, 2])
+        
+        stages[2].set_enabled(False)
+        self.assertEqual(list(series.get_data()[1]), [21.0] * 10)
+        self.assertEqual([s.n_runs for s in stages], [1, 2, 2])
+        
+        series.remove_preprocessing_stage(stages[0])
+        self.assertEqual(list(series.get_data()[1]), [20.0] * 10)
+        self.assertEqual([s.n_runs for s in stages], [1, 3, 2])
+        
+        #changing the data reruns everything
+        series.append_xy_data([10.0], [1.0])
+        self.assertEqual(list(series.get_data()[1]), [20.0] * 10 + [21.0])
+        self.assertEqual([s.n_runs for s in stages], [1, 4, 2])
+        
+        self.assertEqual(list(series.get_raw_data()[1]), [0.0] * 10 + [1.0])
+        
+        #stages cannot be shared between series
+        other = XYDataSeries('other', xdata=[1], ydata=[1])
+        self.assertRaises(ValueError, other.add_preprocessing_stage, stages[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
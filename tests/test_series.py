@@ -0,0 +1,157 @@
+#Copyright (C) Nial Peters 2013
+#
+#This file is part of AvoPlot.
+#
+#AvoPlot is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#AvoPlot is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with AvoPlot.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Unit tests for the avoplot.series module
+"""
+
+import unittest
+import numpy
+from avoplot import storage
+from avoplot.series import XYDataSeries
+
+
+class ScaledDataSeries(XYDataSeries):
+    #series which scales its ydata by a factor that can be changed
+    def __init__(self, *args, **kwargs):
+        self.scale = 1.0
+        self.n_preprocessed = 0
+        super(ScaledDataSeries, self).__init__(*args, **kwargs)
+    
+    
+    def set_scale(self, scale):
+        self.scale = scale
+        self.invalidate_preprocessed_data()
+    
+    
+    def preprocess(self, xdata, ydata):
+        self.n_preprocessed += 1
+        ydata *= self.scale
+        return super(ScaledDataSeries, self).preprocess(xdata, ydata)
+
+
+
+class XYDataSeriesTestCase(unittest.TestCase):
+
+    def test_append_xy_data(self):
+        series = XYDataSeries('test', xdata=numpy.arange(3), 
+                              ydata=numpy.arange(3.0))
+        for i in range(100):
+            series.append_xy_data(numpy.arange(3 * i + 3, 3 * i + 6), 
+                                  numpy.ma.masked_invalid([0.5, numpy.nan, 
+                                                           1.5]))
+        
+        xdata, ydata = series.get_raw_data()
+        self.assertEqual(series.get_length(), 203)
+        self.assertEqual(list(xdata[:5]), [0, 1, 2, 3, 5])
+        self.assertEqual(list(ydata[-2:]), [0.5, 1.5])
+        
+        series.set_xy_data(xdata=[1, 2], ydata=[3, 4])
+        series.append_xy_data([3], [5])
+        self.assertEqual([list(d) for d in series.get_raw_data()], 
+                         [[1, 2, 3], [3, 4, 5]])
+
+
+    def test_max_points(self):
+        series = XYDataSeries('test', xdata=range(10), ydata=range(10), 
+                              max_points=5)
+        self.assertEqual(list(series.get_raw_data()[0]), [5, 6, 7, 8, 9])
+        
+        for i in range(10, 100, 3):
+            series.append_xy_data(range(i, i + 3), range(i, i + 3))
+            self.assertEqual(list(series.get_data()[0]), range(i - 2, i + 3))
+        
+        series.set_max_points(2)
+        self.assertEqual(list(series.get_raw_data()[1]), [98, 99])
+        
+        series.set_max_points(None)
+        series.append_xy_data(range(20), range(20))
+        self.assertEqual(series.get_length(), 22)
+        self.assertRaises(ValueError, series.set_max_points, 0)
+
+
+    def test_storage(self):
+        xdata = numpy.arange(100000) * 0.5
+        ydata = numpy.random.randn(100000)
+        series = XYDataSeries('test', xdata=xdata, ydata=ydata)
+        full_size = series.get_memory_usage()
+        self.assertTrue(full_size >= xdata.nbytes + ydata.nbytes)
+        
+        series.set_storage_policy(storage.FLOAT32)
+        self.assertEqual(series.get_raw_data()[1].dtype, numpy.float32)
+        self.assertTrue(numpy.allclose(series.get_data()[1], ydata, 
+                                       rtol=1e-6))
+        
+        series.set_compact_x(True)
+        self.assertTrue(series.get_memory_usage() < 0.5 * full_size)
+        self.assertTrue(numpy.array_equal(series.get_raw_data()[0], xdata))
+        
+        #appending regularly spaced x values keeps them compact (all the
+        #memory used is for the ydata, and the space reserved for it)
+        series.append_xy_data([50000.0, 50000.5], [1.0, 2.0])
+        self.assertEqual(series.get_memory_usage(), 
+                         2 * series.get_length() * 4)
+        self.assertEqual(list(series.get_data()[0][-3:]), 
+                         [49999.5, 50000.0, 50000.5])
+        
+        series.append_xy_data([50002.0], [3.0])
+        self.assertEqual(list(series.get_data()[0][-3:]), 
+                         [50000.0, 50000.5, 50002.0])
+        
+        series.set_storage_policy(storage.PRESERVE)
+        series.set_xy_data(ydata=[1, 2, 3])
+        self.assertEqual(series.get_raw_data()[1].dtype, numpy.dtype(int))
+        self.assertRaises(ValueError, series.set_storage_policy, 'float16')
+
+
+    def test_get_data(self):
+        series = XYDataSeries('test', xdata=[1, 2, 3], ydata=[4, 5, 6])
+        xdata, ydata = series.get_data()
+        self.assertEqual(list(ydata), [4, 5, 6])
+        self.assertTrue(series.get_data()[1] is ydata)
+        
+        #the data handed out cannot be used to modify the series
+        def modify():
+            ydata[0] = 10
+        self.assertRaises(ValueError, modify)
+        
+        version = series.get_data_version()
+        series.append_xy_data([4], [7])
+        self.assertTrue(series.get_data_version() > version)
+        self.assertEqual(list(series.get_data()[1]), [4, 5, 6, 7])
+        self.assertEqual(list(ydata), [4, 5, 6])
+
+
+    def test_preprocessing_cache(self):
+        series = ScaledDataSeries('test', xdata=[1, 2], ydata=[3.0, 4.0])
+        series.get_data()
+        series.get_data()
+        self.assertEqual(series.n_preprocessed, 1)
+        
+        series.set_scale(2.0)
+        self.assertEqual(list(series.get_data()[1]), [6.0, 8.0])
+        self.assertEqual(series.n_preprocessed, 2)
+        
+        #preprocessing must not change the raw data
+        self.assertEqual(list(series.get_raw_data()[1]), [3.0, 4.0])
+        
+        series.set_xy_data(xdata=[1], ydata=[1.0])
+        self.assertEqual(list(series.get_data()[1]), [2.0])
+        self.assertEqual(series.n_preprocessed, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+#Copyright (C) Nial Peters 2013
+#
+#This file is part of AvoPlot.
+#
+#AvoPlot is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#AvoPlot is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with AvoPlot.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Unit tests for the avoplot.storage module
+"""
+
+import unittest
+import numpy
+from avoplot import storage
+
+
+class StorageTestCase(unittest.TestCase):
+
+    def test_get_dtype(self):
+        data = numpy.arange(5.0)
+        self.assertEqual(storage.get_dtype(data, storage.PRESERVE), 
+                         numpy.float64)
+        self.assertEqual(storage.get_dtype(data, storage.FLOAT32), 
+                         numpy.float32)
+        self.assertEqual(storage.get_dtype([1, 2], storage.FLOAT32), 
+                         numpy.dtype(int))
+        self.assertRaises(ValueError, storage.get_dtype, data, 'float16')
+
+
+    def test_nbytes(self):
+        data = numpy.zeros(100)
+        self.assertEqual(storage.nbytes(data, data[10:], data[::2], None,
+                                        numpy.zeros(10, dtype='int8')), 810)
+
+
+
+class RegularSamplesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.values = numpy.linspace(-3.0, 7.0, 100001)
+        self.samples = storage.RegularSamples.from_array(self.values)
+
+
+    def test_from_array(self):
+        self.assertEqual(len(self.samples), len(self.values))
+        self.assertTrue(numpy.allclose(numpy.asarray(self.samples), 
+                                       self.values, rtol=0, atol=1e-12))
+        
+        ints = storage.RegularSamples.from_array(numpy.arange(4, 400, 3))
+        self.assertEqual(numpy.asarray(ints).dtype, numpy.dtype(int))
+        self.assertEqual(list(numpy.asarray(ints)), range(4, 400, 3))
+        
+        for values in ([1, 2, 4], [1.0], [3.0, 2.0, 1.0], [1.0, numpy.nan], 
+                       ['a', 'b'], [1.0, 2.0, 3.01]):
+            self.assertEqual(storage.RegularSamples.from_array(values), None)
+        
+        samples = storage.RegularSamples.from_array(self.values, 'float32')
+        self.assertEqual(numpy.asarray(samples).dtype, numpy.float32)
+
+
+    def test_indexing(self):
+        for index in (0, -1, 12345, slice(10, 20), slice(-5, None), 
+                      slice(5, 2), slice(None, None, 7), [3, 1, -2], 
+                      self.values > 6.0):
+            self.assertTrue(numpy.array_equal(
+                                numpy.asarray(self.samples[index]), 
+                                numpy.asarray(self.samples)[index]))
+        
+        self.assertTrue(isinstance(self.samples[10:], 
+                                   storage.RegularSamples))
+        self.assertRaises(IndexError, self.samples.__getitem__, 100001)
+
+
+    def test_searchsorted(self):
+        values = numpy.asarray(self.samples)
+        v = numpy.concatenate((values[::97], values[::89] + 1e-9, 
+                               [-1e9, 1e9, 7.0, -3.0]))
+        for side in ('left', 'right'):
+            self.assertEqual(list(self.samples.searchsorted(v, side)),
+                             list(values.searchsorted(v, side)))
+            self.assertEqual(self.samples.searchsorted(1.5, side), 
+                             values.searchsorted(1.5, side))
+
+
+    def test_time(self):
+        times = (numpy.datetime64('2020-01-01T00:00:00', 'us') + 
+                 numpy.arange(1000) * numpy.timedelta64(100, 'ms'))
+        samples = storage.RegularSamples.from_array(times)
+        self.assertTrue(numpy.array_equal(numpy.asarray(samples), times))
+        self.assertEqual(samples[-1], times[-1])
+        self.assertEqual(list(samples.searchsorted(times[[3, 500]])), [3, 500])
+        
+        samples = samples.extend(times[-1:] + numpy.timedelta64(100, 'ms'))
+        self.assertEqual(len(samples), 1001)
+        self.assertEqual(samples.extend([1.0]), None)
+        
+        times[10] = numpy.datetime64('NaT')
+        self.assertEqual(storage.RegularSamples.from_array(times), None)
+
+
+    def test_extend(self):
+        samples = self.samples[100:].extend(7.0 + 1e-4 * numpy.arange(1, 6))
+        self.assertEqual(len(samples), len(self.values) - 100 + 5)
+        self.assertAlmostEqual(samples[-1], 7.0005)
+        self.assertAlmostEqual(samples[0], self.values[100])
+        
+        self.assertEqual(self.samples.extend([7.0002]), None)
+        self.assertEqual(self.samples.extend(['a']), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
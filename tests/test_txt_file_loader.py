@@ -0,0 +1,429 @@
+#Copyright (C) Nial Peters 2013
+#
+#This file is part of AvoPlot.
+#
+#AvoPlot is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#AvoPlot is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with AvoPlot.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Unit tests for the avoplot_fromfile_plugin.txt_file_loader module
+"""
+
+import unittest
+import os
+import threading
+import tempfile
+import shutil
+import numpy
+from avoplot import data_cache
+from avoplot.plugins.avoplot_fromfile_plugin import txt_file_loader
+from avoplot.plugins.avoplot_fromfile_plugin import loader
+
+
+class TextFileLoaderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.text = ("# test file\n"
+                     "notes:\n"
+                     "# time  value\n"
+                     "1 10.0\n"
+                     "2 20.0\n"
+                     "# comment\n"
+                     "3\n"
+                     "4 40.0\n"
+                     "5 50.0\n"
+                     "end\n")
+        self.contents = txt_file_loader.TextFileLoader().load('test.txt', 
+                                                              self.text)
+
+
+    def test_structure(self):
+        self.assertEqual(self.contents.comment_symbols, ['#'])
+        self.assertEqual(self.contents.header,
+                         "# test file\nnotes:\n# time  value\n")
+        self.assertEqual(self.contents.footer, "end\n")
+        self.assertEqual(self.contents.skipped_rows,
+                         [(1, "notes:\n"), (5, "# comment\n"), (6, "3\n")])
+
+
+    def test_columns(self):
+        #invalid lines before the data must not cause data lines to be lost
+        time_col, value_col = self.contents.get_columns()
+        self.assertEqual(list(time_col.raw_data), ['1', '2', '4', '5'])
+        self.assertEqual(list(value_col.raw_data), 
+                         ['10.0', '20.0', '40.0', '50.0'])
+        self.assertEqual(time_col.title, 'time')
+        self.assertEqual(value_col.title, 'value')
+
+
+    def test_load_file(self):
+        #loading from a (memory mapped) file should give the same results,
+        #both when the file is parsed and when it is loaded from the cache
+        cache_dir = tempfile.mkdtemp()
+        old_cache = data_cache._data_cache
+        data_cache._data_cache = getattr(data_cache, '__DataCache')(cache_dir)
+        fd, filename = tempfile.mkstemp(suffix='.txt')
+        try:
+            with os.fdopen(fd, 'wb') as ofp:
+                ofp.write(self.text)
+            parsed = loader.load_file(filename)
+            cached = loader.load_file(filename)
+        finally:
+            os.remove(filename)
+            data_cache._data_cache = old_cache
+            shutil.rmtree(cache_dir)
+        
+        for contents in (parsed, cached):
+            self.assertEqual(contents.header, self.contents.header)
+            self.assertEqual(contents.footer, self.contents.footer)
+            self.assertEqual(contents.skipped_rows, self.contents.skipped_rows)
+            self.assertEqual([list(c.raw_data) for c in contents.get_columns()],
+                             [list(c.raw_data) for c in self.contents.get_columns()])
+            self.assertEqual([c.title for c in contents.get_columns()],
+                             ['time', 'value'])
+        
+        self.assertEqual(list(cached.get_column_by_index(1).get_data()),
+                         [10.0, 20.0, 40.0, 50.0])
+    
+    
+    def test_test_results_memo(self):
+        #only the result for the latest version of a file should be kept
+        text_loader = txt_file_loader.TextFileLoader()
+        fd, filename = tempfile.mkstemp(suffix='.dat')
+        try:
+            for i in range(5):
+                with os.fdopen(os.dup(fd), 'ab') as ofp:
+                    ofp.write('1 2\n' * (i + 1))
+                self.assertTrue(text_loader.test_samples(filename, '1 2\n', 
+                                                         ''))
+            os.close(fd)
+            memo = text_loader._TextFileLoader__test_results
+            self.assertEqual(memo.keys(), [os.path.abspath(filename)])
+        finally:
+            os.remove(filename)
+
+
+    def test_binary_detection(self):
+        #binary data near the end of a large file should still be found
+        text = '1 2\n' * (txt_file_loader.SAMPLE_SIZE * 3)
+        fd, filename = tempfile.mkstemp(suffix='.dat')
+        try:
+            with os.fdopen(fd, 'wb') as ofp:
+                ofp.write(text)
+            contents = loader.load_file(filename, use_cache=False)
+            self.assertEqual(contents.get_number_of_rows(), 
+                             txt_file_loader.SAMPLE_SIZE * 3)
+            
+            with open(filename, 'ab') as ofp:
+                ofp.write('\0\x01\x02\xff' * 100)
+            self.assertRaises(IOError, loader.load_file, filename, 
+                              use_cache=False)
+        finally:
+            os.remove(filename)
+
+
+
+class LazyColumnsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        lines = ['%d %d.5 x%d\n'%(i, i, i) for i in range(3000)]
+        lines.insert(1500, "# comment\n")
+        self.text = "# a b c\n" + ''.join(lines)
+    
+    
+    def test_load_on_demand(self):
+        contents = txt_file_loader.TextFileLoader().load('test.txt', self.text)
+        columns = contents.get_columns()
+        self.assertEqual(contents.get_number_of_rows(), 3000)
+        
+        #guessing the data types should only need a sample of the data
+        contents.guess_data_types()
+        self.assertEqual([c.get_data_type() for c in columns], 
+                         ['number', 'number', 'text'])
+        self.assertFalse(any([c.is_loaded() for c in columns]))
+        
+        self.assertEqual(contents.get_column_by_name('B').get_data()[2000], 
+                         2000.5)
+        self.assertEqual([c.is_loaded() for c in columns], 
+                         [False, True, False])
+    
+    
+    def test_raw_values(self):
+        #displaying rows of a column should not need the whole column
+        contents = txt_file_loader.TextFileLoader().load('test.txt', self.text)
+        col = contents.get_column_by_index(2)
+        self.assertEqual(col.get_raw_values(1998, 2002), 
+                         ['x1998', 'x1999', 'x2000', 'x2001'])
+        self.assertEqual(col.get_raw_values(2998, 3005), ['x2998', 'x2999'])
+        self.assertFalse(col.is_loaded())
+        self.assertEqual(list(col.raw_data[1998:2002]), 
+                         col.get_raw_values(1998, 2002))
+    
+    
+    def test_memory_budget(self):
+        #if the columns do not all fit in the budget, then the least recently
+        #used ones should be released (and read again if they are needed)
+        old_budget = loader.COLUMN_MEMORY_BUDGET
+        loader.COLUMN_MEMORY_BUDGET = 1
+        try:
+            contents = txt_file_loader.TextFileLoader().load('test.txt', 
+                                                             self.text)
+        finally:
+            loader.COLUMN_MEMORY_BUDGET = old_budget
+        a, b, c = contents.get_columns()
+        
+        a_data = a.get_data()
+        c.get_data()
+        self.assertEqual([a.is_loaded(), c.is_loaded()], [False, True])
+        self.assertEqual(list(a.get_data()), list(a_data))
+        self.assertEqual([a.is_loaded(), c.is_loaded()], [True, False])
+        self.assertEqual(list(c.raw_data[-2:]), ['x2998', 'x2999'])
+    
+    
+    def test_close(self):
+        #the file should be closed once all the columns have been read from it
+        #(or the contents are closed), and opened again if it is needed
+        fd, filename = tempfile.mkstemp(suffix='.txt')
+        try:
+            with os.fdopen(fd, 'wb') as ofp:
+                ofp.write(self.text)
+            contents = loader.load_file(filename, use_cache=False)
+            a, b, c = contents.get_columns()
+            source = a._LazyColumnData__source
+            is_open = lambda: source._TextColumnSource__file is not None
+            
+            a.get_data()
+            b.get_data()
+            self.assertTrue(is_open())
+            c.get_data()
+            self.assertFalse(is_open())
+            
+            c.release()
+            self.assertEqual(c.get_raw_values(2998, 3000), ['x2998', 'x2999'])
+            self.assertTrue(is_open())
+            contents.close()
+            self.assertFalse(is_open())
+            
+            self.assertEqual(c.get_data()[2999], 'x2999')
+            self.assertFalse(is_open())
+        finally:
+            os.remove(filename)
+
+
+
+class StreamingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.n_rows = 5000
+        lines = ['%d %f\n'%(i, i * 0.5) for i in range(self.n_rows)]
+        fd, self.filename = tempfile.mkstemp(suffix='.txt')
+        with os.fdopen(fd, 'wb') as ofp:
+            ofp.write("# time value\n")
+            ofp.writelines(lines)
+            ofp.write("end\n")
+
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+
+    def test_bounded_memory(self):
+        chunk_rows = 100
+        spill_size = 1024
+        contents = loader.load_file_streaming(self.filename, 
+                                              chunk_rows=chunk_rows, 
+                                              use_cache=False, 
+                                              spill_size=spill_size)
+        
+        #only the first chunk should have been read so far
+        self.assertEqual(contents.get_number_of_rows(), chunk_rows)
+        self.assertFalse(contents.is_complete())
+        
+        while True:
+            n_rows = contents.load_next_chunk()
+            self.assertTrue(n_rows <= chunk_rows)
+            if not n_rows:
+                break
+            
+            #once the columns are bigger than spill_size they should no 
+            #longer be held in memory
+            for col in contents.get_columns():
+                for a in (col.raw_data.chars, col.raw_data.offsets):
+                    self.assertTrue(a.nbytes <= spill_size or
+                                    isinstance(a, numpy.memmap))
+        
+        self.assertTrue(contents.is_complete())
+        self.assertEqual(contents.get_number_of_rows(), self.n_rows)
+        self.assertEqual(contents.footer, "end\n")
+        
+        time_col, value_col = contents.get_columns()
+        self.assertEqual(time_col.title, 'time')
+        self.assertTrue(isinstance(value_col.get_data().data, numpy.memmap))
+        self.assertEqual(value_col.get_data()[-1], (self.n_rows - 1) * 0.5)
+    
+    
+    def test_background_loader(self):
+        bg_loader = loader.BackgroundLoader(self.filename, streaming=True, 
+                                            use_cache=False, chunk_rows=100, 
+                                            max_pending_chunks=2)
+        bg_loader.start()
+        self.assertTrue(bg_loader.wait(10))
+        contents = bg_loader.get_contents()
+        
+        #chunks are only added to the contents when asked for
+        self.assertTrue(contents.get_number_of_rows() < self.n_rows)
+        while not bg_loader.is_complete():
+            bg_loader.add_pending_chunks()
+            bg_loader.join(0.01)
+        
+        bg_loader.join()
+        self.assertTrue(contents.is_complete())
+        self.assertEqual(contents.get_number_of_rows(), self.n_rows)
+        self.assertEqual(contents.footer, "end\n")
+        self.assertEqual(bg_loader.get_progress(), 
+                         (os.path.getsize(self.filename), self.n_rows))
+    
+    
+    def test_background_work(self):
+        #the chunks should be converted and the contents cached by the loading
+        #thread, so that adding the chunks is all that the GUI has to do
+        cache_dir = tempfile.mkdtemp()
+        old_cache = data_cache._data_cache
+        data_cache._data_cache = getattr(data_cache, '__DataCache')(cache_dir)
+        old_to_float = loader.to_float
+        main_thread = threading.current_thread()
+        main_thread_calls = []
+        def to_float(data):
+            if threading.current_thread() is main_thread:
+                main_thread_calls.append(len(data))
+            return old_to_float(data)
+        
+        loader.to_float = to_float
+        try:
+            bg_loader = loader.BackgroundLoader(self.filename, streaming=True,
+                                                chunk_rows=100, 
+                                                max_pending_chunks=2)
+            bg_loader.start()
+            self.assertTrue(bg_loader.wait(10))
+            while not bg_loader.is_complete():
+                bg_loader.add_pending_chunks()
+                bg_loader.join(0.01)
+            bg_loader.join()
+            
+            self.assertEqual(main_thread_calls, [])
+            data = bg_loader.get_contents().get_column_by_index(1).get_data()
+            self.assertEqual(data[-1], (self.n_rows - 1) * 0.5)
+            
+            cached = loader.load_file(self.filename)
+            self.assertFalse(isinstance(cached, loader.StreamingFileContents))
+            self.assertEqual(cached.get_number_of_rows(), self.n_rows)
+            self.assertTrue(cached.get_column_by_index(1).data is not None)
+        finally:
+            loader.to_float = old_to_float
+            data_cache._data_cache = old_cache
+            shutil.rmtree(cache_dir)
+    
+    
+    def test_progress(self):
+        calls = []
+        def progress(n_bytes, n_rows):
+            calls.append((n_bytes, n_rows))
+            raise loader.LoadCancelledError()
+        
+        old_progress_lines = txt_file_loader.PROGRESS_LINES
+        txt_file_loader.PROGRESS_LINES = 1000
+        try:
+            self.assertRaises(loader.LoadCancelledError, loader.load_file, 
+                              self.filename, use_cache=False, 
+                              progress=progress)
+        finally:
+            txt_file_loader.PROGRESS_LINES = old_progress_lines
+        
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(calls[0][1], 1000)
+    
+    
+    def test_cancel(self):
+        bg_loader = loader.BackgroundLoader(self.filename, streaming=True, 
+                                            use_cache=False, chunk_rows=100, 
+                                            max_pending_chunks=1)
+        bg_loader.start()
+        self.assertTrue(bg_loader.wait(10))
+        contents = bg_loader.get_contents()
+        
+        #the loader will be blocked waiting for the pending chunk to be added
+        bg_loader.cancel()
+        bg_loader.join(10)
+        self.assertFalse(bg_loader.is_alive())
+        self.assertTrue(isinstance(bg_loader.get_error(), 
+                                   loader.LoadCancelledError))
+        self.assertFalse(contents.is_complete())
+
+
+
+class FollowerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp(suffix='.txt')
+        with os.fdopen(fd, 'wb') as ofp:
+            ofp.write("# time value\n")
+            ofp.writelines(['%d %d.5\n'%(i, i) for i in range(100)])
+        self.contents = loader.load_file(self.filename, use_cache=False)
+
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+
+    def append(self, text):
+        with open(self.filename, 'ab') as ofp:
+            ofp.write(text)
+
+
+    def test_read_new_rows(self):
+        follower = txt_file_loader.TextFileFollower(self.filename, 
+                                                    self.contents.n_bytes, 2, 
+                                                    '#')
+        self.assertEqual(follower.read_new_rows(), None)
+        
+        #incomplete lines should be left until they are finished
+        self.append("100 100.5\n# comment\nbad\n101 10")
+        rows = follower.read_new_rows()
+        self.assertEqual([list(c) for c in rows], [['100'], ['100.5']])
+        self.assertEqual(follower.read_new_rows(), None)
+        
+        self.append("1.5\n")
+        rows = follower.read_new_rows()
+        self.assertEqual([list(c) for c in rows], [['101'], ['101.5']])
+        
+        #the part of the file that was loaded is not affected by appending
+        self.assertEqual(self.contents.get_columns()[1].get_data()[-1], 99.5)
+        
+        with open(self.filename, 'wb') as ofp:
+            ofp.write("0 0\n")
+        self.assertRaises(IOError, follower.read_new_rows)
+
+
+    def test_partial_last_line(self):
+        #if the file was loaded part way through a line, then the rest of it
+        #should not be read as a new row
+        self.append("100 1")
+        contents = loader.load_file(self.filename, use_cache=False)
+        follower = txt_file_loader.TextFileFollower(self.filename, 
+                                                    contents.n_bytes, 2, '#')
+        self.append("00.5\n101 101.5\n")
+        rows = follower.read_new_rows()
+        self.assertEqual([list(c) for c in rows], [['101'], ['101.5']])
+
+
+if __name__ == '__main__':
+    unittest.main()
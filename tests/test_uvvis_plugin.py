@@ -0,0 +1,108 @@
+#Copyright (C) Nial Peters 2013
+#
+#This file is part of AvoPlot.
+#
+#AvoPlot is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#AvoPlot is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with AvoPlot.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Unit tests for the UV-VIS plugin (see Plugins/UVVIS)
+"""
+
+import unittest
+import os
+import sys
+import tempfile
+import numpy
+
+#the plugin is not part of the avoplot package, so import the module directly
+#from the source tree (importing the UVVIS_plugin package would register the
+#plugin)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 
+                                '..', 'Plugins', 'UVVIS', 'src', 
+                                'UVVIS_plugin'))
+import UVVIS_plugin
+
+
+class ReadUVVISCSVTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.header = ["UV-VIS spectra,,\n",
+                       "Exported data,,\n",
+                       "nm,Sample A,Sample B\n",
+                       ",,\n",
+                       "Wavelength,Abs,Abs\n"]
+        self.wavelengths = numpy.arange(200.0, 800.0, 0.5)
+        self.rows = ["%.1f,%.3f,%.3f\n"%(w, w / 1000.0, w / 2000.0) 
+                     for w in self.wavelengths]
+        fd, self.filename = tempfile.mkstemp(suffix='.csv')
+        os.close(fd)
+    
+    
+    def tearDown(self):
+        os.remove(self.filename)
+    
+    
+    def write_file(self, lines):
+        with open(self.filename, 'w') as ofp:
+            ofp.writelines(lines)
+    
+    
+    def test_read(self):
+        #trailing blank lines are ignored
+        self.write_file(self.header + self.rows + ["\n"])
+        col_data, col_name = UVVIS_plugin.read_uvvis_csv(self.filename)
+        
+        #the names come from the third header line, and none of the header 
+        #lines are read as data
+        self.assertEqual(col_name, ['Sample A', 'Sample B'])
+        self.assertEqual(col_data.shape, (3, len(self.wavelengths)))
+        self.assertEqual(col_data.dtype, numpy.float64)
+        self.assertTrue(numpy.all(col_data[0] == self.wavelengths))
+        self.assertTrue(numpy.allclose(col_data[1], self.wavelengths / 1000.0,
+                                       rtol=0, atol=1e-3))
+        self.assertTrue(numpy.allclose(col_data[2], self.wavelengths / 2000.0,
+                                       rtol=0, atol=1e-3))
+        
+        #each column is a contiguous view of the array, so can be given to a
+        #data series without copying it
+        for col in col_data:
+            self.assertTrue(col.flags['C_CONTIGUOUS'])
+            self.assertTrue(col.base is col_data)
+    
+    
+    def test_invalid(self):
+        #errors report the line number of the invalid value
+        rows = list(self.rows)
+        rows[-10] = "795.0,abc,0.1\n"
+        self.write_file(self.header + rows)
+        try:
+            UVVIS_plugin.read_uvvis_csv(self.filename)
+            self.fail("Expecting ValueError")
+        except ValueError, e:
+            self.assertTrue(e.args[0].startswith("Line %d:"%(
+                                        len(self.header) + len(rows) - 9)))
+        
+        rows = list(self.rows)
+        rows[-10] = "795.0,0.1\n"
+        self.write_file(self.header + rows)
+        self.assertRaises(ValueError, UVVIS_plugin.read_uvvis_csv, 
+                          self.filename)
+        
+        #there must be some data after the header
+        self.write_file(self.header)
+        self.assertRaises(ValueError, UVVIS_plugin.read_uvvis_csv, 
+                          self.filename)
+
+
+if __name__ == '__main__':
+    unittest.main()